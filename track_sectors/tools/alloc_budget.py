@@ -0,0 +1,161 @@
+"""Allocation budget of the app's per tick path, checked outside of the game.
+
+Loads the app with stand-ins for the game's 'ac', 'acsys' and shared memory modules, in a
+temporary copy of the app (so the real data folder is never touched) on a generated
+circular track, drives a few laps to warm everything up, then runs acUpdate() under
+tracemalloc while driving in the middle of a sector:
+
+    net blocks       memory blocks allocated by the app and still alive after the window,
+                     anything above 0 grows every lap and ends up as garbage collector work
+    transient bytes  the most memory allocated and released again within a single tick
+
+Exits with status 1 when a budget is exceeded, so it can run before every release.
+
+Usage:
+    python alloc_budget.py [--ticks N] [--max-net-blocks N] [--max-transient-bytes N]
+                           [--sampler-rate HZ] [--verbose]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+
+from game_stand_in import APP_FOLDER, load_app
+
+TICK = 1 / 60
+LAP_TIME = 90.0
+
+
+def lap_ticks(lap_time=LAP_TIME):
+    """(progress, lap time in ms, x, z) of every tick of a lap, computed up front so driving
+    the app allocates nothing on this side."""
+
+    ticks = []
+    count = int(lap_time / TICK)
+    for i in range(1, count + 1):
+        progress = i / count
+        angle = 2 * math.pi * progress
+        ticks.append((round(progress, 9) % 1.0, int(i * TICK * 1000), 500 * math.cos(angle), 500 * math.sin(angle)))
+    return ticks
+
+
+class Driver:
+    def __init__(self, app, car, info):
+        self.app = app
+        self.car = car
+        self.info = info
+        self.ticks = lap_ticks()
+        self.session_time = 0.0
+
+    def tick(self, tick):
+        progress, lap_time, x, z = tick
+        state = self.car.state
+        state["NormalizedSplinePosition"] = progress
+        state["LapTime"] = lap_time
+        graphics = self.info.graphics
+        graphics.normalizedCarPosition = progress
+        graphics.iCurrentTime = lap_time
+        coordinates = graphics.carCoordinates
+        coordinates[0] = x
+        coordinates[2] = z
+        graphics.sessionTimeLeft = self.session_time
+        self.app.acUpdate(TICK)
+
+    def drive_lap(self, first=0, last=None):
+        """Drives the ticks [first, last) of a lap, crossing the finish line after the last tick of the lap."""
+
+        last = len(self.ticks) if last is None else last
+        for i in range(first, last):
+            if i == len(self.ticks) - 1:
+                state = self.car.state
+                state["LapCount"] += 1
+                state["LastLap"] = self.ticks[i][1]
+                self.info.graphics.completedLaps += 1
+                self.tick((0.0, 0, self.ticks[i][2], self.ticks[i][3]))
+            else:
+                self.tick(self.ticks[i])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checks the allocations of the app's per tick path.")
+    parser.add_argument("--ticks", type=int, default=900, help="ticks measured, in the middle of the first sector")
+    parser.add_argument("--max-net-blocks", type=int, default=0)
+    parser.add_argument("--max-transient-bytes", type=int, default=1024)
+    parser.add_argument("--sampler-rate", type=int, default=0, help="also run the shared memory sampler")
+    parser.add_argument("--verbose", action="store_true", help="list where the remaining blocks were allocated")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as game_folder:
+        app, car, info, app_copy = load_app(game_folder)
+        app.cfg.sampler_rate = args.sampler_rate
+        app.acMain(1)
+        app.acUpdate(TICK)
+        # two sectors, the second one ends on the finish line
+        app.sector_buttons.sector_checkpoints[:] = [0.5, 2]
+        app.structure_update_flag = True
+        app.acUpdate(TICK)
+        car.in_pit = False
+        # no sounds from a benchmark
+        app.cfg.new_best_sfx = False
+
+        driver = Driver(app, car, info)
+        for lap in range(0, 3):
+            driver.drive_lap()
+        if app.get_time("best", 0) == "--:--:---":
+            sys.exit("the app did not time the warm up laps, nothing to measure")
+        # the page switching threads of the warm up laps would end inside the measured window
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not thread.daemon:
+                thread.join()
+
+        first = int(len(driver.ticks) * 0.3)
+        last = min(first + args.ticks, int(len(driver.ticks) * 0.48))
+        # traced from the start of the lap, so the values the app replaces every tick were
+        # allocated under tracemalloc and their release is counted too
+        tracemalloc.start(10)
+        driver.drive_lap(0, first)
+
+        app_files = [tracemalloc.Filter(True, os.path.join(app_copy, "*"))]
+        before = tracemalloc.take_snapshot().filter_traces(app_files)
+        transient = []
+        for i in range(first, last):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            driver.tick(driver.ticks[i])
+            transient.append(tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot().filter_traces(app_files)
+        tracemalloc.stop()
+
+        differences = [stat for stat in after.compare_to(before, "lineno") if stat.count_diff != 0]
+        net_blocks = sum(stat.count_diff for stat in differences)
+
+        driver.drive_lap(last)
+        app.acShutdown()
+        if app.sampler is not None:
+            app.sampler.join()
+        os.chdir(APP_FOLDER)
+
+    ticks = last - first
+    print("{} ticks mid sector: {} net blocks, transient bytes per tick: max {}, mean {:.0f}".format(
+        ticks, net_blocks, max(transient), sum(transient) / ticks))
+    if args.verbose:
+        for stat in differences:
+            print("{:+d} blocks {:+d} B".format(stat.count_diff, stat.size_diff))
+            print("   ", stat.traceback.format()[-1].strip())
+
+    failed = False
+    if net_blocks > args.max_net_blocks:
+        print("over budget: {} net blocks, at most {} allowed".format(net_blocks, args.max_net_blocks))
+        failed = True
+    if max(transient) > args.max_transient_bytes:
+        print("over budget: {} transient bytes in a tick, at most {} allowed".format(
+            max(transient), args.max_transient_bytes))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
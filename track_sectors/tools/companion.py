@@ -0,0 +1,198 @@
+"""Companion daemon of the app, runs outside of the game.
+
+The app only queues small binary sector and lap events (ts_core/events.py) and sends them
+over a localhost TCP connection when companion_port is set in its config file, so the
+work done here never costs frame time. For every connection the daemon:
+
+- records the raw event stream to data/events/ (replayable with replay_events.py), one
+  file per connection named like the other per configuration files of the app, track@layout
+  (or track for tracks without layouts), then @car and the date
+- keeps per sector statistics of the valid times (count, best, mean, standard deviation)
+  and prints a summary line for every lap
+- appends the statistics of the session to a CSV file when the connection closes
+
+Usage:
+    python companion.py [--host HOST] [--port PORT] [--events FOLDER] [--export FILE] [--once]
+"""
+import argparse
+import csv
+import os
+import selectors
+import socket
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core import events
+from ts_core.consistency import SectorConsistency
+from ts_core.track_map import config_file_name
+
+
+def format_time(value):
+    return "-" if value is None else "{}:{:06.3f}".format(int(value // 60), value % 60)
+
+
+class SessionAnalytics:
+    """Statistics of the events of one connection (one game session)."""
+
+    def __init__(self):
+        self.track = self.layout = self.car = None
+        self.sector_bests = []
+        self.consistency = SectorConsistency(0)
+        self.laps = 0
+        self.best_lap = None
+        self.invalid = 0
+
+    def add(self, event):
+        if event.type == events.SESSION:
+            self.track, self.layout, self.car = event.session_names()
+        elif event.type == events.SECTOR:
+            if event.sector >= len(self.sector_bests):
+                self._grow(event.sector + 1)
+            if not event.valid:
+                self.invalid += 1
+                return
+            self.consistency.add(event.sector, event.time)
+            best = self.sector_bests[event.sector]
+            if best is None or event.time < best:
+                self.sector_bests[event.sector] = event.time
+        elif event.type == events.LAP:
+            self.laps += 1
+            if event.valid and (self.best_lap is None or event.time < self.best_lap):
+                self.best_lap = event.time
+            return self.lap_summary(event)
+
+    def _grow(self, sector_count):
+        # sectors are only known from the events, the statistics grow with them
+        stats = self.consistency.to_dict()
+        self.consistency = SectorConsistency(sector_count)
+        self.consistency.load(stats)
+        self.sector_bests.extend([None] * (sector_count - len(self.sector_bests)))
+
+    def theoretical_best(self):
+        if not self.sector_bests or None in self.sector_bests:
+            return None
+        return sum(self.sector_bests)
+
+    def lap_summary(self, event):
+        return "lap {} {}{}  best {}  theoretical {}".format(
+            event.lap, format_time(event.time), "" if event.valid else " (invalid)",
+            format_time(self.best_lap), format_time(self.theoretical_best()))
+
+    def rows(self):
+        for i in range(0, len(self.sector_bests)):
+            std = self.consistency.std(i)
+            yield [self.track, self.layout, self.car, i + 1, self.consistency.count[i],
+                   "" if self.sector_bests[i] is None else round(self.sector_bests[i], 3),
+                   round(self.consistency.mean[i], 3) if self.consistency.count[i] else "",
+                   "" if std is None else round(std, 4)]
+
+
+class Connection:
+
+    def __init__(self, sock, events_folder):
+        self.sock = sock
+        self.decoder = events.EventDecoder()
+        self.analytics = SessionAnalytics()
+        self.events_folder = events_folder
+        self.record = None
+        # data received before the session event, the file name depends on it
+        self.unrecorded = bytearray()
+
+    def receive(self, data):
+        if self.record is None:
+            self.unrecorded.extend(data)
+        else:
+            self.record.write(data)
+
+        for event in self.decoder.feed(data):
+            summary = self.analytics.add(event)
+            if event.type == events.SESSION and self.record is None and self.events_folder:
+                self.open_record()
+            if summary:
+                print(summary)
+
+    def open_record(self):
+        if not os.path.exists(self.events_folder):
+            os.makedirs(self.events_folder)
+        name = config_file_name(self.analytics.track, self.analytics.layout, "") + "@" + self.analytics.car
+        path = os.path.join(self.events_folder, name + "_" + datetime.now().strftime("%d_%m_%Y_%H_%M_%S") + ".events")
+        self.record = open(path, "ab")
+        self.record.write(self.unrecorded)
+        self.unrecorded = bytearray()
+        print("recording to " + path)
+
+    def close(self, export_path):
+        self.sock.close()
+        if self.record is not None:
+            self.record.close()
+        if export_path and self.analytics.sector_bests:
+            write_header = not os.path.exists(export_path)
+            with open(export_path, "a", newline="") as outfile:
+                writer = csv.writer(outfile)
+                if write_header:
+                    writer.writerow(["track", "layout", "car", "sector", "count", "best", "mean", "std"])
+                writer.writerows(self.analytics.rows())
+
+
+def serve(host, port, events_folder, export_path, once=False):
+    selector = selectors.DefaultSelector()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(4)
+    server.setblocking(False)
+    selector.register(server, selectors.EVENT_READ)
+    print("listening on {}:{}".format(host, server.getsockname()[1]))
+    sys.stdout.flush()
+
+    try:
+        while True:
+            for key, mask in selector.select():
+                if key.fileobj is server:
+                    sock, address = server.accept()
+                    sock.setblocking(False)
+                    selector.register(sock, selectors.EVENT_READ, Connection(sock, events_folder))
+                    print("connection from {}:{}".format(*address))
+                    continue
+
+                connection = key.data
+                try:
+                    data = connection.sock.recv(65536)
+                except ConnectionError:
+                    data = b""
+                if data:
+                    connection.receive(data)
+                    continue
+
+                selector.unregister(connection.sock)
+                connection.close(export_path)
+                print("connection closed, {} laps".format(connection.analytics.laps))
+                sys.stdout.flush()
+                if once:
+                    return
+    finally:
+        selector.close()
+        server.close()
+
+
+def main(argv=None):
+    default_events = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data", "events")
+
+    parser = argparse.ArgumentParser(description="Companion daemon receiving the events of Track Sectors.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=events.COMPANION_PORT, help="the app's companion_port")
+    parser.add_argument("--events", default=default_events, help="folder of the recorded events, empty to not record")
+    parser.add_argument("--export", help="CSV file the statistics of every session are appended to")
+    parser.add_argument("--once", action="store_true", help="exit after the first connection closes")
+    args = parser.parse_args(argv)
+
+    try:
+        serve(args.host, args.port, args.events, args.export, args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Exports the times and telemetry recorded by the app, for data analysis tools.
+
+    splits     CSV of the best sector times of every car (data.json) and of the sector
+               times and speeds of the kept fastest laps (data/laps/*.top.json)
+    telemetry  the laps recorded with record_telemetry (data/telemetry/), either as one CSV
+               of all the samples or as one channel log per lap (ts_core/channel_log.py),
+               resampled at a fixed rate with the sector crossings as markers
+
+Everything is read through generators, data.json is streamed track by track and a single
+lap of telemetry is held in memory at a time, so months of data export with little memory.
+Does not need the game.
+
+Usage:
+    python export.py splits [--data DATA_FOLDER] [--output FILE] [--track TRACK]
+    python export.py telemetry [--data DATA_FOLDER] [--format csv|log] [--output FILE_OR_FOLDER]
+                               [--rate HZ] [--track TRACK]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core.channel_log import write_channel_log
+from ts_core.json_stream import iter_object_items
+from ts_core.stored_data import iter_configurations, iter_cars, checkpoints_of, sector_times_of
+from ts_core.trace_file import TraceReader
+from ts_core.track_map import config_file_name
+
+SPLIT_FIELDS = ['track', 'layout', 'car', 'kind', 'lap', 'lap_time', 'sector', 'time',
+                'min_speed', 'max_speed', 'average_speed']
+TELEMETRY_UNITS = {'progress': '', 'lap_time': 's', 'speed': 'km/h', 'x': 'm', 'y': 'm', 'z': 'm'}
+
+
+def iter_configurations_of(data_folder, track_filter=None):
+    """Yields (track, layout, entry) of every configuration in data.json."""
+
+    for track, track_entry in iter_object_items(os.path.join(data_folder, "data.json")):
+        if track_filter is not None and track != track_filter:
+            continue
+        for layout, entry in iter_configurations(track, track_entry):
+            yield track, layout, entry
+
+
+def iter_files(folder, extension):
+    """Yields (car, path) of the files of a configuration folder."""
+
+    if not os.path.isdir(folder):
+        return
+    for file_name in sorted(os.listdir(folder)):
+        if file_name.endswith(extension):
+            yield file_name[:-len(extension)], os.path.join(folder, file_name)
+
+
+def iter_split_rows(data_folder, track_filter=None):
+    for track, layout, entry in iter_configurations_of(data_folder, track_filter):
+        sector_count = entry['sector_count']
+        for car, car_entry in iter_cars(entry):
+            for i, best in enumerate(sector_times_of(car_entry, sector_count)):
+                if best is not None:
+                    yield {'track': track, 'layout': layout, 'car': car, 'kind': 'best', 'sector': i + 1,
+                           'time': best}
+
+        lap_folder = os.path.join(data_folder, "laps", config_file_name(track, layout, ""))
+        for car, path in iter_files(lap_folder, ".top.json"):
+            with open(path, "r") as infile:
+                stored = json.load(infile)
+            if stored.get('checkpoints') != checkpoints_of(entry):
+                # kept for an older configuration, the app drops them on the next session
+                continue
+            for rank, lap in enumerate(stored.get('laps', [])):
+                speeds = lap.get('speeds') or [None] * len(lap['splits'])
+                for i, split in enumerate(lap['splits']):
+                    row = {'track': track, 'layout': layout, 'car': car, 'kind': 'lap', 'lap': rank + 1,
+                           'lap_time': lap['lap_time'], 'sector': i + 1, 'time': split}
+                    if speeds[i] is not None:
+                        row['min_speed'], row['max_speed'], row['average_speed'] = speeds[i]
+                    yield row
+
+
+def iter_telemetry_laps(data_folder, track_filter=None):
+    """Yields (track, layout, car, lap number, checkpoints, lap) for every recorded lap,
+    lap being a dict of channel name -> values."""
+
+    for track, layout, entry in iter_configurations_of(data_folder, track_filter):
+        folder = os.path.join(data_folder, "telemetry", config_file_name(track, layout, ""))
+        for car, path in iter_files(folder, ".trc"):
+            with TraceReader(path) as reader:
+                for number in range(0, len(reader)):
+                    yield track, layout, car, number + 1, checkpoints_of(entry), reader.lap(number)
+
+
+def crossing_times(progress, lap_time, checkpoints):
+    """Lap time at every checkpoint of the lap, interpolated between the samples around it."""
+
+    times = []
+    index = 1
+    for checkpoint in checkpoints:
+        if checkpoint >= 1:
+            times.append(lap_time[-1])
+            continue
+        while index < len(progress) and progress[index] < checkpoint:
+            index += 1
+        if index >= len(progress):
+            break
+        span = progress[index] - progress[index - 1]
+        fraction = (checkpoint - progress[index - 1]) / span if span > 0 else 0.0
+        times.append(lap_time[index - 1] + fraction * (lap_time[index] - lap_time[index - 1]))
+    return times
+
+
+def resample(lap_time, values, rate):
+    """Values at a fixed rate, linearly interpolated from the irregular tick samples."""
+
+    resampled = []
+    if len(lap_time) == 0:
+        return resampled
+    index = 1
+    count = int(lap_time[-1] * rate) + 1
+    for sample in range(0, count):
+        t = sample / rate
+        while index < len(lap_time) - 1 and lap_time[index] < t:
+            index += 1
+        t0, t1 = lap_time[index - 1], lap_time[min(index, len(lap_time) - 1)]
+        v0, v1 = values[index - 1], values[min(index, len(values) - 1)]
+        fraction = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+        resampled.append(v0 + min(max(fraction, 0.0), 1.0) * (v1 - v0))
+    return resampled
+
+
+def export_splits(data_folder, outfile, track_filter):
+    writer = csv.DictWriter(outfile, fieldnames=SPLIT_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for row in iter_split_rows(data_folder, track_filter):
+        writer.writerow(row)
+
+
+def export_telemetry_csv(laps, outfile):
+    writer = None
+    for track, layout, car, number, checkpoints, lap in laps:
+        names = list(lap)
+        if writer is None:
+            writer = csv.writer(outfile, lineterminator="\n")
+            writer.writerow(['track', 'layout', 'car', 'lap'] + names)
+        for values in zip(*[lap[name] for name in names]):
+            writer.writerow([track, layout, car, number] + [round(float(value), 6) for value in values])
+
+
+def export_telemetry_logs(laps, folder, rate):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    for track, layout, car, number, checkpoints, lap in laps:
+        lap_time = lap['lap_time']
+        channels = []
+        for name, values in lap.items():
+            if name == 'lap_time':
+                continue
+            scale = 1e6 if name == 'progress' else 1e3
+            channels.append((name, TELEMETRY_UNITS.get(name, ''), scale, resample(lap_time, values, rate)))
+        markers = [(crossing_time, "sector " + str(i + 1))
+                   for i, crossing_time in enumerate(crossing_times(lap['progress'], lap_time, checkpoints))]
+
+        path = os.path.join(folder, config_file_name(track, layout, "") + "@" + car + "_lap" + str(number) + ".tsl")
+        with open(path, "wb") as outfile:
+            write_channel_log(outfile, rate, channels, markers, track, layout, car)
+        print(path)
+
+
+def main(argv=None):
+    default_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+
+    parser = argparse.ArgumentParser(description="Exports the times and telemetry recorded by Track Sectors.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    splits = subparsers.add_parser("splits", help="best sector times and the splits of the kept laps, as CSV")
+    splits.add_argument("--data", default=default_data, help="the app's data folder")
+    splits.add_argument("--output", help="CSV file, the standard output by default")
+    splits.add_argument("--track", help="only export this track")
+
+    telemetry = subparsers.add_parser("telemetry", help="the recorded telemetry, as CSV or channel logs")
+    telemetry.add_argument("--data", default=default_data, help="the app's data folder")
+    telemetry.add_argument("--format", choices=("csv", "log"), default="csv")
+    telemetry.add_argument("--output", help="CSV file (the standard output by default) or folder of the logs")
+    telemetry.add_argument("--rate", type=float, default=100, help="sample rate of the logs")
+    telemetry.add_argument("--track", help="only export this track")
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        parser.error("choose what to export: splits or telemetry")
+
+    if args.command == "telemetry" and args.format == "log":
+        if not args.output:
+            parser.error("--output is required, the folder the logs are written to")
+        export_telemetry_logs(iter_telemetry_laps(args.data, args.track), args.output, args.rate)
+        return
+
+    outfile = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.command == "splits":
+            export_splits(args.data, outfile, args.track)
+        else:
+            export_telemetry_csv(iter_telemetry_laps(args.data, args.track), outfile)
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+if __name__ == "__main__":
+    main()
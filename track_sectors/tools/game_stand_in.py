@@ -0,0 +1,114 @@
+"""Stand-ins for the game's 'ac', 'acsys' and shared memory modules, so the tools can load
+the app itself outside of Assetto Corsa. Only what the app reads is modeled, the UI calls
+do nothing.
+
+The app is copied to a temporary game folder first, with a fresh data folder, so the data
+of the real install is never touched.
+"""
+import math
+import os
+import shutil
+import struct
+import sys
+import types
+
+APP_FOLDER = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+TRACK = "budget_ring"
+LAYOUT = "gp"
+CAR = "budget_car"
+
+
+class StandIn(types.ModuleType):
+    """Module whose unknown functions do nothing and return 0, like the UI calls of ac."""
+
+    def __getattr__(self, name):
+        return nothing
+
+
+def nothing(*args, **kwargs):
+    return 0
+
+
+class Car:
+    def __init__(self):
+        self.state = {"NormalizedSplinePosition": 0.0, "LapTime": 0, "LapCount": 0, "LastLap": 0}
+        self.in_pit = True
+
+
+def make_ac(car):
+    ac = StandIn("ac")
+    texts = {}
+    counter = [0]
+
+    def add_item(*args):
+        counter[0] += 1
+        texts[counter[0]] = args[-1] if args and isinstance(args[-1], str) else ""
+        return counter[0]
+
+    ac.newApp = ac.addLabel = ac.addButton = ac.addSpinner = ac.addCheckBox = add_item
+    ac.setText = texts.__setitem__
+    ac.getText = lambda item: texts.get(item, "")
+    ac.getValue = lambda item: 1
+    ac.getTrackName = lambda car_id: TRACK
+    ac.getTrackConfiguration = lambda car_id: LAYOUT
+    ac.getCarName = lambda car_id: CAR
+    ac.isConnected = lambda car_id: True
+    ac.isAcLive = lambda: True
+    # Custom Shaders Patch, required by the app
+    ac.ext_patchVersionCode = lambda: 3000
+    ac.isCarInPit = lambda car_id: car.in_pit
+    ac.isCarInPitlane = lambda car_id: False
+    ac.getCarState = lambda car_id, value, *args: car.state[value]
+
+    acsys = StandIn("acsys")
+    acsys.CS = types.SimpleNamespace(**{name: name for name in car.state})
+    acsys.GL = types.SimpleNamespace(Lines=0, LineStrip=1, Triangles=2, Quads=3)
+    return ac, acsys
+
+
+def make_info():
+    graphics = types.SimpleNamespace(carCoordinates=[1.0, 1.0, 1.0], session=0, sessionTimeLeft=-1.0,
+                                     completedLaps=0, normalizedCarPosition=0.0, iCurrentTime=0,
+                                     penaltyTime=0.0, status=2)
+    physics = types.SimpleNamespace(speedKmh=150.0, numberOfTyresOut=0)
+    return types.SimpleNamespace(graphics=graphics, physics=physics, static=types.SimpleNamespace())
+
+
+def write_ai_line(path, radius=500.0, points=2000):
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as outfile:
+        outfile.write(struct.pack("<4i", 7, points, 0, 0))
+        length = 0.0
+        for i in range(0, points):
+            angle = 2 * math.pi * i / points
+            outfile.write(struct.pack("<4fi", radius * math.cos(angle), 0.0, radius * math.sin(angle), length, i))
+            length += 2 * math.pi * radius / points
+
+
+def load_app(game_folder):
+    """Copies the app into a game folder, makes it the current folder like the game does and
+    imports the app with the stand-in modules. The app can only be loaded once per process.
+    returns (app module, Car, shared memory info, folder of the app copy)"""
+
+    app_copy = os.path.join(game_folder, "apps", "python", "track_sectors")
+    shutil.copytree(APP_FOLDER, app_copy, ignore=shutil.ignore_patterns("data", "tools", "__pycache__"))
+    # a fresh data folder, like a new install
+    os.makedirs(os.path.join(app_copy, "data", "backups"))
+    with open(os.path.join(app_copy, "data", "data.json"), "w") as outfile:
+        outfile.write('{\n    "date_time": "01_01_2000_00_00_00"\n}')
+    write_ai_line(os.path.join(game_folder, "content", "tracks", TRACK, LAYOUT, "ai", "fast_lane.ai"))
+
+    car = Car()
+    ac, acsys = make_ac(car)
+    sys.modules["ac"] = ac
+    sys.modules["acsys"] = acsys
+    sys.path.insert(0, app_copy)
+    import third_party
+    sim_info = types.ModuleType("third_party.sim_info_ts2")
+    sim_info.info = make_info()
+    sys.modules["third_party.sim_info_ts2"] = sim_info
+    third_party.sim_info_ts2 = sim_info
+
+    os.chdir(game_folder)
+    import track_sectors
+    return track_sectors, car, sim_info.info, app_copy
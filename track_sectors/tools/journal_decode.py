@@ -0,0 +1,124 @@
+"""Prints the event journal of a session (data/journal/*/*.tsj) as a timeline.
+
+The app journals its timing decisions while driving: state changes of the session (pits,
+track, waiting), sector crossings with the position and lap time they were taken at, new
+bests, resets, rejected positions (driving backwards, jumps of the position), finished laps
+and invalidated sectors. Without a file, the newest journal of the data folder is printed.
+
+--benchmark measures the cost of journaling an event instead, and exits with status 1 when
+it is not under --max-ns nanoseconds.
+
+Usage:
+    python journal_decode.py [JOURNAL] [--data DATA_FOLDER] [--kind KIND] [--lap N]
+    python journal_decode.py --benchmark [--events N] [--max-ns NS]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core import journal as records
+from ts_core.session import STATE_NAMES
+
+
+def state_name(state):
+    state = int(state)
+    return STATE_NAMES[state] if 0 <= state < len(STATE_NAMES) else str(state)
+
+
+def describe(kind, index, a, b):
+    if kind == records.STATE:
+        return "{} -> {}  position {:.4f}".format(state_name(b), state_name(index), a)
+    if kind == records.CROSSING:
+        return "sector {}  position {:.4f}  lap time {:.3f}".format(index + 1, a, b)
+    if kind == records.NEW_BEST:
+        return "sector {}  {:.3f}{}".format(index + 1, a, "  (was {:.3f})".format(b) if b else "  (first time)")
+    if kind == records.RESET:
+        return "{}  position {:.4f}  session time left {:.0f} ms".format(
+            "session restarted" if index else "jumped to the pits", a, b)
+    if kind == records.BACKWARDS:
+        return "position {:.4f} rejected, furthest {:.4f}".format(a, b)
+    if kind == records.LAP:
+        return "lap time {:.3f}{}".format(a, "" if b else "  invalid")
+    if kind == records.INVALID:
+        return "sector {}  tyres out {:.0f}  penalty time {:.3f}".format(index + 1, a, b)
+    return "index {}  {}  {}".format(index, a, b)
+
+
+def print_timeline(path, kind=None, lap=None, output=sys.stdout):
+    saved_at, saved_clock, entries = records.read_journal(path)
+    output.write("{}: {} events, saved {}\n".format(
+        path, len(entries), datetime.fromtimestamp(saved_at).strftime("%Y-%m-%d %H:%M:%S")))
+
+    previous = None
+    for clock_time, entry_kind, index, entry_lap, a, b in entries:
+        if kind is not None and entry_kind != kind or lap is not None and entry_lap != lap:
+            continue
+        wall_time = datetime.fromtimestamp(saved_at - (saved_clock - clock_time))
+        gap = 0.0 if previous is None else clock_time - previous
+        previous = clock_time
+        name = records.KIND_NAMES[entry_kind] if entry_kind < len(records.KIND_NAMES) else str(entry_kind)
+        output.write("{}  {:+9.3f}  lap {:3d}  {:<9}  {}\n".format(
+            wall_time.strftime("%H:%M:%S.%f")[:-3], gap, entry_lap, name, describe(entry_kind, index, a, b)))
+
+
+def newest_journal(data_folder):
+    journals = glob.glob(os.path.join(data_folder, "journal", "*", "*.tsj"))
+    if not journals:
+        return None
+    return max(journals, key=os.path.getmtime)
+
+
+def benchmark(events):
+    """Mean nanoseconds per journaled event, the ring wrapping around several times."""
+
+    journal = records.EventJournal()
+    record = journal.record
+    crossing = records.CROSSING
+    start = time.perf_counter()
+    for i in range(0, events):
+        record(crossing, 1, 3, 0.4001, 36.799)
+    elapsed = time.perf_counter() - start
+
+    # the loop alone, taken out of the result
+    start = time.perf_counter()
+    for i in range(0, events):
+        pass
+    elapsed -= time.perf_counter() - start
+    return elapsed / events * 1e9
+
+
+def main(argv=None):
+    default_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+
+    parser = argparse.ArgumentParser(description="Prints the event journal of a Track Sectors session.")
+    parser.add_argument("journal", nargs="?", help="journal file, the newest one of the data folder by default")
+    parser.add_argument("--data", default=default_data, help="the app's data folder")
+    parser.add_argument("--kind", choices=records.KIND_NAMES, help="only print this kind of events")
+    parser.add_argument("--lap", type=int, help="only print the events of this lap")
+    parser.add_argument("--benchmark", action="store_true", help="measure the cost of journaling an event")
+    parser.add_argument("--events", type=int, default=1000000, help="events journaled by the benchmark")
+    parser.add_argument("--max-ns", type=float, default=1000, help="most nanoseconds allowed per event")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        cost = benchmark(args.events)
+        print("{:.0f} ns per event ({} events)".format(cost, args.events))
+        if cost > args.max_ns:
+            print("over budget: at most {:.0f} ns allowed".format(args.max_ns))
+            sys.exit(1)
+        return
+
+    path = args.journal or newest_journal(args.data)
+    if path is None:
+        parser.error("no journal found in " + os.path.join(args.data, "journal"))
+    kind = records.KIND_NAMES.index(args.kind) if args.kind else None
+    print_timeline(path, kind, args.lap)
+
+
+if __name__ == "__main__":
+    main()
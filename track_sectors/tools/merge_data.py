@@ -0,0 +1,233 @@
+"""Merges the data files (data/data.json) of several rigs into one.
+
+For every track/layout, the configurations with the same sector checkpoints are combined:
+each car keeps its fastest time of every sector over all the files, and the consistency
+statistics of the files are added together. When the checkpoints of a file differ from
+the ones of an earlier file (files are given in order of priority), the configuration of
+that file is left out and reported as a conflict. So is a track stored with layouts in one
+file and without in an earlier one, the app reads a track in one shape only.
+
+The files are streamed track by track and the tracks are spread over bucket files in a
+temporary folder, then merged one bucket at a time, so memory use is bounded by the
+bucket size instead of the size of the inputs.
+
+The app rebuilds its cross car index (car_index.json) once data.json was replaced, since
+the index records the data file it was built from. --car-index also writes the index of
+the merged file, which saves that rebuild when both files are moved (not copied, the
+modification time of data.json is part of what the index records) into the data folder.
+
+Usage:
+    python merge_data.py DATA_FILE [DATA_FILE ...] --output FILE [--report FILE]
+                         [--car-index FILE] [--bucket-size MB]
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core.car_index import CarIndex, data_source
+from ts_core.consistency import SectorConsistency
+from ts_core.json_stream import iter_object_items
+from ts_core.stored_data import iter_cars, checkpoints_of
+
+CHECKPOINT_TOLERANCE = 1e-6
+
+
+def same_checkpoints(first, second):
+    return len(first) == len(second) and all(abs(a - b) <= CHECKPOINT_TOLERANCE for a, b in zip(first, second))
+
+
+def merge_car(target, source, sector_count):
+    """Merges the times of a car from another file into target."""
+
+    for i in range(0, sector_count):
+        key = "sector_" + str(i + 1)
+        value = source.get(key, "")
+        if not isinstance(value, (int, float)):
+            continue
+        stored = target.get(key, "")
+        if not isinstance(stored, (int, float)) or value < stored:
+            target[key] = value
+
+    if 'sector_stats' in source:
+        consistency = SectorConsistency(sector_count)
+        consistency.load(target.get('sector_stats'))
+        other = SectorConsistency(sector_count)
+        other.load(source['sector_stats'])
+        consistency.merge(other)
+        target['sector_stats'] = consistency.to_dict()
+
+
+def merge_configuration(entries):
+    """Merges the entries of one track/layout, given as (file index, entry) in order of
+    priority. returns (merged entry, list of the file indexes that conflicted)"""
+
+    first_index, merged = entries[0]
+    checkpoints = checkpoints_of(merged)
+    conflicts = []
+    for index, entry in entries[1:]:
+        if not same_checkpoints(checkpoints, checkpoints_of(entry)):
+            conflicts.append(index)
+            continue
+        for car, car_entry in iter_cars(entry):
+            if car in merged:
+                merge_car(merged[car], car_entry, merged['sector_count'])
+            else:
+                merged[car] = car_entry
+    return merged, conflicts
+
+
+def merge_track(track, entries, report):
+    """Merges the entries of a track from all the files, (file index, track entry) in order
+    of priority, reporting the conflicts with report(track, layout, file index, kept file index, reason)."""
+
+    # tracks without layouts have their configuration right in the track entry, the first
+    # file decides the shape of the track and the files with the other shape are left out
+    first_index = entries[0][0]
+    without_layouts = 'sector_checkpoints' in entries[0][1]
+    configurations = OrderedDict()
+    for index, entry in entries:
+        if ('sector_checkpoints' in entry) != without_layouts:
+            report(track, "", index, first_index, "layouts" if without_layouts else "no layouts")
+        elif without_layouts:
+            configurations.setdefault("", []).append((index, entry))
+        else:
+            for layout, layout_entry in entry.items():
+                if isinstance(layout_entry, dict) and 'sector_checkpoints' in layout_entry:
+                    configurations.setdefault(layout, []).append((index, layout_entry))
+
+    merged_track = OrderedDict()
+    for layout, layout_entries in configurations.items():
+        merged, conflicts = merge_configuration(layout_entries)
+        for index in conflicts:
+            report(track, layout, index, layout_entries[0][0])
+        if layout == "":
+            return merged
+        merged_track[layout] = merged
+    return merged_track
+
+
+def bucket_of(track, bucket_count):
+    # crc32 instead of hash(), which changes between runs
+    return zlib.crc32(track.encode("utf-8")) % bucket_count
+
+
+def split_into_buckets(paths, folder, bucket_count):
+    """Streams every file and appends each track entry to its bucket as a JSON line."""
+
+    buckets = [open(os.path.join(folder, str(i) + ".jsonl"), "w") for i in range(0, bucket_count)]
+    try:
+        for index, path in enumerate(paths):
+            for track, entry in iter_object_items(path):
+                if not isinstance(entry, dict):
+                    # 'date_time' and other values that are not tracks
+                    continue
+                buckets[bucket_of(track, bucket_count)].write(json.dumps([index, track, entry]) + "\n")
+    finally:
+        for bucket in buckets:
+            bucket.close()
+
+
+def iter_merged_tracks(folder, bucket_count, report):
+    """Yields (track, merged entry), loading one bucket at a time."""
+
+    for i in range(0, bucket_count):
+        tracks = OrderedDict()
+        with open(os.path.join(folder, str(i) + ".jsonl"), "r") as bucket:
+            for line in bucket:
+                index, track, entry = json.loads(line, object_pairs_hook=OrderedDict)
+                tracks.setdefault(track, []).append((index, entry))
+
+        for track in sorted(tracks):
+            # lines are written file by file, so the entries already are in order of priority
+            yield track, merge_track(track, tracks[track], report)
+
+
+def write_dictionary(items, outfile):
+    """Writes (key, value) pairs as a JSON object, formatted like the app formats data.json,
+    without building the whole object in memory.
+    returns the number of pairs written"""
+
+    outfile.write("{")
+    count = 0
+    for key, value in items:
+        text = json.dumps(value, indent=4).replace("\n", "\n    ")
+        outfile.write(("\n" if count == 0 else ",\n") + "    " + json.dumps(key) + ": " + text)
+        count += 1
+    outfile.write("\n}")
+    return count
+
+
+class ConflictReport:
+    """Writes the configurations that could not be merged, and counts them."""
+
+    def __init__(self, paths, outfile):
+        self.paths = paths
+        self.outfile = outfile
+        self.count = 0
+
+    def __call__(self, track, layout, index, kept_index, reason="checkpoints"):
+        self.count += 1
+        if reason != "checkpoints":
+            self.outfile.write("{}: {} stores the track {} layouts unlike {}, its times were not merged\n".format(
+                track, self.paths[index], "with" if reason == "layouts" else "without", self.paths[kept_index]))
+            return
+        self.outfile.write("{}{}: the checkpoints of {} differ from {}, its times were not merged\n".format(
+            track, " (" + layout + ")" if layout else "", self.paths[index], self.paths[kept_index]))
+
+
+def indexed(items, index):
+    """Passes the merged (track, entry) pairs through, adding them to the car index."""
+
+    for track, entry in items:
+        index.index_dictionary([(track, entry)])
+        yield track, entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merges the data files of several Track Sectors installs.")
+    parser.add_argument("files", nargs="+", help="data.json files, in order of priority for conflicts")
+    parser.add_argument("--output", required=True, help="merged data file")
+    parser.add_argument("--report", help="file the conflicts are written to, the standard error by default")
+    parser.add_argument("--car-index", help="also write the car index of the merged file")
+    parser.add_argument("--bucket-size", type=float, default=64, help="MB of input merged at once")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    total_size = sum(os.path.getsize(path) for path in args.files)
+    bucket_count = int(total_size / (args.bucket_size * (1 << 20))) + 1
+
+    report_file = open(args.report, "w") if args.report else sys.stderr
+    report = ConflictReport(args.files, report_file)
+    car_index = CarIndex() if args.car_index else None
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            split_into_buckets(args.files, folder, bucket_count)
+
+            date_time = ('date_time', str(datetime.now().strftime("%d_%m_%Y_%H_%M_%S")))
+            with open(args.output, "w") as outfile:
+                tracks = iter_merged_tracks(folder, bucket_count, report)
+                if car_index is not None:
+                    tracks = indexed(tracks, car_index)
+                written = write_dictionary(itertools.chain([date_time], tracks), outfile)
+    finally:
+        if report_file is not sys.stderr:
+            report_file.close()
+
+    if car_index is not None:
+        car_index.save(args.car_index, data_source(args.output, date_time[1]))
+
+    print("merged {} files, {} tracks, {} conflicts in {:.2f} s".format(
+        len(args.files), written - 1, report.count, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Replays recorded events to the companion daemon, standing in for the game.
+
+Sends the events of a file recorded by companion.py (data/events/*.events) with their
+original spacing, scaled by --speed (0 sends them all at once). Without a file, --synthetic
+generates a session of laps instead, so the daemon can be tried without the game.
+
+Usage:
+    python replay_events.py [FILE] [--host HOST] [--port PORT] [--speed SPEED]
+                            [--synthetic LAPS] [--sectors N]
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core import events
+
+
+def synthetic_events(laps, sector_count, seed=0):
+    """Encoded events of a made up session, sector times around 30s."""
+
+    generator = random.Random(seed)
+    timestamp = time.time()
+    yield events.encode_session("synthetic_track", "", "synthetic_car", timestamp)
+    for lap in range(1, laps + 1):
+        lap_time = 0.0
+        lap_valid = True
+        for sector in range(0, sector_count):
+            sector_time = 30 + generator.gauss(0, 0.3)
+            valid = generator.random() > 0.05
+            lap_valid = lap_valid and valid
+            lap_time += sector_time
+            timestamp += sector_time
+            yield events.encode_sector(sector, lap, sector_time, events.event_flags(valid), timestamp)
+        yield events.encode_lap(lap, lap_time, events.event_flags(lap_valid), timestamp)
+
+
+def recorded_events(path):
+    for event in events.iter_recorded_events(path):
+        # the decoded event is sent again as is, its timestamp kept for the pacing
+        yield event.encode()
+
+
+def replay(stream, host, port, speed):
+    sock = socket.create_connection((host, port))
+    count = 0
+    previous = None
+    try:
+        for data in stream:
+            timestamp = events.EVENT_HEADER.unpack_from(data)[6]
+            if speed > 0 and previous is not None and timestamp > previous:
+                time.sleep((timestamp - previous) / speed)
+            previous = timestamp
+            sock.sendall(data)
+            count += 1
+    finally:
+        sock.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replays recorded events to the companion daemon.")
+    parser.add_argument("file", nargs="?", help="recorded .events file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=events.COMPANION_PORT)
+    parser.add_argument("--speed", type=float, default=0, help="replay speed factor, 0 for no pauses")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of generated laps, without a file")
+    parser.add_argument("--sectors", type=int, default=3, help="sectors of the generated laps")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        stream = recorded_events(args.file)
+    elif args.synthetic > 0:
+        stream = synthetic_events(args.synthetic, args.sectors)
+    else:
+        parser.error("a recorded file or --synthetic LAPS is required")
+
+    print("sent {} events".format(replay(stream, args.host, args.port, args.speed)))
+
+
+if __name__ == "__main__":
+    main()
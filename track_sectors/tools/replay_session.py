@@ -0,0 +1,199 @@
+"""Replays the session tracking of the app (ts_core/session.py) from frames, tick by tick.
+
+A frames file has one JSON object per tick, with the values the app reads from the game:
+
+    {"in_pit": false, "progress": 0.1234, "lap": 2, "completed_laps": 2, "session": 2,
+     "session_time_left": -81234.0, "coordinates": [12.3, 4.5, -67.8]}
+
+Every state change and every action other than driving is printed. Without a file, the
+built in scenarios (pit exits, laps, jumps to the pits, session restarts, driving
+backwards...) are replayed and checked against the actions they must produce.
+
+Usage:
+    python replay_session.py [FRAMES_FILE] [--scenario NAME] [--verbose]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core.session import ACTION_NAMES, DRIVING, IDLE, STATE_NAMES, SessionTracker
+
+START = (120.0, 5.0, -340.0)
+GRID_PROGRESS = 0.98
+TICKS_PER_LAP = 600
+TICK_MS = 1000 / 60
+
+
+def frame(in_pit, progress, lap, completed_laps=None, session=0, session_time_left=0.0, coordinates=START):
+    return {'in_pit': in_pit, 'progress': progress, 'lap': lap,
+            'completed_laps': lap if completed_laps is None else completed_laps, 'session': session,
+            'session_time_left': session_time_left, 'coordinates': list(coordinates)}
+
+
+class Clock:
+    """Session time of the generated frames, counting up like in practice sessions."""
+
+    def __init__(self, session=0):
+        self.session = session
+        self.time = 0.0
+
+    def tick(self):
+        self.time += TICK_MS
+        return -self.time
+
+
+def drive(clock, lap, first=0.0, last=1.0, ticks=TICKS_PER_LAP, counted=True):
+    """Frames of driving forward from first to last, crossing the finish line when last is 1.
+    Crossing the line from the grid of a race does not count as a lap (counted False)."""
+
+    count = int((last - first) * ticks)
+    for i in range(1, count + 1):
+        progress = first + (last - first) * i / count
+        if progress >= 1:
+            lap += 1 if counted else 0
+            progress -= 1
+        yield frame(False, round(progress, 9), lap, session=clock.session, session_time_left=clock.tick(),
+                    coordinates=(START[0] + progress * 100, START[1], START[2]))
+
+
+def in_pits(clock, lap, ticks=30, progress=0.9):
+    for i in range(0, ticks):
+        yield frame(True, progress, lap, session=clock.session, session_time_left=clock.tick())
+
+
+def pit_exit_and_laps():
+    clock = Clock()
+    yield from in_pits(clock, 0)
+    yield from drive(clock, 0, 0.0, 1.0)
+    yield from drive(clock, 1, 0.0, 1.0)
+    yield from drive(clock, 2, 0.0, 0.5)
+
+
+def jump_to_pits():
+    clock = Clock()
+    yield from in_pits(clock, 0)
+    yield from drive(clock, 0, 0.0, 0.6)
+    yield from in_pits(clock, 0)
+    yield from drive(clock, 0, 0.0, 1.0)
+
+
+def driving_backwards():
+    clock = Clock()
+    yield from in_pits(clock, 0)
+    yield from drive(clock, 0, 0.0, 0.5)
+    for i in range(1, 60):
+        yield frame(False, 0.5 - i / 1000, 0, session_time_left=clock.tick())
+    yield from drive(clock, 0, 0.441, 1.0)
+
+
+def hillclimb():
+    """The finish is far from the start, the player goes back to the pits after a run."""
+
+    clock = Clock()
+    yield from in_pits(clock, 0, progress=0.0)
+    yield from drive(clock, 0, 0.0, 0.8)
+    for i in range(0, 10):
+        yield frame(False, 0.8 + i / 1000, 1, session_time_left=clock.tick())
+    yield from in_pits(clock, 1, progress=0.0)
+    yield from drive(clock, 1, 0.0, 0.3)
+
+
+def restart_from_grid():
+    """A race started on the grid, restarted half way through the first lap. For a couple of
+    ticks the game still reports the progress of before the restart."""
+
+    clock = Clock(session=2)
+    for i in range(0, 30):
+        yield frame(False, GRID_PROGRESS, 0, session=2, session_time_left=clock.tick())
+    yield from drive(clock, 0, GRID_PROGRESS, 1.0, counted=False)
+    yield from drive(clock, 0, 0.0, 0.5)
+    clock.time = 0.0
+    for i in range(0, 2):
+        yield frame(False, 0.5, 0, session=2, session_time_left=clock.tick())
+    for i in range(0, 30):
+        yield frame(False, GRID_PROGRESS, 0, session=2, session_time_left=clock.tick())
+    yield from drive(clock, 0, GRID_PROGRESS, 1.0, counted=False)
+    yield from drive(clock, 0, 0.0, 1.0)
+
+
+# scenario -> (frames, actions expected in order, driving and idle ticks left out)
+SCENARIOS = {
+    'pit_exit_and_laps': (pit_exit_and_laps, ["new lap", "new lap"]),
+    'jump_to_pits': (jump_to_pits, ["reset", "new lap"]),
+    'driving_backwards': (driving_backwards, ["new lap"]),
+    'hillclimb': (hillclimb, ["lap finished", "reset"]),
+    'restart_from_grid': (restart_from_grid, ["reset", "new lap"]),
+}
+
+
+def replay(frames, verbose=False, output=sys.stdout):
+    """Feeds the frames to a tracker, started like the app starts it on the first frame.
+    returns the actions other than driving and idle in order, an action repeated on
+    consecutive ticks (like lap finished, until the position wraps around) counted once"""
+
+    tracker = None
+    actions = []
+    previous = IDLE
+    driving = 0
+    for tick, values in enumerate(frames):
+        if tracker is None:
+            tracker = SessionTracker()
+            tracker.start_session(values['in_pit'])
+        if tracker.start_bounds is None:
+            tracker.capture_start(values['coordinates'], values['progress'])
+
+        state = tracker.state
+        action = tracker.update(values['in_pit'], values['progress'], values['lap'], values['completed_laps'],
+                                values['session'], values['session_time_left'], values['coordinates'])
+        repeated = action == previous
+        previous = action
+        if action == DRIVING:
+            driving += 1
+        elif action != IDLE and not repeated:
+            actions.append(ACTION_NAMES[action])
+
+        if verbose or tracker.state != state or (action not in (IDLE, DRIVING) and not repeated):
+            output.write("{:6d}  lap {:3d}  progress {:.4f}  {:>8} -> {:<8}  {}\n".format(
+                tick, values['lap'], values['progress'], STATE_NAMES[state], STATE_NAMES[tracker.state],
+                ACTION_NAMES[action]))
+    output.write("{} driving ticks\n".format(driving))
+    return actions
+
+
+def iter_frames(path):
+    with open(path, "r") as infile:
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replays the session tracking of Track Sectors from frames.")
+    parser.add_argument("frames", nargs="?", help="JSON lines file, one frame per tick")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), help="only replay this built in scenario")
+    parser.add_argument("--verbose", action="store_true", help="print every tick")
+    args = parser.parse_args(argv)
+
+    if args.frames:
+        replay(iter_frames(args.frames), args.verbose)
+        return
+
+    failed = 0
+    for name in sorted(SCENARIOS):
+        if args.scenario and name != args.scenario:
+            continue
+        scenario, expected = SCENARIOS[name]
+        print(name)
+        actions = replay(scenario(), args.verbose)
+        if actions != expected:
+            failed += 1
+            print("unexpected actions {}, expected {}".format(actions, expected))
+        print()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
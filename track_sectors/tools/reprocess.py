@@ -0,0 +1,184 @@
+"""Times the recorded telemetry again, with other sector checkpoints or timing parameters.
+
+Every lap recorded with record_telemetry (data/telemetry/, one .trc file per car and track
+configuration) is pushed through the app's timing rules (ts_core/timing.py), as if it was
+driven again with the given checkpoints. The files are spread over a pool of processes
+and the results of each car are merged: best time, lap count, mean and standard deviation
+of every sector.
+
+Without --checkpoints, the checkpoints stored in data.json for the configuration of each
+file are used, which is handy to compare the timing parameters.
+
+Usage:
+    python reprocess.py [FILE_OR_FOLDER ...] [--data DATA_FOLDER] [--checkpoints 0.25,0.5,...]
+                        [--ratio R] [--low-progress P] [--interpolate] [--workers N]
+                        [--output FILE]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core.consistency import SectorConsistency
+from ts_core.json_stream import iter_object_items
+from ts_core.stored_data import iter_configurations, checkpoints_of
+from ts_core.timing import LapTimer, time_lap
+from ts_core.trace_file import TraceReader
+from ts_core.track_map import config_file_name
+
+
+class SectorResults:
+    """Best time and consistency statistics of every sector, over any number of laps."""
+
+    def __init__(self, sector_count):
+        self.laps = 0
+        self.missed = 0
+        self.best = [None] * sector_count
+        self.consistency = SectorConsistency(sector_count)
+
+    def add(self, times):
+        self.laps += 1
+        for i, sector_time in enumerate(times):
+            if sector_time is None:
+                self.missed += 1
+                continue
+            self.consistency.add(i, sector_time)
+            if self.best[i] is None or sector_time < self.best[i]:
+                self.best[i] = sector_time
+
+    def merge(self, other):
+        self.laps += other.laps
+        self.missed += other.missed
+        self.consistency.merge(other.consistency)
+        for i, best in enumerate(other.best):
+            if best is not None and (self.best[i] is None or best < self.best[i]):
+                self.best[i] = best
+
+
+def process_file(path, checkpoints, ratio, low_progress, interpolate):
+    """Runs in a worker process, returns (path, results, sample count)."""
+
+    timer = LapTimer(checkpoints, ratio, low_progress, interpolate)
+    results = SectorResults(len(checkpoints))
+    samples = 0
+    with TraceReader(path) as reader:
+        for lap in reader:
+            # plain lists, indexing numpy arrays one value at a time is slower
+            progress = lap['progress'].tolist() if hasattr(lap['progress'], 'tolist') else lap['progress']
+            lap_time = lap['lap_time'].tolist() if hasattr(lap['lap_time'], 'tolist') else lap['lap_time']
+            samples += len(progress)
+            results.add(time_lap(timer, progress, lap_time))
+    return path, results, samples
+
+
+def iter_trace_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folders, files in os.walk(path):
+                folders.sort()
+                for file_name in sorted(files):
+                    if file_name.endswith(".trc"):
+                        yield os.path.join(folder, file_name)
+        else:
+            yield path
+
+
+def stored_checkpoints(data_folder, configurations):
+    """Checkpoints of data.json for the given configuration folder names."""
+
+    found = {}
+    for track, track_entry in iter_object_items(os.path.join(data_folder, "data.json")):
+        for layout, entry in iter_configurations(track, track_entry):
+            name = config_file_name(track, layout, "")
+            if name in configurations:
+                found[name] = checkpoints_of(entry)
+    return found
+
+
+def parse_checkpoints(text):
+    checkpoints = sorted(float(value) for value in text.split(","))
+    if not checkpoints or checkpoints[0] <= 0:
+        raise argparse.ArgumentTypeError("checkpoints are comma separated track fractions, above 0")
+    return checkpoints
+
+
+def write_results(merged, outfile):
+    writer = csv.writer(outfile, lineterminator="\n")
+    writer.writerow(['configuration', 'car', 'sector', 'laps', 'missed', 'best', 'mean', 'std'])
+    for (configuration, car), results in sorted(merged.items()):
+        for i, best in enumerate(results.best):
+            std = results.consistency.std(i)
+            writer.writerow([configuration, car, i + 1, results.laps, results.missed,
+                             None if best is None else round(best, 3),
+                             round(results.consistency.mean[i], 3) if results.consistency.count[i] else None,
+                             None if std is None else round(std, 3)])
+
+
+def main(argv=None):
+    default_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+
+    parser = argparse.ArgumentParser(description="Times the recorded telemetry of Track Sectors again.")
+    parser.add_argument("files", nargs="*", help=".trc files or folders, data/telemetry by default")
+    parser.add_argument("--data", default=default_data, help="the app's data folder")
+    parser.add_argument("--checkpoints", type=parse_checkpoints, help="comma separated, like 0.33,0.66,1")
+    parser.add_argument("--ratio", type=float, default=0.30, help="biggest accepted jump of the position")
+    parser.add_argument("--low-progress", type=float, default=0.05, help="position below which jumps are accepted")
+    parser.add_argument("--interpolate", action="store_true", help="interpolate the crossing times between ticks")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes, all the cores by default")
+    parser.add_argument("--output", help="CSV file of the results, the standard output by default")
+    args = parser.parse_args(argv)
+
+    paths = list(iter_trace_files(args.files or [os.path.join(args.data, "telemetry")]))
+    if not paths:
+        parser.error("no recorded telemetry found, enable record_telemetry in the config file")
+
+    # the configuration is the name of the folder the file is in, the car the file name
+    keys = {path: (os.path.basename(os.path.dirname(os.path.abspath(path))), os.path.basename(path)[:-len(".trc")])
+            for path in paths}
+    if args.checkpoints is None:
+        checkpoints = stored_checkpoints(args.data, set(configuration for configuration, car in keys.values()))
+        missing = [path for path in paths if keys[path][0] not in checkpoints]
+        for path in missing:
+            print("{}: no checkpoints stored for {}, skipped".format(path, keys[path][0]), file=sys.stderr)
+            paths.remove(path)
+    else:
+        checkpoints = None
+
+    start = time.time()
+    merged = {}
+    laps = samples = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(process_file, path,
+                                   args.checkpoints if checkpoints is None else checkpoints[keys[path][0]],
+                                   args.ratio, args.low_progress, args.interpolate)
+                   for path in paths]
+        for done, future in enumerate(as_completed(futures)):
+            path, results, file_samples = future.result()
+            if keys[path] in merged:
+                merged[keys[path]].merge(results)
+            else:
+                merged[keys[path]] = results
+            laps += results.laps
+            samples += file_samples
+            elapsed = max(time.time() - start, 1e-6)
+            print("\r{}/{} files, {} laps, {:.0f} laps/s, {:.0f} samples/s".format(
+                done + 1, len(paths), laps, laps / elapsed, samples / elapsed), end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    outfile = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        write_results(merged, outfile)
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    print("{} files, {} laps, {} samples in {:.2f} s with {} workers".format(
+        len(paths), laps, samples, time.time() - start, args.workers), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Offline per sector statistics of the times recorded by the app.
+
+Reads the app's data folder (data.json and the lap traces in data/laps/) without the game,
+and computes for every track/layout and car, per sector: lap count, best, mean,
+standard deviation and percentiles, plus the theoretical best lap. A row for all the cars
+combined ('*') is added for every configuration.
+
+data.json is streamed track by track, so only one configuration is held in memory at a time.
+
+Usage:
+    python sector_stats.py [--data DATA_FOLDER] [--format csv|json] [--output FILE]
+                           [--track TRACK] [--percentiles 10,50,90]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core.json_stream import iter_object_items
+from ts_core.lap_traces import load_traces, split_laps_vectorized
+from ts_core.stored_data import iter_configurations, iter_cars, checkpoints_of, sector_times_of
+from ts_core.track_map import config_file_name
+
+ALL_CARS = "*"
+
+
+def sector_statistics(laps, stored_best, percentiles):
+    """Statistics of every sector, laps being a (laps x sectors) array of sector times
+    and stored_best the best times kept in data.json (which also include partial laps)."""
+
+    sector_count = len(stored_best)
+    stored = numpy.array([numpy.nan if i is None else i for i in stored_best], dtype=numpy.float64)
+
+    if len(laps) != 0:
+        best = numpy.fmin(laps.min(axis=0), stored)
+        mean = laps.mean(axis=0)
+        std = laps.std(axis=0, ddof=1) if len(laps) > 1 else numpy.zeros(sector_count)
+        quantiles = numpy.percentile(laps, percentiles, axis=0)
+    else:
+        best = stored
+        mean = std = numpy.full(sector_count, numpy.nan)
+        quantiles = numpy.full((len(percentiles), sector_count), numpy.nan)
+
+    return best, mean, std, quantiles
+
+
+def configuration_rows(data_folder, track, layout, entry, percentiles):
+    """Yields the report rows of one track/layout configuration."""
+
+    checkpoints = checkpoints_of(entry)
+    sector_count = len(checkpoints)
+    trace_folder = os.path.join(data_folder, "laps", config_file_name(track, layout, ""))
+
+    cars = {}
+    for car, car_entry in iter_cars(entry):
+        cars[car] = sector_times_of(car_entry, sector_count)
+
+    # cars that only have lap traces, their times were stored under an older configuration
+    if os.path.isdir(trace_folder):
+        for file_name in os.listdir(trace_folder):
+            if file_name.endswith(".laps"):
+                cars.setdefault(file_name[:-len(".laps")], [None] * sector_count)
+
+    all_laps = []
+    all_best = [None] * sector_count
+    for car in sorted(cars):
+        traces = load_traces(os.path.join(trace_folder, car + ".laps"))
+        if len(traces) != 0:
+            laps = split_laps_vectorized(traces, checkpoints)
+        else:
+            laps = numpy.empty((0, sector_count))
+        all_laps.append(laps)
+
+        best, mean, std, quantiles = sector_statistics(laps, cars[car], percentiles)
+        for i in range(0, sector_count):
+            if not numpy.isnan(best[i]) and (all_best[i] is None or best[i] < all_best[i]):
+                all_best[i] = float(best[i])
+        for row in rows_of(track, layout, car, len(laps), best, mean, std, quantiles, percentiles):
+            yield row
+
+    if cars:
+        laps = numpy.concatenate(all_laps)
+        best, mean, std, quantiles = sector_statistics(laps, all_best, percentiles)
+        for row in rows_of(track, layout, ALL_CARS, len(laps), best, mean, std, quantiles, percentiles):
+            yield row
+
+
+def rows_of(track, layout, car, lap_count, best, mean, std, quantiles, percentiles):
+    for i in range(0, len(best)):
+        row = {'track': track, 'layout': layout, 'car': car, 'sector': i + 1, 'laps': lap_count,
+               'best': rounded(best[i]), 'mean': rounded(mean[i]), 'std': rounded(std[i])}
+        for j in range(0, len(percentiles)):
+            row['p' + str(percentiles[j])] = rounded(quantiles[j][i])
+        yield row
+
+    # the theoretical best only makes sense if every sector has a time
+    theoretical = None if numpy.isnan(best).any() else rounded(best.sum())
+    yield {'track': track, 'layout': layout, 'car': car, 'sector': 'theoretical', 'laps': lap_count,
+           'best': theoretical}
+
+
+def rounded(value):
+    value = float(value)
+    return None if numpy.isnan(value) else round(value, 3)
+
+
+def iter_rows(data_folder, percentiles, track_filter=None):
+    for track, track_entry in iter_object_items(os.path.join(data_folder, "data.json")):
+        if track_filter is not None and track != track_filter:
+            continue
+        for layout, entry in iter_configurations(track, track_entry):
+            for row in configuration_rows(data_folder, track, layout, entry, percentiles):
+                yield row
+
+
+def write_csv(rows, outfile, percentiles):
+    fields = ['track', 'layout', 'car', 'sector', 'laps', 'best', 'mean', 'std'] + \
+             ['p' + str(i) for i in percentiles]
+    writer = csv.DictWriter(outfile, fieldnames=fields, lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_json(rows, outfile):
+    """Writes the rows as a JSON array, one row at a time."""
+
+    outfile.write("[")
+    separator = "\n"
+    for row in rows:
+        outfile.write(separator + json.dumps(row))
+        separator = ",\n"
+    outfile.write("\n]\n")
+
+
+def main(argv=None):
+    default_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+
+    parser = argparse.ArgumentParser(description="Per sector statistics of the times recorded by Track Sectors.")
+    parser.add_argument("--data", default=default_data, help="the app's data folder")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--output", help="output file, the standard output by default")
+    parser.add_argument("--track", help="only report this track")
+    parser.add_argument("--percentiles", default="10,50,90", help="comma separated percentiles")
+    args = parser.parse_args(argv)
+
+    if numpy is None:
+        parser.error("numpy is required, install it with 'pip install numpy'")
+
+    percentiles = [int(i) for i in args.percentiles.split(",") if i]
+    rows = iter_rows(args.data, percentiles, args.track)
+
+    outfile = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            write_csv(rows, outfile, percentiles)
+        else:
+            write_json(rows, outfile)
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Scale benchmark of the app's storage, the DataDictionary class and its data.json file.
+
+For every combination of track, car and sector counts, a synthetic data.json is generated
+(one layout per track, every car with a time and consistency statistics for every sector)
+in a temporary copy of the app, then the app's own DataDictionary is measured:
+
+    first_load   load without car_index.json, so the cross car index is rebuilt
+    load         load with the index, like every session after the first one
+    load_peak    peak memory allocated by a load, measured in a separate run (tracemalloc
+                 slows everything down)
+    backup       create_backup() with 10 backups already there, so the oldest is rotated out
+    update       update() of the best times of the current car
+    resector     update() after the checkpoints of the current track changed, which splits
+                 the stored lap traces (--laps per car, generated for every car of the
+                 track) with the new checkpoints and rewrites the top laps of every car
+    save         save() of data.json and of the car index
+
+One JSON object per combination is written, with the sizes, the times in seconds (best of
+--repeat runs) and "backend": "json", so other storage backends can be compared.
+Combinations with more than --max-times sector times are skipped.
+
+Usage:
+    python storage_benchmark.py [--tracks 1,100,2000] [--cars 1,30,300] [--sectors 2,20,999]
+                                [--laps N] [--max-times N] [--repeat N] [--output FILE]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from game_stand_in import APP_FOLDER, load_app
+from merge_data import write_dictionary
+from ts_core.lap_traces import LAP_TRACE_RESOLUTION
+
+TRACK = "track_0"
+LAYOUT = "gp"
+CAR = "car_0"
+BACKUPS_KEPT = 10
+
+
+def count_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def checkpoints(sector_count):
+    # the last sector ends on the finish line
+    return [round((i + 1) / sector_count, 6) for i in range(0, sector_count - 1)] + [2]
+
+
+def configuration(track_index, car_count, sector_count, generator):
+    entry = OrderedDict()
+    entry['sector_checkpoints'] = OrderedDict(
+        ("sector_" + str(i + 1), checkpoint) for i, checkpoint in enumerate(checkpoints(sector_count)))
+    entry['sector_count'] = sector_count
+    for car in range(0, car_count):
+        times = OrderedDict()
+        stats = OrderedDict()
+        for i in range(0, sector_count):
+            best = round(generator.uniform(20, 40) / sector_count * 3, 3)
+            times["sector_" + str(i + 1)] = best
+            stats["sector_" + str(i + 1)] = [generator.randint(1, 200), round(best * 1.02, 6), round(best * 0.01, 6)]
+        times['sector_stats'] = stats
+        entry["car_" + str(car)] = times
+    return OrderedDict([(LAYOUT, entry)])
+
+
+def write_data(path, track_count, car_count, sector_count):
+    """Generates data.json one track at a time."""
+
+    generator = random.Random(track_count * 1000003 + car_count * 1009 + sector_count)
+    tracks = (("track_" + str(i), configuration(i, car_count, sector_count, generator)) for i in range(0, track_count))
+    with open(path, "w") as outfile:
+        write_dictionary(itertools.chain([('date_time', "01_01_2000_00_00_00")], tracks), outfile)
+
+
+def write_lap_traces(folder, car_count, lap_count):
+    """Stored laps of every car of the measured track, in the app's lap trace format: the lap
+    time at every bin, the pace varying along the lap."""
+
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    generator = random.Random(car_count * 1009 + lap_count)
+    for car in range(0, car_count):
+        traces = array('f')
+        for lap in range(0, lap_count):
+            steps = [generator.uniform(0.5, 1.5) for i in range(0, LAP_TRACE_RESOLUTION)]
+            scale = generator.uniform(80, 100) / sum(steps)
+            lap_time = 0.0
+            traces.append(lap_time)
+            for step in steps:
+                lap_time += step * scale
+                traces.append(lap_time)
+        with open(os.path.join(folder, "car_" + str(car) + ".laps"), "wb") as outfile:
+            traces.tofile(outfile)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def best_of(repeat, function):
+    return min(timed(function)[0] for i in range(0, repeat))
+
+
+def fill_backups(data_folder):
+    backups = os.path.join(data_folder, "backups")
+    shutil.rmtree(backups)
+    os.makedirs(backups)
+    for i in range(0, BACKUPS_KEPT):
+        shutil.copy(os.path.join(data_folder, "data.json"), os.path.join(backups, "data_old_" + str(i) + ".json"))
+
+
+def measure(app, data_folder, track_count, car_count, sector_count, lap_count, repeat):
+    data_path = os.path.join(data_folder, "data.json")
+    index_path = os.path.join(data_folder, "car_index.json")
+    write_data(data_path, track_count, car_count, sector_count)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    fill_backups(data_folder)
+
+    result = OrderedDict([('backend', "json"), ('tracks', track_count), ('cars', car_count),
+                          ('sectors', sector_count), ('times', track_count * car_count * sector_count),
+                          ('file_bytes', os.path.getsize(data_path))])
+
+    result['first_load'], stored_data = timed(lambda: app.DataDictionary(TRACK, LAYOUT, CAR))
+    stored_data.sector_count = sector_count
+    stored_data.save()
+    result['index_bytes'] = os.path.getsize(index_path)
+    result['load'] = best_of(repeat, lambda: app.DataDictionary(TRACK, LAYOUT, CAR))
+
+    tracemalloc.start()
+    app.DataDictionary(TRACK, LAYOUT, CAR)
+    result['load_peak'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    fill_backups(data_folder)
+    result['backup'] = best_of(repeat, stored_data.create_backup)
+
+    # the best times of the session, read from the labels by the app
+    app.get_time = lambda time_type, index, extra_flag=False: round(10 / sector_count, 3)
+
+    stored_data = app.DataDictionary(TRACK, LAYOUT, CAR)
+    stored_data.sector_count = sector_count
+    stored_data.structure_update_flag = False
+    stored_data.time_update_flag = True
+    result['update'] = best_of(repeat, stored_data.update)
+    result['save'] = best_of(repeat, stored_data.save)
+
+    write_lap_traces(stored_data.lap_trace_folder, car_count, lap_count)
+    result['laps'] = car_count * lap_count
+    stored_data.structure_update_flag = True
+    stored_data.track_valid_flag = True
+    stored_data.imported_checkpoints = checkpoints(sector_count)
+    result['resector'] = best_of(repeat, stored_data.update)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scale benchmark of the app's data storage.")
+    parser.add_argument("--tracks", type=count_list, default=[1, 100, 2000])
+    parser.add_argument("--cars", type=count_list, default=[1, 30, 300])
+    parser.add_argument("--sectors", type=count_list, default=[2, 20, 999])
+    parser.add_argument("--laps", type=int, default=20, help="stored laps per car, split again by resector")
+    parser.add_argument("--max-times", type=int, default=2000000, help="skip bigger combinations")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON lines file, the standard output by default")
+    args = parser.parse_args(argv)
+
+    outfile = open(args.output, "w") if args.output else sys.stdout
+    with tempfile.TemporaryDirectory() as game_folder:
+        app, car, info, app_copy = load_app(game_folder)
+        data_folder = os.path.join(app_copy, "data")
+        try:
+            for track_count, car_count, sector_count in itertools.product(args.tracks, args.cars, args.sectors):
+                if track_count * car_count * sector_count > args.max_times:
+                    print("skipped {} tracks, {} cars, {} sectors".format(track_count, car_count, sector_count),
+                          file=sys.stderr)
+                    continue
+                result = measure(app, data_folder, track_count, car_count, sector_count, args.laps, args.repeat)
+                result['python'] = platform.python_version()
+                outfile.write(json.dumps(result) + "\n")
+                outfile.flush()
+                print("{} tracks, {} cars, {} sectors: {:.1f} MB, load {:.3f} s ({:.1f} MB peak), update {:.4f} s,"
+                      " save {:.3f} s, backup {:.3f} s, resector {:.3f} s".format(
+                        track_count, car_count, sector_count, result['file_bytes'] / 1e6, result['load'],
+                        result['load_peak'] / 1e6, result['update'], result['save'], result['backup'],
+                        result['resector']),
+                      file=sys.stderr)
+        finally:
+            os.chdir(APP_FOLDER)
+            if outfile is not sys.stdout:
+                outfile.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Fastest cars per sector of a track/layout, from the app's cross car index.
+
+Uses data/car_index.json, the index is built by streaming data.json if it is missing or
+out of date.
+
+Usage:
+    python top_cars.py TRACK [--layout LAYOUT] [--sector N] [-k K] [--data DATA_FOLDER]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core.car_index import CarIndex, data_source
+from ts_core.json_stream import iter_object_items
+
+
+def load_index(data_folder):
+    data_path = os.path.join(data_folder, "data.json")
+    # the app writes date_time first, only that much of the file is read
+    date_time = None
+    for key, value in iter_object_items(data_path):
+        if key == 'date_time':
+            date_time = value
+        break
+
+    index = CarIndex.load(os.path.join(data_folder, "car_index.json"), data_source(data_path, date_time))
+    if index is None:
+        index = CarIndex()
+        index.index_dictionary(iter_object_items(data_path))
+    return index
+
+
+def main(argv=None):
+    default_data = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+
+    parser = argparse.ArgumentParser(description="Fastest cars per sector of a track/layout.")
+    parser.add_argument("track")
+    parser.add_argument("--layout", default="", help="track layout, empty for tracks without layouts")
+    parser.add_argument("--sector", type=int, help="only show this sector (1 based)")
+    parser.add_argument("-k", type=int, default=3, help="number of cars shown per sector")
+    parser.add_argument("--data", default=default_data, help="the app's data folder")
+    args = parser.parse_args(argv)
+
+    index = load_index(args.data)
+    key = CarIndex.key(args.track, args.layout)
+    if key not in index.configurations:
+        parser.error("no configuration stored for " + key)
+
+    sector_count = len(index.configurations[key]['checkpoints'])
+    sectors = [args.sector - 1] if args.sector else range(0, sector_count)
+    for sector in sectors:
+        print("Sector " + str(sector + 1))
+        for position, (sector_time, car) in enumerate(index.top_cars(key, sector, args.k)):
+            print("  {}. {:.3f}  {}".format(position + 1, sector_time, car))
+
+    theoretical_best = index.theoretical_best(key)
+    print("Theoretical best (all cars): " + ("-" if theoretical_best is None else "{:.3f}".format(theoretical_best)))
+
+
+if __name__ == "__main__":
+    main()
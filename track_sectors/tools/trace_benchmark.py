@@ -0,0 +1,93 @@
+"""Compression ratio and decode speed of the app's lap trace format (ts_core/trace_file.py).
+
+Writes generated laps (or the laps of an existing .trc file from data/telemetry/) to a
+temporary trace file, then reports the size against raw float32 samples, the encode and
+decode throughput and the time to read a single lap.
+
+Usage:
+    python trace_benchmark.py [--laps N] [--rate HZ] [--lap-time S] [--file TRC_FILE]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core import trace_file
+from ts_core.trace_file import TraceReader, TraceWriter
+
+
+def generated_lap(rate, lap_time, seed):
+    """A lap around a 4 km circle with a varying speed and a bit of sensor noise."""
+
+    generator = random.Random(seed)
+    samples = int(rate * lap_time)
+    channels = [array('f') for i in range(0, 6)]
+    for i in range(0, samples):
+        fraction = i / samples
+        angle = 2 * math.pi * fraction
+        channels[0].append(fraction)
+        channels[1].append(i / rate)
+        channels[2].append(160 + 60 * math.sin(angle * 9) + generator.gauss(0, 0.05))
+        channels[3].append(640 * math.cos(angle))
+        channels[4].append(12 * math.sin(angle * 3))
+        channels[5].append(640 * math.sin(angle))
+    return channels
+
+
+def file_laps(path):
+    with TraceReader(path) as reader:
+        for lap in reader:
+            yield [array('f', lap[name]) for name, scale in reader.channels]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the compressed lap trace format.")
+    parser.add_argument("--laps", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=333, help="samples per second of the generated laps")
+    parser.add_argument("--lap-time", type=float, default=90, help="seconds per generated lap")
+    parser.add_argument("--file", help="use the laps of this trace file instead of generated ones")
+    args = parser.parse_args(argv)
+
+    if args.file:
+        laps = list(file_laps(args.file))
+    else:
+        laps = [generated_lap(args.rate, args.lap_time, seed) for seed in range(0, args.laps)]
+    samples = sum(len(lap[0]) for lap in laps)
+    raw_size = sum(len(channel) * 4 for lap in laps for channel in lap)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "benchmark.trc")
+        writer = TraceWriter(path)
+        for lap in laps:
+            writer.add(lap)
+        start = time.perf_counter()
+        writer.save()
+        encode_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        with TraceReader(path) as reader:
+            start = time.perf_counter()
+            for lap in reader:
+                pass
+            decode_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            reader.lap(len(reader) // 2)
+            single_time = time.perf_counter() - start
+
+    print("numpy: {}".format("yes" if trace_file.numpy is not None else "no"))
+    print("{} laps, {} samples, raw float32 {:.1f} KB, stored {:.1f} KB, ratio {:.1f}x".format(
+        len(laps), samples, raw_size / 1024, size / 1024, raw_size / size))
+    print("encode {:.0f} samples/s ({:.1f} MB/s raw)".format(samples / encode_time, raw_size / encode_time / 1e6))
+    print("decode {:.0f} samples/s ({:.1f} MB/s raw)".format(samples / decode_time, raw_size / decode_time / 1e6))
+    print("single lap read {:.2f} ms".format(single_time * 1000))
+
+
+if __name__ == "__main__":
+    main()
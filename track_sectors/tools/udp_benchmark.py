@@ -0,0 +1,89 @@
+"""Loopback latency and throughput of the app's UDP events.
+
+Sends events through the app's DatagramSender to a receiver on 127.0.0.1, flushing the
+queue once per simulated game tick like the app does, and reports how many events
+arrived, the events per second and the latency from encoding to reception.
+
+Usage:
+    python udp_benchmark.py [--events N] [--per-tick N] [--tick-rate HZ] [--port PORT]
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core import events
+from ts_core.event_sender import DatagramSender
+
+
+def receive(sock, count, latencies):
+    received = 0
+    while received < count:
+        try:
+            datagram = sock.recv(65536)
+        except socket.timeout:
+            break
+        now = time.time()
+        event, end = events.decode_event(datagram)
+        if event is not None and event.type == events.SECTOR:
+            latencies.append(now - event.timestamp)
+            received += 1
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(event_count, per_tick, tick_rate, port):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    receiver.bind(("127.0.0.1", port))
+    receiver.settimeout(1.0)
+    port = receiver.getsockname()[1]
+
+    latencies = []
+    thread = threading.Thread(target=receive, args=(receiver, event_count, latencies))
+    thread.start()
+
+    sender = DatagramSender("127.0.0.1", port)
+    tick = 1 / tick_rate if tick_rate > 0 else 0
+    start = time.time()
+    for i in range(0, event_count):
+        sender.send(events.encode_sector(i % 20, i // 20, 30.0, events.event_flags(True), time.time()))
+        if (i + 1) % per_tick == 0:
+            sender.flush()
+            if tick:
+                time.sleep(tick)
+    sender.flush()
+    elapsed = time.time() - start
+
+    thread.join()
+    sender.close()
+    receiver.close()
+
+    latencies.sort()
+    print("sent {} events in {:.3f} s, {:.0f} events/s".format(event_count, elapsed, event_count / elapsed))
+    print("received {} ({} dropped by the queue, {} lost)".format(
+        len(latencies), sender.dropped, event_count - sender.dropped - len(latencies)))
+    if latencies:
+        print("latency ms: p50 {:.3f}  p99 {:.3f}  max {:.3f}".format(
+            percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, latencies[-1] * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loopback latency and throughput of the UDP events.")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--per-tick", type=int, default=10, help="events queued between two flushes")
+    parser.add_argument("--tick-rate", type=float, default=0, help="simulated ticks per second, 0 for no pauses")
+    parser.add_argument("--port", type=int, default=0, help="receiving port, a free one by default")
+    args = parser.parse_args(argv)
+
+    run(args.events, args.per_tick, args.tick_rate, args.port)
+
+
+if __name__ == "__main__":
+    main()
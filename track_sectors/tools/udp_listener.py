@@ -0,0 +1,74 @@
+"""Reference listener of the UDP events of the app, for rig dashboards.
+
+Set udp_port (and udp_address, the local network broadcast address by default) in the
+app's config file, every sector time, new best and completed lap is then sent as one
+datagram with the fixed layout of ts_core/events.py. This prints them as text, or as one
+JSON object per line with --json.
+
+Usage:
+    python udp_listener.py [--port PORT] [--bind ADDRESS] [--json]
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from ts_core import events
+
+
+def describe(event, received):
+    latency = (received - event.timestamp) * 1000
+    if event.type == events.SESSION:
+        return "session {} {} {}".format(*event.session_names())
+    if event.type == events.SECTOR:
+        return "lap {} sector {} {:.3f}{}{}  ({:.1f} ms)".format(
+            event.lap, event.sector + 1, event.time, "" if event.valid else " invalid",
+            " new best" if event.new_best else "", latency)
+    if event.type == events.LAP:
+        return "lap {} {:.3f}{}  ({:.1f} ms)".format(event.lap, event.time, "" if event.valid else " invalid", latency)
+    return "unknown event type " + str(event.type)
+
+
+def as_json(event, received):
+    values = {"type": event.type, "lap": event.lap, "time": round(event.time, 3), "valid": event.valid,
+              "new_best": event.new_best, "timestamp": event.timestamp, "received": received}
+    if event.type == events.SESSION:
+        values["track"], values["layout"], values["car"] = event.session_names()
+    elif event.type == events.SECTOR:
+        values["sector"] = event.sector + 1
+    return json.dumps(values)
+
+
+def listen(port, bind_address, output_json):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((bind_address, port))
+    while True:
+        datagram = sock.recv(65536)
+        received = time.time()
+        event, end = events.decode_event(datagram)
+        if event is None:
+            continue
+        print(as_json(event, received) if output_json else describe(event, received))
+        sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prints the UDP events sent by Track Sectors.")
+    parser.add_argument("--port", type=int, default=events.COMPANION_PORT, help="the app's udp_port")
+    parser.add_argument("--bind", default="", help="local address to listen on, all by default")
+    parser.add_argument("--json", action="store_true", help="one JSON object per line")
+    args = parser.parse_args(argv)
+
+    try:
+        listen(args.port, args.bind, args.json)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
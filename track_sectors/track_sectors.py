@@ -9,6 +9,7 @@ import sys
 import time
 import threading
 import struct
+from array import array
 from third_party.playsound import playsound
 from collections import OrderedDict
 from datetime import datetime
@@ -25,6 +26,27 @@ sys.path.insert(0, os.path.join(cwd, dllfolder))
 os.environ['PATH'] = os.environ['PATH'] + ";."
 
 from third_party.sim_info_ts2 import info
+from ts_core.ai_line import load_ai_line, propose_checkpoints
+from ts_core.car_index import CarIndex, data_source
+from ts_core.consistency import SectorConsistency
+from ts_core.delta import DeltaTable
+from ts_core.distance import DistanceTable, build_distance_table
+from ts_core.event_sender import DatagramSender, EventSender
+from ts_core.events import encode_lap, encode_sector, encode_session, event_flags
+from ts_core.heatmap import HeatmapStrip
+from ts_core import journal as records
+from ts_core.journal import EventJournal
+from ts_core.lap_traces import LapTraceStore, lap_times, load_traces, split_laps
+from ts_core.recent_best import RecentBests
+from ts_core.sampler import SampleRing, Sampler
+from ts_core.sector_speeds import SectorSpeeds
+from ts_core.session import DRIVING, LAP_FINISHED, NEW_LAP, RESET, SessionTracker
+from ts_core.stored_data import sector_times_of
+from ts_core.telemetry import LapTelemetry
+from ts_core.timing import CrossingDetector
+from ts_core.top_laps import TopLaps
+from ts_core.trace_file import TraceWriter
+from ts_core.track_map import TrackMap, build_track_map, config_file_name
 
 
 class Config:
@@ -53,10 +75,24 @@ class Config:
             if not self.cfg_parser.has_section(section):
                 self.cfg_parser.add_section(section)
 
+            # same for options, config files from older versions won't have the newer settings
+            # the comments in the defaults file are not preceded by whitespace, so they must be split manually
+            for option in self.defaults_parser.options(section):
+                if not self.cfg_parser.has_option(section, option):
+                    value = self.defaults_parser.get(section, option).split(";")[0].strip()
+                    self.cfg_parser.set(section, option, value)
+                    self.update_cfg = True
+
         # Loading values
         self.main_window_scale = float(self.cfg_parser["MAIN_APP"]["main_window_scale"])
         self.main_window_opacity = float(self.cfg_parser["MAIN_APP"]["opacity_level"])
         self.theoretical_best = int(self.cfg_parser["MAIN_APP"]["theoretical_best"])
+        self.consistency_row = int(self.cfg_parser["MAIN_APP"]["consistency_row"])
+        self.heatmap_strip = int(self.cfg_parser["MAIN_APP"]["heatmap_strip"])
+        self.live_delta = int(self.cfg_parser["MAIN_APP"]["live_delta"])
+        self.average_speed = int(self.cfg_parser["MAIN_APP"]["average_speed"])
+        self.delta_reference = int(self.cfg_parser["MAIN_APP"]["delta_reference"])
+        self.recent_laps = max(1, int(self.cfg_parser["MAIN_APP"]["recent_laps"]))
 
         self.settings_window_scale = float(self.cfg_parser["SETTINGS_APP"]["settings_window_scale"])
         self.ui_layout = int(self.cfg_parser["MAIN_APP"]["ui_layout"])
@@ -64,6 +100,13 @@ class Config:
         self.settings_window_opacity = int(self.cfg_parser["SETTINGS_APP"]["opacity_level"])
         self.max_sector_number = int(self.cfg_parser["SETTINGS_APP"]["max_sector_number"])
         self.next_page_delay = int(self.cfg_parser["SETTINGS_APP"]["next_page_delay"])
+        self.top_laps = int(self.cfg_parser["SETTINGS_APP"]["top_laps"])
+        self.tyres_out_limit = int(self.cfg_parser["SETTINGS_APP"]["tyres_out_limit"])
+        self.sampler_rate = int(self.cfg_parser["SETTINGS_APP"]["sampler_rate"])
+        self.companion_port = int(self.cfg_parser["SETTINGS_APP"]["companion_port"])
+        self.udp_port = int(self.cfg_parser["SETTINGS_APP"]["udp_port"])
+        self.udp_address = self.cfg_parser["SETTINGS_APP"]["udp_address"]
+        self.record_telemetry = int(self.cfg_parser["SETTINGS_APP"]["record_telemetry"])
 
     def save(self):
         """Save config file"""
@@ -80,6 +123,10 @@ class DataDictionary:
         self.track_layout = track_layout
         self.data_location = "apps/python/track_sectors/data/"
         self.backup_location = self.data_location + "backups/"
+        self.lap_trace_folder = self.data_location + "laps/" + config_file_name(self.track_name, self.track_layout, "/")
+        self.car_index_path = self.data_location + "car_index.json"
+        self.car_index_key = CarIndex.key(self.track_name, self.track_layout)
+        self.car_index = None
         self.curr_date_time = str(datetime.now().strftime("%d_%m_%Y_%H_%M_%S"))
         self.sector_count = None
         self.dictionary = None
@@ -91,6 +138,7 @@ class DataDictionary:
         self.reset_times_flag_config = None
 
         self.imported_checkpoints = []
+        self.sector_stats = None
 
         self.load()
 
@@ -125,9 +173,11 @@ class DataDictionary:
         """Loads into memory the data, makes a backup of the data and updates the last time the dictionary
         was opened."""
 
+        source = None
         if os.path.exists(self.data_location + "data.json"):
             self.create_backup()
             self.dictionary = json.load(open(self.data_location + "data.json", 'r'), object_pairs_hook=OrderedDict)
+            source = data_source(self.data_location + "data.json", self.dictionary.get('date_time'))
             self.dictionary['date_time'] = self.curr_date_time
 
         else:
@@ -140,13 +190,100 @@ class DataDictionary:
             with open(self.data_location + "data.json", 'w') as x:
                 pass
 
+        # the index is built from the dictionary if it is missing, for example the first time
+        # this version of the app runs, or if data.json changed since it was saved (merged,
+        # restored from a backup or edited by hand)
+        self.car_index = CarIndex.load(self.car_index_path, source)
+        if self.car_index is None:
+            self.car_index = CarIndex()
+            self.car_index.index_dictionary(self.dictionary.items())
+
     def display(self):
         return json.dumps(self.dictionary, indent=4)
 
+    def configuration_entry(self):
+        """Returns the entry of the current track/layout, None if it has no configuration."""
+
+        track_entry = self.dictionary.get(self.track_name)
+        if track_entry is None:
+            return None
+        if self.track_layout == "":
+            return track_entry if 'sector_checkpoints' in track_entry else None
+        return track_entry.get(self.track_layout)
+
+    def update_car_index(self):
+        """Applies the changes made by update() to the cross car index, only the index of the
+        current track/layout is touched."""
+
+        key = self.car_index_key
+        entry = self.configuration_entry()
+
+        if entry is None:
+            self.car_index.remove_configuration(key)
+        elif self.structure_update_flag or key not in self.car_index.configurations:
+            self.car_index.index_entry(key, entry)
+        elif self.time_update_flag and self.car_name in entry:
+            self.car_index.update_car(key, self.car_name, sector_times_of(entry[self.car_name], self.sector_count))
+        elif self.reset_times_flag_config:
+            self.car_index.remove_car(key, self.car_name)
+
+    def store_sector_stats(self):
+        """Stores the consistency statistics of the current car next to its best times."""
+
+        if self.sector_stats is not None:
+            self.configuration_entry()[self.car_name]['sector_stats'] = self.sector_stats
+
+    def resector_cars(self):
+        """Computes the best sector times and consistency statistics for the new checkpoints
+        from the stored lap traces of every car that drove on this track/layout, keeping the
+        better time in case the sector already has one (set during this session)."""
+
+        if not os.path.exists(self.lap_trace_folder):
+            return
+
+        layout_entry = self.configuration_entry()
+
+        for file_name in sorted(os.listdir(self.lap_trace_folder)):
+            if not file_name.endswith(".laps"):
+                continue
+
+            car = file_name[:-len(".laps")]
+            traces = load_traces(self.lap_trace_folder + file_name)
+            laps = split_laps(traces, self.imported_checkpoints)
+            if not laps:
+                continue
+
+            if car not in layout_entry:
+                layout_entry[car] = OrderedDict()
+            for i in range(0, self.sector_count):
+                key = "sector_" + str(i + 1)
+                best = min(lap[i] for lap in laps)
+                stored_time = layout_entry[car].get(key, "")
+                if stored_time == "" or best < stored_time:
+                    layout_entry[car][key] = round(best, 3)
+
+            # the traces hold the laps of the earlier sessions and, saved before this runs, the
+            # laps of this session, so the statistics of every car come from them alone
+            layout_entry[car]['sector_stats'] = SectorConsistency.from_laps(laps, self.sector_count).to_dict()
+
+            # always rebuilt from the traces, which hold the laps of the earlier sessions too, the
+            # laps of this session are saved with their speeds before this runs and those are kept
+            top_laps_path = self.lap_trace_folder + car + ".top.json"
+            car_top_laps = TopLaps(cfg.top_laps)
+            if car == self.car_name:
+                car_top_laps.load(top_laps_path, self.imported_checkpoints)
+            car_top_laps.add_laps(laps, lap_times(traces))
+            car_top_laps.changed = True
+            car_top_laps.save(top_laps_path, self.imported_checkpoints)
+
     def save(self):
         with open(self.data_location + "data.json", "w") as outfile:
             json.dump(self.dictionary, outfile, indent=4)
 
+        self.update_car_index()
+        self.car_index.save(self.car_index_path, data_source(self.data_location + "data.json",
+                                                             self.dictionary['date_time']))
+
     def update(self, *args):
         if self.structure_update_flag:
             if self.track_name not in self.dictionary:
@@ -192,6 +329,10 @@ class DataDictionary:
                         for i in range(0, self.sector_count):
                             self.dictionary[self.track_name][self.track_layout][self.car_name][
                                 "sector_" + str(i + 1)] = get_time("best", i, True)
+                    self.store_sector_stats()
+
+                # times of the cars with stored lap traces are recomputed for the new checkpoints
+                self.resector_cars()
             else:
                 # track config changed, but is not valid, so there is nothing to add
                 pass
@@ -220,6 +361,7 @@ class DataDictionary:
                 for i in range(0, self.sector_count):
                     self.dictionary[self.track_name][self.track_layout][self.car_name][
                         "sector_" + str(i + 1)] = get_time("best", i, True)
+            self.store_sector_stats()
         elif self.reset_times_flag_config:
 
             if self.track_layout == "":
@@ -240,6 +382,49 @@ car_name = ac.getCarName(car_id)
 cfg = Config(local_folder)
 stored_data = DataDictionary(track_name, track_layout, car_name)
 
+# best lap progress->time table for the live delta, independent of the sector configuration
+delta_table = DeltaTable()
+delta_table_path = local_folder + "data/delta/" + config_file_name(track_name, track_layout, "/") + car_name + ".bin"
+delta_table.load(delta_table_path)
+
+# samples of the lap in progress, shared by every feature that needs more than the sector times
+lap_telemetry = LapTelemetry()
+
+# progress->time traces of the complete laps, used to recompute the times when the checkpoints change
+lap_traces = LapTraceStore(stored_data.lap_trace_folder + car_name + ".laps")
+
+# per tick samples of the complete laps, compressed when the game closes
+telemetry_writer = TraceWriter(local_folder + "data/telemetry/" + config_file_name(track_name, track_layout, "/") +
+                               car_name + ".trc")
+
+# fastest complete laps of the car with their sector times, checked against the checkpoints on initialization
+top_laps = TopLaps(cfg.top_laps)
+top_laps_path = stored_data.lap_trace_folder + car_name + ".top.json"
+
+# optional background sampler of the shared memory, when running the sector times are
+# interpolated from its samples instead of the positions of the game ticks
+sample_ring = SampleRing()
+crossing_detector = CrossingDetector()
+sampler = None
+
+# sector and lap events for the companion daemon (tools/companion.py) and for dashboards listening
+# to UDP (tools/udp_listener.py), only queued during the tick and sent once per tick
+session_event = encode_session(track_name, track_layout, car_name, time.time())
+event_senders = []
+if cfg.companion_port > 0:
+    event_senders.append(EventSender("127.0.0.1", cfg.companion_port, session_event))
+if cfg.udp_port > 0:
+    event_senders.append(DatagramSender(cfg.udp_address, cfg.udp_port, session_event))
+
+# binary journal of the timing decisions (state changes, crossings, bests...), kept in memory and
+# only written when the game closes or from the settings window (tools/journal_decode.py)
+journal = EventJournal()
+journal_path = local_folder + "data/journal/" + config_file_name(track_name, track_layout, "/") + car_name + "_" + \
+    str(datetime.now().strftime("%d_%m_%Y_%H_%M_%S")) + ".tsj"
+
+# pit exits, laps, jumps to the pits and session restarts of the player
+session = SessionTracker(journal)
+
 sectors_changed = False
 refresh_rate_opacity = 0
 sector_count = 2
@@ -251,26 +436,25 @@ if not os.path.isfile(track_folder + '/ai/fast_lane.ai') and not os.path.isfile(
         track_folder + track_layout + '/ai/fast_lane.ai'):
     has_ai_line = False
 
+# the AI line of the layout takes priority over the one of the base track
+ai_line_path = track_folder + track_layout + '/ai/fast_lane.ai'
+if not os.path.isfile(ai_line_path):
+    ai_line_path = track_folder + '/ai/fast_lane.ai'
+
+# spline position <-> meters lookup table, only loaded when a feature needs it
+distance_table = None
+distance_table_path = local_folder + "data/distance/" + config_file_name(track_name, track_layout, ".bin")
+
 track_in_config_flag = False
 track_layout_in_config_flag = False
 car_in_config_flag = False
 structure_update_flag = False
 reset_times_flag = False
 reset_times_flag_config = False
-player_exited_pits = -1
 current_lap = None
-old_lap = 0
-new_lap_flag = False
 done_initialization = False
 correct_conditions = False
-position_list = []
-started_outside_pits = None
-set_start_pos = None
-starting_pos = [0, 0, 0]  # 3d vector
-start_pos_progress = -1
-ses_time = -1
-reset_session_flag = False
-session_type = -2
+last_penalty_time = 0
 
 if has_ai_line:
     # there exists a configuration
@@ -296,53 +480,41 @@ if has_ai_line:
                 car_in_config_flag = True
 
 
-def check_backwards_driving(curr_progress):
-    """Checks if the player is driving backwards.
-    returns True if driving backwards or stationary,
-    returns False if driving forward"""
-
-    global position_list, new_lap_flag
-
-    if new_lap_flag:
-        new_lap_flag = False
-        position_list.clear()
-        position_list.append(0)
-
-    # curr_progress - position_list[0]) <= position_list[0] * 0.30 - clamps down the maximum possible difference
-
-    # curr_progress <= 0.05 and abs(curr_progress - position_list[0]) <= position_list[0] * 0.80 - at very low
-    # progression values , a difference of only 30% is too small,it can be overcomed with a fast enough car so that
-    # the game engine gives data just at the right time when the newest curr_progress received is more than 130% of
-    # the already stored progress, so we increase the clamping to 300%
-    # ac.log(str(position_list))
-    if len(position_list) != 0:
-        if (curr_progress <= 0.05) or position_list[0] == 0 \
-                or abs(curr_progress - position_list[0]) <= position_list[0] * 0.30:
-            if curr_progress > position_list[0]:
-                # ac.log("# normal forward driving")
-                position_list.clear()
-                position_list.append(curr_progress)
-                return False
-            elif curr_progress == position_list[0]:
-                # moving backwards, late coord update from the engine
-                # or car is stationary
-                # ac.log("moving backwards, late coord update from the engine, or car is stationary")
-                return True
-            elif curr_progress < position_list[0]:
-                # classic going backwards
-                # ac.log("classic going backwards")
-                return True
-        else:
-            # the difference between positions is too high
-            # think of the scenario when crossing the finish
-            # line backwards
-            # ac.log("big difference")
-            return True
-    else:
-        # block for adding first value to list
-        # used when first run or when jumping to pits
-        position_list.append(curr_progress)
-        return False
+def get_distance_table():
+    """Returns the spline position <-> meters lookup table of the track, loading it from
+    its cache on first use. Tracks without a cache get the table built from the AI line, once."""
+
+    global distance_table
+
+    if distance_table is None:
+        distance_table = DistanceTable.load(distance_table_path)
+        if distance_table is None:
+            distance_table = build_distance_table(load_ai_line(ai_line_path))
+            distance_table.save(distance_table_path)
+    return distance_table
+
+
+def emit_event(data):
+    """Queues an encoded event for the enabled event senders."""
+
+    for sender in event_senders:
+        sender.send(data)
+
+
+def check_sector_validity():
+    """Marks the current sector as invalid when the car has more tyres out of the track than
+    allowed or when it receives a penalty, runs every tick so it only touches a bitmask."""
+
+    global last_penalty_time
+
+    penalty_time = info.graphics.penaltyTime
+    tyres_out = info.physics.numberOfTyresOut
+    if tyres_out > cfg.tyres_out_limit or penalty_time > last_penalty_time:
+        sector = sector_buttons.current_sector
+        if not sector_buttons.invalid_sectors & (1 << sector):
+            journal.record(records.INVALID, sector, session.timed_lap, tyres_out, penalty_time)
+        sector_buttons.invalid_sectors |= 1 << sector
+    last_penalty_time = penalty_time
 
 
 def time_to_str(x):
@@ -409,14 +581,25 @@ def set_time(time_type, index, time_value):
     elif time_type == "best":
         ac.setText(sector_buttons.best_sectors[index], time_to_str(time_value))
     elif time_type == "delta":
-        if time_value == "worse":
-            ac.setText(sector_buttons.delta_sectors[index],
-                       "+" + time_to_str(get_time("last", index) - get_time("best", index)))
+        # time_value is the reference time the last sector time is compared against
+        delta = get_time("last", index) - time_value
+        if delta >= 0:
+            ac.setText(sector_buttons.delta_sectors[index], "+" + time_to_str(delta))
             ac.setFontColor(sector_buttons.delta_sectors[index], 1, 0, 0, 1)
-        if time_value == "better":
-            ac.setText(sector_buttons.delta_sectors[index],
-                       "-" + time_to_str(get_time("best", index) - get_time("last", index)))
+        else:
+            ac.setText(sector_buttons.delta_sectors[index], "-" + time_to_str(-delta))
             ac.setFontColor(sector_buttons.delta_sectors[index], 0, 1, 0, 1)
+        main_app.heatmap.set_delta(index, delta, time_value)
+
+
+def get_delta_reference(index):
+    """Time the delta of a sector is measured against, depending on the delta_reference option:
+    0 - all time best, 1 - best of the last recent_laps laps, 2 - session best.
+    Has to be read before the sector's new time is added, None when there is nothing to compare to."""
+    if cfg.delta_reference == 0:
+        best = get_time("best", index)
+        return None if best == "--:--:---" else best
+    return sector_buttons.recent_bests.minimum(index, session.timed_lap)
 
 
 def get_collective_time(*args, length):
@@ -432,15 +615,36 @@ def get_collective_time(*args, length):
 
 def get_theoretical_time(*args):
     """Gets the theoretical best time, calculated from summing
-    up all the "best" type sector times."""
+    up all the "best" type sector times.
+    returns None if a sector has no valid best time yet"""
 
     theoretical_time = 0
     for i in range(0, len(sector_buttons.sector_checkpoints)):
-        theoretical_time += get_time("best", i)
+        best = get_time("best", i)
+        if best == "--:--:---":
+            return None
+        theoretical_time += best
 
     return theoretical_time
 
 
+def color_best_time(index):
+    """Colors purple a best time that is the fastest of all the cars driven on this
+    track/layout, according to the cross car index. Times are left white if the index
+    is for an older configuration of the track."""
+
+    car_index = stored_data.car_index
+    configuration = car_index.configurations.get(stored_data.car_index_key)
+    best_time = get_time("best", index)
+    best_any_car = car_index.best_time(stored_data.car_index_key, index)
+
+    if configuration is not None and configuration['checkpoints'] == sector_buttons.sector_checkpoints \
+            and best_time != "--:--:---" and best_any_car is not None and best_time <= best_any_car:
+        ac.setFontColor(sector_buttons.best_sectors[index], 0.75, 0.3, 1, 1)
+    else:
+        ac.setFontColor(sector_buttons.best_sectors[index], 1, 1, 1, 1)
+
+
 def set_up_total_and_theoretical_times():
     """Updates the theoretical best and total time labels from the main app when called,
     if all the sectors on the current lap have been cleared."""
@@ -456,8 +660,7 @@ def set_up_total_and_theoretical_times():
 
 
 def set_up_times(current_progress, lap_time):
-    auto_next_page_thread = threading.Thread(target=auto_next_page)
-    new_best_thread = threading.Thread(target=new_best_sfx)
+    # runs every tick, the threads are only created on the ticks that need them
     for i in range(0, len(sector_buttons.sector_checkpoints)):
         # checks if the car has reached the checkpoint of
         # a particular sector on this lap
@@ -468,31 +671,56 @@ def set_up_times(current_progress, lap_time):
         if (condition_1 and condition_2 and condition_3) or condition_1:
             set_time("last", i, lap_time - get_collective_time(length=i))
             sector_buttons.sector_cleared[i] = True
-            ac.setFontColor(sector_buttons.last_sectors[i], 1, 1, 1, 1)
+            journal.record(records.CROSSING, i, session.timed_lap, current_progress, lap_time)
+            if cfg.average_speed:
+                main_app.show_average_speed(i, get_time("last", i))
+
+            # invalid times (track limits, penalties) are greyed out and never become a best
+            valid = not sector_buttons.invalid_sectors & (1 << i)
+            if valid:
+                sector_buttons.consistency.add(i, get_time("last", i))
+                main_app.show_consistency(i)
+                ac.setFontColor(sector_buttons.last_sectors[i], 1, 1, 1, 1)
+            else:
+                ac.setFontColor(sector_buttons.last_sectors[i], 0.5, 0.5, 0.5, 1)
 
             # colors orange the current sector that the player is on
             if i == len(sector_buttons.sector_checkpoints) - 1:
                 ac.setFontColor(sector_buttons.last_sectors[0], 1, 0.6, 0, 1)
+                sector_buttons.current_sector = 0
             else:
                 ac.setFontColor(sector_buttons.last_sectors[i + 1], 1, 0.6, 0, 1)
+                sector_buttons.current_sector = i + 1
+            main_app.heatmap.current_sector = sector_buttons.current_sector
 
-            if get_time("best", i) == "--:--:---":
-                set_time("best", i, get_time("last", i))
-            else:
-                if get_time("best", i) > get_time("last", i):
-                    set_time("delta", i, "better")
+            reference = get_delta_reference(i)
+            if reference is not None:
+                set_time("delta", i, reference)
+
+            new_best = False
+            if valid:
+                sector_buttons.recent_bests.add(i, get_time("last", i), session.timed_lap)
+
+                if get_time("best", i) == "--:--:---":
+                    new_best = True
+                    journal.record(records.NEW_BEST, i, session.timed_lap, get_time("last", i), 0.0)
+                    set_time("best", i, get_time("last", i))
+                    color_best_time(i)
+                elif get_time("best", i) > get_time("last", i):
+                    new_best = True
+                    journal.record(records.NEW_BEST, i, session.timed_lap, get_time("last", i), get_time("best", i))
                     set_time("best", i, get_time("last", i))
+                    color_best_time(i)
 
                     # updates best theoretical time when a sector has a new best
                     ac.setText(main_app.theoretical_best, time_to_str(get_theoretical_time()))
                     if cfg.new_best_sfx:
-                        new_best_thread.start()
+                        threading.Thread(target=new_best_sfx).start()
 
-                elif get_time("best", i) <= get_time("last", i):
-                    set_time("delta", i, "worse")
+            emit_event(encode_sector(i, session.timed_lap, get_time("last", i), event_flags(valid, new_best), time.time()))
 
             if (i + 1) % 5 == 0 or i == len(sector_buttons.sector_checkpoints) - 1:
-                auto_next_page_thread.start()
+                threading.Thread(target=auto_next_page).start()
             break
 
     set_up_total_and_theoretical_times()
@@ -554,6 +782,15 @@ def auto_next_page():
     ac.setValue(main_app.page_spinner, main_app.current_page)
 
 
+def mark_geometry_dirty():
+    """Flags the drawn sector geometry (heatmap strip and track map) to be
+    rebuilt on the next frame, used whenever the sector checkpoints change."""
+
+    main_app.heatmap.dirty = True
+    main_app.sector_lengths = None
+    map_app.dirty = True
+
+
 def warning_flash(ui_element):
     """Flashes the given ui element with red and white, signaling
     to the user that the button can not be used in that scenario.
@@ -567,44 +804,6 @@ def warning_flash(ui_element):
         time.sleep(0.2)
 
 
-def check_start_pos():
-    """Checks if the current position is withing a margin of error of ±5% for each
-    3 dimensional axis (x,y,z) individually, allowing for an overall error value of
-    ±0.000125% (0.05^3) for the car position. The physics engine will place you at slightly
-    different positions when resetting, this error value gives a bit of breathing room for this
-    engine particularity.
-
-    It also checks the progress because depending on various factors, such as how many laps you have done,
-    how much of a lap you have done... etc. , the game engine will choose to reset values for variables in
-    different order.So you will end up with a case where the 3d position of the car is at the starting position
-    when resetting, but for 1-2 ticks, the car progress is still the value you had before hitting the "Restart Session"
-    button. This messed with the app because it basically made it think that you passed again all the sectors you
-    already did pass before hitting the "Restart Session" button., due to the non updated progress value.
-    """
-
-    temp = info.graphics.carCoordinates
-    x = round(temp[0], 3)
-    y = round(temp[1], 3)
-    z = round(temp[2], 3)
-
-    error_limit = 0.05
-    if starting_pos[0] - abs(starting_pos[0] * error_limit) <= x <= starting_pos[0] + abs(
-            starting_pos[0] * error_limit):
-        if starting_pos[1] - abs(starting_pos[1] * error_limit) <= y <= starting_pos[1] + abs(
-                starting_pos[1] * error_limit):
-            if starting_pos[2] - abs(starting_pos[2] * error_limit) <= z <= starting_pos[2] + abs(
-                    starting_pos[2] * error_limit):
-                if current_progress - current_progress * 0.03 <= start_pos_progress <= current_progress + current_progress * 0.03:
-                    return True
-
-    # in cases where you reset, then back to pits, some maps have faulty "new session" nodes
-    # resulting in you falling through the map, then ending up in pits
-    # this will allow you to continue recording your times naturally
-    if is_car_in_pit_area():
-        return True
-    return False
-
-
 class SectorButtons:
 
     def __init__(self):
@@ -615,11 +814,22 @@ class SectorButtons:
         self.sector_btn_actions = []
 
         self.sector_cleared = []
+        # sector the car is on and bitmask of the sectors of this lap that are invalid
+        self.current_sector = 0
+        self.invalid_sectors = 0
+        # min/max/average speed of every sector of the lap in progress
+        self.speeds = SectorSpeeds(sector_count)
 
         self.sector_counter_labels = []
         self.last_sectors = []
         self.best_sectors = []
         self.delta_sectors = []
+        self.std_sectors = []
+
+        # running mean/standard deviation of every sector, for the current checkpoints
+        self.consistency = SectorConsistency(sector_count)
+        # best times the delta row is compared against when it doesn't use the all time best
+        self.recent_bests = RecentBests(sector_count, cfg.recent_laps if cfg.delta_reference == 1 else None)
 
     def set_label_invisible(self):
         """Sets all 'last', 'best', 'delta', 'sector_count_labels'
@@ -634,6 +844,7 @@ class SectorButtons:
                 ac.setVisible(self.last_sectors[i], 0)
                 ac.setVisible(self.best_sectors[i], 0)
                 ac.setVisible(self.delta_sectors[i], 0)
+                ac.setVisible(self.std_sectors[i], 0)
         except:
             pass
 
@@ -665,10 +876,16 @@ class SectorButtons:
 
         self.sector_cleared.clear()
         self.sector_cleared = [False] * self.sector_count
+        self.current_sector = 0
+        self.invalid_sectors = 0
+        self.speeds.reset(self.sector_count)
 
     def reset_checkpoints(self, *args):
         self.sector_checkpoints.clear()
         self.sector_checkpoints = [-1] * self.sector_count
+        self.consistency.reset(self.sector_count)
+        self.recent_bests.reset(self.sector_count)
+        top_laps.clear()
         for i in self.sector_buttons:
             ac.setFontColor(i, 1, 1, 1, 1)
 
@@ -691,6 +908,7 @@ class SectorButtons:
         self.last_sectors.clear()
         self.best_sectors.clear()
         self.delta_sectors.clear()
+        self.std_sectors.clear()
 
     def clear(self):
         self.sector_buttons.clear()
@@ -741,6 +959,7 @@ class SectorButtons:
                     if get_current_spline_pos() > self.sector_checkpoints[button_id - 1]:
                         ac.setFontColor(self.sector_buttons[button_id], 0, 1, 0, 1)
                         self.sector_checkpoints[button_id] = get_current_spline_pos()
+                        mark_geometry_dirty()
                     else:
                         wrong_press.start()
                 else:
@@ -750,6 +969,7 @@ class SectorButtons:
             elif self.sector_checkpoints[button_id] == -1:
                 ac.setFontColor(self.sector_buttons[button_id], 0, 1, 0, 1)
                 self.sector_checkpoints[button_id] = get_current_spline_pos()
+                mark_geometry_dirty()
             else:
                 wrong_press.start()
         else:
@@ -779,6 +999,10 @@ class MainApp:
         self.current_page = 1
 
         self.theoretical_best_flag = cfg.theoretical_best
+        self.heatmap = HeatmapStrip()
+        self.live_delta = None
+        self.live_delta_ticks = 0
+        self.sector_lengths = None
 
         if has_ai_line and ac.isAcLive() and ac.ext_patchVersionCode() >= 2051:
             self.build_ui()
@@ -849,6 +1073,7 @@ class MainApp:
 
         self.size_ui()
         self.page_spinner_changed()
+        map_app.size_ui()
 
     def page_spinner_changed(self, *args):
         """Handles the change in page number in the settings app by redrawing the UI elements
@@ -867,6 +1092,7 @@ class MainApp:
                     ac.setVisible(sector_buttons.last_sectors[i], 1)
                     ac.setVisible(sector_buttons.best_sectors[i], 1)
                     ac.setVisible(sector_buttons.delta_sectors[i], 1)
+                    ac.setVisible(sector_buttons.std_sectors[i], cfg.consistency_row)
                 else:
                     ac.setVisible(sector_buttons.last_sectors[i], 1)
                     ac.setVisible(sector_buttons.delta_sectors[i], 1)
@@ -884,13 +1110,17 @@ class MainApp:
         cfg.update_cfg = True
 
     def reset_times(self, *args):
-        global reset_times_flag, reset_times_flag_config, player_exited_pits
+        global reset_times_flag, reset_times_flag_config
 
         wrong_press = threading.Thread(target=warning_flash, args=[self.reset_time_btn])
         if is_car_in_pit_area() and ac.isAcLive():
             reset_times_flag = True
             reset_times_flag_config = True
-            player_exited_pits = -1
+            session.wait()
+            lap_traces.clear()
+            top_laps.clear()
+            sector_buttons.consistency.reset(sector_buttons.sector_count)
+            sector_buttons.recent_bests.reset(sector_buttons.sector_count)
             ac.setText(self.theoretical_best, "--:--:---")
             ac.setText(self.total_time, "--:--:---")
         else:
@@ -905,6 +1135,12 @@ class MainApp:
         sector_buttons.set_label_invisible()
         sector_buttons.clear_labels()
 
+        # new labels have no times, so the strip goes back to neutral colors
+        self.heatmap.sector_count = self.sector_count
+        self.heatmap.clear_colors()
+        self.heatmap.current_sector = 0
+        mark_geometry_dirty()
+
         if cfg.ui_layout == 1:
             x_offset = 80
         else:  # cfg.ui_layout == 2:
@@ -934,12 +1170,14 @@ class MainApp:
                 aux_best = ac.addLabel(self.window, "--:--:---")
 
             aux_delta = ac.addLabel(self.window, "--:--:---")
+            aux_std = ac.addLabel(self.window, "-")
 
             if cfg.ui_layout == 1:
                 configure_ui(aux_sector, x_offset, 60, 100, 25, window="main")
                 configure_ui(aux_last, x_offset, 120, 100, 25, window="main")
                 configure_ui(aux_best, x_offset, 180, 100, 25, window="main")
                 configure_ui(aux_delta, x_offset, 240, 100, 25, window="main")
+                configure_ui(aux_std, x_offset, 300, 100, 25, window="main")
 
                 x_offset += 100
                 if i % 5 == 0:
@@ -956,6 +1194,7 @@ class MainApp:
             ac.setFontAlignment(aux_last, "right")
             ac.setFontAlignment(aux_best, "right")
             ac.setFontAlignment(aux_delta, "right")
+            ac.setFontAlignment(aux_std, "right")
 
             if i == 1:
                 ac.setFontColor(aux_last, 1, 0.6, 0, 1)
@@ -964,6 +1203,27 @@ class MainApp:
             sector_buttons.last_sectors.append(aux_last)
             sector_buttons.best_sectors.append(aux_best)
             sector_buttons.delta_sectors.append(aux_delta)
+            sector_buttons.std_sectors.append(aux_std)
+
+        # consistency statistics stored for this car, the in-memory ones are for this configuration
+        if car_in_config_flag:
+            if track_layout_in_config_flag:
+                stored_stats = stored_data.dictionary[track_name][track_layout][car_name].get('sector_stats')
+            else:
+                stored_stats = stored_data.dictionary[track_name][car_name].get('sector_stats')
+            sector_buttons.consistency.reset(self.sector_count)
+            sector_buttons.consistency.load(stored_stats)
+        if len(sector_buttons.consistency) == self.sector_count:
+            for i in range(0, self.sector_count):
+                self.show_consistency(i)
+
+        # recent bests only cover the times driven with the current checkpoints
+        if len(sector_buttons.recent_bests.deques) != self.sector_count:
+            sector_buttons.recent_bests.reset(self.sector_count)
+
+        if len(sector_buttons.sector_checkpoints) == self.sector_count:
+            for i in range(0, self.sector_count):
+                color_best_time(i)
 
         sector_buttons.set_label_invisible()
 
@@ -1050,6 +1310,7 @@ class MainApp:
         self.last_label = ac.addLabel(self.window, "Last")
         self.best_label = ac.addLabel(self.window, "Best")
         self.delta_label = ac.addLabel(self.window, "Delta")
+        self.std_label = ac.addLabel(self.window, "Std Dev")
 
         self.total_and_theoretical_checkbox = ac.addCheckBox(self.window, "")
         self.total_and_theoretical_checkboxFunc = functools.partial(self.theoretical_best_changed)
@@ -1080,16 +1341,136 @@ class MainApp:
         ac.addOnClickedListener(self.ui_layout_btn, self.ui_layout_btnFunc)
         self.ui_layout_btn_label = configure_label(self.window, "Change UI")
 
+        # live delta to the best lap, the bar is drawn by the render callback
+        self.live_delta_label = configure_label(self.window, "")
+        ac.setFontAlignment(self.live_delta_label, "right")
+
+        # the heatmap strip and live delta bar are drawn directly with the game's gl functions, instead of labels
+        self.renderFunc = functools.partial(self.render)
+        ac.addRenderCallback(self.window, self.renderFunc)
+
         self.create_timing_labels()
 
+    def build_heatmap(self):
+        """Precomputes the heatmap strip geometry for the current configuration,
+        window scale and ui layout."""
+
+        if cfg.ui_layout == 1:
+            x, y, width, height = 30, 280 + 60 * cfg.consistency_row, 670, 10
+        else:  # cfg.ui_layout == 2:
+            x, y, width, height = 5, 82, 405, 5
+
+        self.heatmap.build(sector_buttons.sector_checkpoints, x * cfg.main_window_scale, y * cfg.main_window_scale,
+                           width * cfg.main_window_scale, height * cfg.main_window_scale)
+
+    def render(self, *args):
+        self.render_heatmap()
+        self.render_live_delta()
+
+    def show_consistency(self, index):
+        """Updates the standard deviation label of a sector."""
+
+        std = sector_buttons.consistency.std(index)
+        if std is None:
+            ac.setText(sector_buttons.std_sectors[index], "-")
+        else:
+            ac.setText(sector_buttons.std_sectors[index], "\u00b1" + "{:.3f}".format(std))
+
+    def show_average_speed(self, index, sector_time):
+        """Shows the average speed of the last time of a sector in its sector label. The
+        sector lengths are computed once per configuration, from the distance table."""
+
+        if self.sector_lengths is None:
+            try:
+                self.sector_lengths = get_distance_table().sector_lengths(sector_buttons.sector_checkpoints)
+            except (OSError, ValueError, struct.error):
+                self.sector_lengths = []
+
+        if index < len(self.sector_lengths) and sector_time > 0:
+            speed = self.sector_lengths[index] / sector_time * 3.6
+            ac.setText(sector_buttons.sector_counter_labels[index],
+                       "S" + str(index + 1) + " " + str(int(round(speed))) + " km/h")
+
+    def update_live_delta(self, progress, lap_time):
+        """Computes the live delta for the render callback, the label text is only
+        refreshed every few ticks since building the string is the expensive part."""
+
+        self.live_delta = delta_table.delta(progress, lap_time)
+
+        self.live_delta_ticks += 1
+        if self.live_delta_ticks >= 6 and cfg.live_delta:
+            self.live_delta_ticks = 0
+            if self.live_delta is None:
+                ac.setText(self.live_delta_label, "")
+            else:
+                ac.setText(self.live_delta_label, "{:+.3f}".format(self.live_delta))
+                if self.live_delta < 0:
+                    ac.setFontColor(self.live_delta_label, 0, 1, 0, 1)
+                else:
+                    ac.setFontColor(self.live_delta_label, 1, 0, 0, 1)
+
+    def render_live_delta(self):
+        """Draws the live delta bar, growing to the left in green when faster than the
+        best lap and to the right in red when slower, saturating at 2 seconds."""
+
+        if not cfg.live_delta or cfg.ui_layout != 1 or self.live_delta is None:
+            return
+
+        center = 430 * cfg.main_window_scale
+        half_width = 150 * cfg.main_window_scale
+        y = 20 * cfg.main_window_scale
+        height = 10 * cfg.main_window_scale
+        fill = min(abs(self.live_delta) / 2, 1) * half_width
+
+        ac.glColor4f(0.2, 0.2, 0.2, 1)
+        ac.glQuad(center - half_width, y, 2 * half_width, height)
+        if self.live_delta < 0:
+            ac.glColor4f(0, 1, 0, 1)
+            ac.glQuad(center - fill, y, fill, height)
+        else:
+            ac.glColor4f(1, 0, 0, 1)
+            ac.glQuad(center, y, fill, height)
+
+    def render_heatmap(self, *args):
+        """Render callback that draws every sector as a colored bar, with the current
+        sector marked in orange above it. The geometry is only rebuilt when the sector
+        configuration or the window size changes."""
+
+        strip = self.heatmap
+        if not cfg.heatmap_strip:
+            return
+
+        if strip.dirty:
+            if not sector_buttons.is_configured():
+                return
+            self.build_heatmap()
+
+        quads = strip.quads
+        colors = strip.colors
+        y = strip.y
+        height = strip.height
+
+        for i in range(0, strip.sector_count):
+            ac.glColor4f(colors[3 * i], colors[3 * i + 1], colors[3 * i + 2], 1)
+            ac.glQuad(quads[2 * i], y, quads[2 * i + 1], height)
+
+        current = strip.current_sector
+        ac.glColor4f(1, 0.6, 0, 1)
+        ac.glQuad(quads[2 * current], y - height * 0.5, quads[2 * current + 1], height * 0.4)
+
     def size_ui(self):
         """Method to be called whenever the window size changes, to resize the UI elements
          accordingly or for initialization for the first time to position correctly the
          elements when the program is starting."""
 
+        self.heatmap.dirty = True
+
         if cfg.ui_layout == 1:
-            # shows the title and resizes the window background
-            ac.setSize(self.window, 900 * cfg.main_window_scale, 300 * cfg.main_window_scale)
+            # shows the title and resizes the window background, the consistency row needs more space
+            if cfg.consistency_row:
+                ac.setSize(self.window, 900 * cfg.main_window_scale, 360 * cfg.main_window_scale)
+            else:
+                ac.setSize(self.window, 900 * cfg.main_window_scale, 300 * cfg.main_window_scale)
             ac.setTitle(self.window, app_name)
 
             configure_ui(self.exit_btn, 2, 2, 25, 25, 15, window="main")
@@ -1115,6 +1496,7 @@ class MainApp:
         configure_ui(self.last_label, 30, 120, 10, 20, window="main")
         configure_ui(self.best_label, 30, 180, 10, 20, window="main")
         configure_ui(self.delta_label, 30, 240, 10, 20, window="main")
+        configure_ui(self.std_label, 30, 300, 10, 20, window="main")
 
         # hiding / showing static ui elements depending on the ui layout
         if cfg.ui_layout == 1:
@@ -1130,6 +1512,7 @@ class MainApp:
             ac.setVisible(self.last_label, 1)
             ac.setVisible(self.best_label, 1)
             ac.setVisible(self.delta_label, 1)
+            ac.setVisible(self.std_label, cfg.consistency_row)
             ac.setVisible(self.total_time_label, 1)
             ac.setVisible(self.total_time, 1)
             ac.setVisible(self.theoretical_best, 1)
@@ -1146,6 +1529,9 @@ class MainApp:
             configure_ui(self.ui_layout_btn, 780, 70, 50, 25, window="main")
             configure_ui(self.ui_layout_btn_label, 775, 50, 150, 20, 13, window="main")
             ac.setVisible(self.ui_layout_btn_label, 1)
+
+            configure_ui(self.live_delta_label, 620, 12, 10, 20, window="main")
+            ac.setVisible(self.live_delta_label, cfg.live_delta)
             if self.theoretical_best_flag:
                 ac.setVisible(self.total_time_label, 1)
                 ac.setVisible(self.total_time, 1)
@@ -1172,11 +1558,13 @@ class MainApp:
             ac.setVisible(self.last_label, 0)
             ac.setVisible(self.best_label, 0)
             ac.setVisible(self.delta_label, 0)
+            ac.setVisible(self.std_label, 0)
             ac.setVisible(self.page_spinner_label, 0)
             ac.setVisible(self.opacity_spinner_label, 0)
             ac.setVisible(self.size_spinner_label, 0)
             ac.setVisible(self.total_and_theoretical_checkbox_label, 0)
             ac.setVisible(self.ui_layout_btn_label, 0)
+            ac.setVisible(self.live_delta_label, 0)
 
             if self.theoretical_best_flag:
                 ac.setVisible(self.total_time_label, 0)
@@ -1204,6 +1592,7 @@ class MainApp:
                 configure_ui(sector_buttons.last_sectors[i - 1], x_offset, 120, 100, 25, window="main")
                 configure_ui(sector_buttons.best_sectors[i - 1], x_offset, 180, 100, 25, window="main")
                 configure_ui(sector_buttons.delta_sectors[i - 1], x_offset, 240, 100, 25, window="main")
+                configure_ui(sector_buttons.std_sectors[i - 1], x_offset, 300, 100, 25, window="main")
                 ac.setVisible(sector_buttons.best_sectors[i - 1], 1)
                 x_offset += 100
                 if i % 5 == 0:
@@ -1213,6 +1602,7 @@ class MainApp:
                 configure_ui(sector_buttons.delta_sectors[i - 1], x_offset, 50, 100, 35, window="main")
                 ac.setVisible(sector_buttons.sector_counter_labels[i - 1], 0)
                 ac.setVisible(sector_buttons.best_sectors[i - 1], 0)
+                ac.setVisible(sector_buttons.std_sectors[i - 1], 0)
                 x_offset += 85
                 if i % 5 == 0:
                     x_offset = -20
@@ -1329,14 +1719,14 @@ class SettingsApp:
         and sets the sector_changed flag to True resulting in the sector buttons
         being redrawn."""
 
-        global sectors_changed, player_exited_pits
+        global sectors_changed
 
         try:
             if is_car_in_pit_area() and ac.isAcLive():
                 self.sector_count = int(ac.getValue(self.sector_count_spinner))
 
                 sectors_changed = True
-                player_exited_pits = -1
+                session.wait()
                 ac.setText(main_app.theoretical_best, "--:--:---")
                 ac.setText(main_app.total_time, "--:--:---")
                 ac.setFontColor(self.last_sector_as_finish, 1, 1, 1, 1)
@@ -1384,6 +1774,10 @@ class SettingsApp:
             else:
                 structure_update_flag = True
 
+        # the stored fastest laps are only valid for the stored checkpoints
+        if track_in_config_flag:
+            top_laps.load(top_laps_path, sector_buttons.sector_checkpoints)
+
         sector_buttons.set_invisible()
 
         # linking to main app to create appropriate labels
@@ -1428,7 +1822,7 @@ class SettingsApp:
     def reset_checkpoints(self, *args):
         """Resets the checkpoints for all buttons and deletes all times."""
 
-        global sector_buttons, main_app, player_exited_pits
+        global sector_buttons, main_app
         global structure_update_flag
 
         if is_car_in_pit_area() and ac.isAcLive():
@@ -1438,12 +1832,57 @@ class SettingsApp:
             ac.setText(main_app.theoretical_best, "--:--:---")
             ac.setText(main_app.total_time, "--:--:---")
             structure_update_flag = True
-            player_exited_pits = -1
+            session.wait()
             ac.setFontColor(self.last_sector_as_finish, 1, 1, 1, 1)
         else:
             wrong_press = threading.Thread(target=warning_flash, args=[self.reset_checkpoints_btn])
             wrong_press.start()
 
+    def auto_place_sectors(self, *args, placement="exit"):
+        """Places the checkpoints of all sectors at the exits (or apexes) of the biggest corners
+        found on the AI line of the track, or at equal distances, with the last sector ending
+        at the finish line. Just like resetting the checkpoints, it deletes the times and only
+        works in pits."""
+
+        if placement == "exit":
+            button = self.auto_exits_btn
+        elif placement == "apex":
+            button = self.auto_apexes_btn
+        else:  # placement == "distance"
+            button = self.auto_distance_btn
+        wrong_press = threading.Thread(target=warning_flash, args=[button])
+
+        if not (is_car_in_pit_area() and ac.isAcLive()):
+            wrong_press.start()
+            return
+
+        try:
+            if placement == "distance":
+                checkpoints = get_distance_table().equal_distance_checkpoints(self.sector_count)
+                ac.setText(self.auto_place_label, "Auto Place Sectors (AI Line): " +
+                           str(int(get_distance_table().total_length / self.sector_count)) + " m each")
+            else:
+                checkpoints = propose_checkpoints(load_ai_line(ai_line_path), self.sector_count, placement)
+                ac.setText(self.auto_place_label, "Auto Place Sectors (AI Line)")
+        except (OSError, ValueError, struct.error):
+            wrong_press.start()
+            return
+
+        self.reset_checkpoints()
+        sector_buttons.sector_checkpoints[:] = checkpoints
+        for i in range(0, self.sector_count):
+            ac.setFontColor(sector_buttons.sector_buttons[i], 0, 1, 0, 1)
+        ac.setFontColor(self.last_sector_as_finish, 0, 1, 0, 1)
+        mark_geometry_dirty()
+
+    def save_journal(self, *args):
+        """Writes the event journal of the session so far, for when something looked wrong on
+        track. It is written again when the game closes, with the events after this one."""
+
+        journal.save(journal_path)
+        ac.setText(self.save_journal_label, "Event Journal: " + str(min(journal.written, journal.capacity)) +
+                   " events saved")
+
     def last_sector_as_finish_setter(self, *args):
 
         def warning_flash_local(ui_element):
@@ -1463,6 +1902,7 @@ class SettingsApp:
             if sector_buttons.sector_checkpoints[button_id] == -1:
                 ac.setFontColor(sector_buttons.sector_buttons[button_id], 0, 1, 0, 1)
                 sector_buttons.sector_checkpoints[button_id] = 2
+                mark_geometry_dirty()
             else:
                 wrong_press.start()
         else:
@@ -1544,6 +1984,24 @@ class SettingsApp:
         ac.addOnClickedListener(self.last_sector_as_finish, self.last_sector_as_finishFunc)
         self.last_sector_as_finish_label = configure_label(self.window, "Finish Line as Last Sector")
 
+        # building the buttons that place all sectors using the AI line
+        self.auto_exits_btn = configure_button(self.window, "Corner Exits")
+        self.auto_exits_btnFunc = functools.partial(self.auto_place_sectors, placement="exit")
+        ac.addOnClickedListener(self.auto_exits_btn, self.auto_exits_btnFunc)
+        self.auto_apexes_btn = configure_button(self.window, "Apexes")
+        self.auto_apexes_btnFunc = functools.partial(self.auto_place_sectors, placement="apex")
+        ac.addOnClickedListener(self.auto_apexes_btn, self.auto_apexes_btnFunc)
+        self.auto_distance_btn = configure_button(self.window, "Equal Distance")
+        self.auto_distance_btnFunc = functools.partial(self.auto_place_sectors, placement="distance")
+        ac.addOnClickedListener(self.auto_distance_btn, self.auto_distance_btnFunc)
+        self.auto_place_label = configure_label(self.window, "Auto Place Sectors (AI Line)")
+
+        # building the button that writes the event journal to disk
+        self.save_journal_btn = configure_button(self.window, "Save")
+        self.save_journal_btnFunc = functools.partial(self.save_journal)
+        ac.addOnClickedListener(self.save_journal_btn, self.save_journal_btnFunc)
+        self.save_journal_label = configure_label(self.window, "Event Journal")
+
         self.create_sector_checkpoint_btns()
 
         # if the last sector is configured as finish line, color the button green
@@ -1560,7 +2018,7 @@ class SettingsApp:
          accordingly or for initialization for the first time to position correctly the
          elements when the program is starting."""
 
-        ac.setSize(self.window, 800 * cfg.settings_window_scale, 300 * cfg.settings_window_scale)
+        ac.setSize(self.window, 800 * cfg.settings_window_scale, 340 * cfg.settings_window_scale)
 
         configure_ui(self.size_spinner, 620, 160, 150, 20, window="settings")
         configure_ui(self.size_spinner_label, 660, 140, 150, 20, 13, window="settings")
@@ -1578,6 +2036,12 @@ class SettingsApp:
         configure_ui(self.next_page_delay_label, 640, 90, 150, 20, 13, window="settings")
         configure_ui(self.last_sector_as_finish, 420, 250, 140, 23, window="settings")
         configure_ui(self.last_sector_as_finish_label, 420, 230, 110, 20, 13, window="settings")
+        configure_ui(self.auto_exits_btn, 30, 300, 120, 23, window="settings")
+        configure_ui(self.auto_apexes_btn, 170, 300, 120, 23, window="settings")
+        configure_ui(self.auto_distance_btn, 310, 300, 120, 23, window="settings")
+        configure_ui(self.auto_place_label, 30, 280, 110, 20, 13, window="settings")
+        configure_ui(self.save_journal_btn, 460, 300, 110, 23, window="settings")
+        configure_ui(self.save_journal_label, 460, 280, 110, 20, 13, window="settings")
         configure_ui(self.exit_btn, 2, 2, 25, 25, 15, window="settings")
 
         # adjusts sizes for sector buttons
@@ -1594,25 +2058,121 @@ class SettingsApp:
                 y_mult = 1
 
 
+class MapApp:
+
+    def __init__(self):
+        self.window = ac.newApp(app_name + " Map")
+
+    def initialization(self):
+        """Same as for the other windows, the track map can only be set up after the game
+        fully loads up. Loads the cached track map, if there is one for this track/layout,
+        otherwise the map gets recorded on the first clean lap."""
+
+        self.map_path = local_folder + "data/track_maps/" + config_file_name(track_name, track_layout, ".json")
+        self.track_map = TrackMap.load(self.map_path)
+        self.sector_ranges = array('i')
+        self.dirty = True
+
+        # disables the window border
+        ac.drawBorder(self.window, 0)
+
+        # move the assetto corsa icon out of sight
+        ac.setIconPosition(self.window, 20000, 20000)
+
+        self.info_label = configure_label(self.window, "")
+        if self.track_map is None:
+            ac.setText(self.info_label, "Drive a clean lap to record the map")
+
+        self.render_mapFunc = functools.partial(self.render_map)
+        ac.addRenderCallback(self.window, self.render_mapFunc)
+
+        self.size_ui()
+
+    def size_ui(self):
+        """Resizes the window, the map follows the scale of the main window."""
+
+        ac.setSize(self.window, 250 * cfg.main_window_scale, 250 * cfg.main_window_scale)
+        configure_ui(self.info_label, 10, 220, 230, 20, 11, window="main")
+        self.dirty = True
+
+    def lap_completed(self, snapshot):
+        """Builds and stores the track map from the samples of a completed lap,
+        if there is no map for this track yet."""
+
+        if self.track_map is not None:
+            return
+
+        track_map = build_track_map(snapshot)
+        if track_map is not None:
+            if not os.path.exists(local_folder + "data/track_maps/"):
+                os.makedirs(local_folder + "data/track_maps/")
+            track_map.save(self.map_path)
+            self.track_map = track_map
+            self.dirty = True
+            ac.setText(self.info_label, "")
+
+    def render_map(self, *args):
+        """Render callback that draws the track, every sector colored by its delta
+        and the sector boundaries as white dots. The screen space vertices are only
+        computed again when the configuration or the window size changes."""
+
+        track_map = self.track_map
+        if track_map is None:
+            return
+
+        if self.dirty:
+            if not sector_buttons.is_configured():
+                return
+            track_map.project(0, 0, 250 * cfg.main_window_scale, 250 * cfg.main_window_scale)
+            self.sector_ranges = track_map.sector_ranges(sector_buttons.sector_checkpoints)
+            self.dirty = False
+
+        vertices = track_map.vertices
+        ranges = self.sector_ranges
+        colors = main_app.heatmap.colors
+        sector_total = min(len(ranges) // 2, len(colors) // 3)
+
+        for i in range(0, sector_total):
+            ac.glColor4f(colors[3 * i], colors[3 * i + 1], colors[3 * i + 2], 1)
+            ac.glBegin(acsys.GL.LineStrip)
+            for j in range(ranges[2 * i], ranges[2 * i + 1] + 1):
+                ac.glVertex2f(vertices[2 * j], vertices[2 * j + 1])
+            ac.glEnd()
+
+        # part of the track between the last checkpoint and the finish line, which is not timed
+        ac.glColor4f(0.2, 0.2, 0.2, 1)
+        ac.glBegin(acsys.GL.LineStrip)
+        for j in range(ranges[-1], len(track_map)):
+            ac.glVertex2f(vertices[2 * j], vertices[2 * j + 1])
+        ac.glEnd()
+
+        ac.glColor4f(1, 1, 1, 1)
+        for i in range(0, sector_total):
+            j = ranges[2 * i + 1]
+            ac.glQuad(vertices[2 * j] - 2, vertices[2 * j + 1] - 2, 4, 4)
+
+
 def acMain(ac_version):
-    global main_app, settings_app
+    global main_app, settings_app, map_app
 
     main_app = MainApp()
     settings_app = SettingsApp()
+    map_app = MapApp()
     return app_name + " " + str(version)
 
 
 def acUpdate(deltaT):
-    global settings_app, main_app, sector_buttons, cfg, refresh_rate_opacity, player_exited_pits, current_lap
-    global reset_times_flag, old_lap, current_lap, position_list, done_initialization, start_pos_progress, current_progress
-    global track_in_config_flag, track_layout_in_config_flag, car_in_config_flag, correct_conditions, session_type
-    global new_lap_flag, lap_time, started_outside_pits, ses_time, starting_pos, set_start_pos, reset_session_flag
+    global settings_app, main_app, map_app, sector_buttons, cfg, refresh_rate_opacity, current_lap
+    global reset_times_flag, done_initialization, current_progress
+    global track_in_config_flag, track_layout_in_config_flag, car_in_config_flag, correct_conditions
+    global lap_time, sampler
 
     if not done_initialization and ac.isConnected(car_id):
         done_initialization = True
         sector_buttons = SectorButtons()
         main_app.initialization()
         settings_app.initialization()
+        map_app.initialization()
 
         # try block in case there is no configuration for this track stored
         # it's easier to just pass the error than to implement edge case handling
@@ -1625,27 +2185,23 @@ def acUpdate(deltaT):
         track_layout_in_config_flag = False
         car_in_config_flag = False
 
-        if is_car_in_pit_area():
-            started_outside_pits = False
-        else:
-            started_outside_pits = True
+        session.start_session(is_car_in_pit_area())
+
+        if correct_conditions and cfg.sampler_rate > 0:
+            sampler = Sampler(info.graphics, sample_ring, cfg.sampler_rate)
+            sampler.start()
 
     if done_initialization and correct_conditions:
+        for sender in event_senders:
+            sender.flush()
+
         current_progress = get_current_spline_pos()
         lap_time = ac.getCarState(0, acsys.CS.LapTime) / 1000
         current_lap = ac.getCarState(0, acsys.CS.LapCount)
 
-        # gets the starting position, progress and session type.
-        # checks if car was loaded into the memory by assuring that the car position on the 3d space
-        # is not (0,0,0) (default position for objects that are still loading)
-        if set_start_pos == None and info.graphics.carCoordinates[0] != 0 and info.graphics.carCoordinates[1] != 0 and \
-                info.graphics.carCoordinates[2] != 0:
-            starting_pos = list(info.graphics.carCoordinates)
-            starting_pos[0] = round(starting_pos[0], 3)
-            starting_pos[1] = round(starting_pos[1], 3)
-            starting_pos[2] = round(starting_pos[2], 3)
-            set_start_pos = True
-            start_pos_progress = current_progress
+        # the starting position, kept once the car is loaded into the world
+        if session.start_bounds is None:
+            session.capture_start(info.graphics.carCoordinates, current_progress)
 
         if has_ai_line:
             if sectors_changed:
@@ -1655,6 +2211,7 @@ def acUpdate(deltaT):
             if refresh_rate_opacity == 60:
                 ac.setBackgroundOpacity(settings_app.window, cfg.settings_window_opacity / 100)
                 ac.setBackgroundOpacity(main_app.window, cfg.main_window_opacity / 100)
+                ac.setBackgroundOpacity(map_app.window, cfg.main_window_opacity / 100)
 
                 refresh_rate_opacity = 0
             refresh_rate_opacity += 1
@@ -1666,96 +2223,98 @@ def acUpdate(deltaT):
 
         if has_ai_line and ac.isAcLive() and sector_buttons.is_configured():
 
-            # for resetting purposes
-            if (player_exited_pits == -1 and is_car_in_pit_area()) or (
-                    started_outside_pits and player_exited_pits == -1):
-                if reset_session_flag:
-                    if check_start_pos():
-                        player_exited_pits = False
-                        reset_session_flag = False
-                        position_list.clear()
-                else:
-                    player_exited_pits = False
-
-            # player exited the pits, 0.3 is arbitrary, for cases when
-            # the pitlane is before the finish line
-            if not is_car_in_pit_area() and player_exited_pits == False and current_progress <= 0.3:
-                old_lap = current_lap
-                player_exited_pits = True
-                starting_time = lap_time
-
-            # session type can change from qualifying to race when playing online, so we need to update it
-            session_type = info.graphics.session
-            normal_pitting = is_car_in_pit_area() and player_exited_pits == True
-
-            # in some session types, session time increases, and in other it decreases,
-            # so we must separate them based on that for the "reset session" functionality of the game
-            # to work correctly with the app
-            increasing_ses_time_sessions = (
-                        (session_type == 0 or session_type == 2) and ses_time > abs(info.graphics.sessionTimeLeft))
-            decreasing_ses_time_sessions = ((session_type == 1) or (3 <= session_type <= 6)) and ses_time < abs(
-                info.graphics.sessionTimeLeft)
+            # session type can change from qualifying to race when playing online, so it is read every tick
+            action = session.update(is_car_in_pit_area(), current_progress, current_lap, info.graphics.completedLaps,
+                                    info.graphics.session, info.graphics.sessionTimeLeft, info.graphics.carCoordinates)
 
             # for when player decides to jump to pits or resets session
-            # compares the session time to decide if the player restarted the session
-            # in cases where the starting position is not in the pitlane
-            if normal_pitting or (started_outside_pits and not reset_session_flag and (
-                    increasing_ses_time_sessions or decreasing_ses_time_sessions)):
-                player_exited_pits = -1
-                position_list.clear()
-                position_list.append(0)
+            if action == RESET:
                 sector_buttons.reset_sector_cleared()
                 main_app.current_page = 1
                 main_app.page_spinner_changed()
-                old_lap = current_lap
-                if started_outside_pits and not reset_session_flag and (((
-                                                                                 session_type == 0 or session_type == 2) and ses_time > abs(
-                        info.graphics.sessionTimeLeft)) or (((session_type == 1) or (
-                        3 <= session_type <= 6)) and ses_time < abs(info.graphics.sessionTimeLeft))):
-                    reset_session_flag = True
                 # marks first sector as the current sector
                 for i in range(0, len(sector_buttons.sector_checkpoints)):
                     ac.setFontColor(sector_buttons.last_sectors[i], 1, 1, 1, 1)
                 ac.setFontColor(sector_buttons.last_sectors[0], 1, 0.6, 0, 1)
+                main_app.heatmap.current_sector = 0
+                lap_telemetry.discard()
+                delta_table.discard()
+                crossing_detector.discard(sample_ring)
+                # the lap count starts over in a restarted session, the recent bests are keyed by lap
+                if session.restarting:
+                    sector_buttons.recent_bests.reset(sector_buttons.sector_count)
+
+            # player is driving forward on the same lap
+            elif action == DRIVING:
+                check_sector_validity()
+                sector_buttons.speeds.add(sector_buttons.current_sector, info.physics.speedKmh, deltaT)
+                if sampler is not None:
+                    for index, crossing_time in crossing_detector.crossings(
+                            sample_ring, current_lap, sector_buttons.sector_checkpoints):
+                        set_up_times(sector_buttons.sector_checkpoints[index], crossing_time)
+                # with the sampler this only catches the checkpoints it missed
+                set_up_times(current_progress, lap_time)
+                lap_telemetry.record(current_progress, lap_time, info.physics.speedKmh,
+                                     info.graphics.carCoordinates)
+                delta_table.record(current_progress, lap_time)
+                main_app.update_live_delta(current_progress, lap_time)
+
+            # player crossed the finish line
+            elif action == LAP_FINISHED or action == NEW_LAP:
+                # in case last sector is placed very close to the finish line
+                # there is a possibility that the game engine will 'jump' over the
+                # coords of the last sector, this fixes it by checking if all sectors
+                # are cleared in the first tick of the new lap, and calculates the time, if
+                # they are not, also used for the functionality of setting the last sector equal to the finish line
+                # by giving the last sector a progress checkpoint bigger than 1.
+                # last_lap_time - total_time_of_all_other_sectors
+                last_lap_time = ac.getCarState(0, acsys.CS.LastLap) / 1000
+                if not sector_buttons.are_all_sectors_cleared():
+                    check_sector_validity()
+                    set_up_times(3, last_lap_time)
+
+                # the new lap only starts below 0.3, for touge/hillclimb type maps
+                # where the player needs to go to pits after finishing a lap
+                if action == NEW_LAP:
+                    # laps with an invalid sector are not kept, their times would become bests when re-sectoring
+                    lap_valid = sector_buttons.invalid_sectors == 0
+                    journal.record(records.LAP, 0, current_lap, last_lap_time, lap_valid)
+                    emit_event(encode_lap(current_lap, last_lap_time, event_flags(lap_valid), time.time()))
+                    lap_speeds = sector_buttons.speeds.lap_record()
+                    sector_buttons.reset_sector_cleared()
+                    lap_snapshot = lap_telemetry.snapshot()
+                    lap_telemetry.start_lap()
+                    map_app.lap_completed(lap_snapshot)
+                    if cfg.record_telemetry and lap_snapshot.complete:
+                        telemetry_writer.add([lap_snapshot.progress, lap_snapshot.lap_time, lap_snapshot.speed,
+                                              lap_snapshot.x, lap_snapshot.y, lap_snapshot.z])
+                    delta_table.finish_lap(last_lap_time, lap_valid)
+                    if delta_table.last_lap is not None and lap_valid:
+                        lap_traces.add(delta_table.last_lap)
+                        # split from this lap's own trace, the labels can still hold a sector of
+                        # the previous lap (or no time at all) when checkpoints were missed near the line
+                        splits = split_laps(delta_table.last_lap, sector_buttons.sector_checkpoints)[0]
+                        if all(split > 0 for split in splits):
+                            top_laps.add(last_lap_time, splits, {'speeds': lap_speeds})
+                    delta_table.start_lap()
+
+
+def save_safely(name, save, *args):
+    """Runs the save of one of the app's auxiliary files (traces, telemetry...) on shutdown,
+    an unreadable existing file is logged instead of stopping the other saves."""
 
-                ses_time = abs(info.graphics.sessionTimeLeft)
-
-            # player exited the pits and is currently on track
-            elif player_exited_pits == True and not is_car_in_pit_area():
-                # player is still on the same lap
-                if current_lap == old_lap:
-                    if not check_backwards_driving(current_progress):
-                        set_up_times(current_progress, lap_time)
-                        ses_time = abs(info.graphics.sessionTimeLeft)
-
-                # player enters a new lap
-                # current_lap == info.graphics.completedLaps and info.graphics.completedLaps != 0
-                # conditions are because when you reset the game session, ac first resets lap count
-                # then jumps you to pits, so in that case, it will try to enter this if block,
-                # those conditions stop a false positive
-                elif current_lap != old_lap and current_lap == info.graphics.completedLaps and info.graphics.completedLaps != 0:
-                    # in case last sector is placed very close to the finish line
-                    # there is a possibility that the game engine will 'jump' over the
-                    # coords of the last sector, this fixes it by checking if all sectors
-                    # are cleared in the first tick of the new lap, and calculates the time, if
-                    # they are not, also used for the functionality of setting the last sector equal to the finish line
-                    # by giving the last sector a progress checkpoint bigger than 1.
-                    # last_lap_time - total_time_of_all_other_sectors
-                    if not sector_buttons.are_all_sectors_cleared():
-                        last_lap_time = ac.getCarState(0, acsys.CS.LastLap) / 1000
-                        set_up_times(3, last_lap_time)
-
-                    # 0.3 is arbitrary, for cases where the track is a touge/hillclimb type map
-                    # so the player needs to go to pits after finishing a lap
-                    if current_progress <= 0.3:
-                        old_lap = current_lap
-                        sector_buttons.reset_sector_cleared()
-                        new_lap_flag = True
+    try:
+        save(*args)
+    except Exception as error:
+        ac.log(app_name + ": could not save the " + name + ": " + repr(error))
 
 
 def acShutdown(*args):
     """Run on shutdown of Assetto Corsa"""
 
+    if sampler is not None:
+        sampler.stop()
+
     # Update config and stored data, only if necessary
     if correct_conditions:
         cfg.save()
@@ -1766,6 +2325,22 @@ def acShutdown(*args):
         stored_data.track_valid_flag = sector_buttons.is_configured()
         stored_data.imported_checkpoints = sector_buttons.sector_checkpoints
         stored_data.reset_times_flag_config = reset_times_flag_config
+        stored_data.sector_stats = sector_buttons.consistency.to_dict()
+
+        # the traces of this session must be on disk before the times get recomputed, the
+        # other files are only written after data.json so a bad one never costs the best times
+        save_safely("lap traces", lap_traces.save)
+        save_safely("top laps", top_laps.save, top_laps_path, sector_buttons.sector_checkpoints)
 
         stored_data.update()
         stored_data.save()
+
+        save_safely("telemetry", telemetry_writer.save)
+        save_safely("delta table", delta_table.save, delta_table_path)
+
+    if journal.written > 0:
+        save_safely("event journal", journal.save, journal_path)
+
+    for sender in event_senders:
+        sender.flush()
+        sender.close()
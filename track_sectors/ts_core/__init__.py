@@ -0,0 +1,6 @@
+"""Game independent building blocks of the Track Sectors app.
+
+Nothing inside this package imports the 'ac' or 'acsys' modules, so everything here
+can also be used by the offline tools, outside of Assetto Corsa.
+The package name is prefixed on purpose, since all the python apps of the game share
+the same interpreter, a generic name could clash with modules loaded by other apps."""
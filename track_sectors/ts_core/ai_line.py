@@ -0,0 +1,165 @@
+import math
+import mmap
+import struct
+from array import array
+
+# fast_lane.ai layout: 4 int32 header values (version, point count, lap time, sample count)
+# followed by one record per point: x, y, z, length (float32) and id (int32)
+HEADER = struct.Struct("<4i")
+POINT_SIZE = 20
+POINT_FIELDS = 5
+
+
+class AiLine:
+    """Points of the AI line, each channel stored as an array('f')."""
+
+    def __init__(self, x, y, z, length):
+        self.x = x
+        self.y = y
+        self.z = z
+
+        # cumulative length of the spline at every point, in meters
+        self.length = length
+
+        # the spline is closed, the last point connects back to the first one
+        self.total_length = length[-1] + math.hypot(x[0] - x[-1], z[0] - z[-1])
+
+    def __len__(self):
+        return len(self.x)
+
+    def progress(self, index):
+        """Normalized spline position of a point, the same value the game reports."""
+
+        return self.length[index] / self.total_length
+
+
+def load_ai_line(path):
+    """Parses the points of a fast_lane.ai file. The file is memory mapped and the point
+    records are read as a single float array, each channel is then a strided slice of it,
+    so there is no python level loop over the points.
+    The id field is read as a float as well, but it is never used."""
+
+    with open(path, "rb") as infile:
+        mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            version, point_count, lap_time, sample_count = HEADER.unpack_from(mapped, 0)
+            if point_count < 3 or HEADER.size + point_count * POINT_SIZE > len(mapped):
+                raise ValueError("corrupted AI line file: " + path)
+
+            points = array('f')
+            points.frombytes(mapped[HEADER.size:HEADER.size + point_count * POINT_SIZE])
+        finally:
+            mapped.close()
+
+    return AiLine(points[0::POINT_FIELDS], points[1::POINT_FIELDS], points[2::POINT_FIELDS],
+                  points[3::POINT_FIELDS])
+
+
+def curvature(ai_line, window=8):
+    """Signed curvature (1/radius) at every point, smoothed over +-window points.
+    Computed from the change in heading between consecutive segments."""
+
+    count = len(ai_line)
+    x = ai_line.x
+    z = ai_line.z
+
+    headings = [0.0] * count
+    segment_lengths = [0.0] * count
+    for i in range(0, count):
+        j = (i + 1) % count
+        headings[i] = math.atan2(z[j] - z[i], x[j] - x[i])
+        segment_lengths[i] = max(math.hypot(z[j] - z[i], x[j] - x[i]), 1e-3)
+
+    raw = [0.0] * count
+    for i in range(0, count):
+        turn = headings[i] - headings[i - 1]
+        # wraps the heading change to [-pi, pi]
+        turn = (turn + math.pi) % (2 * math.pi) - math.pi
+        raw[i] = turn / segment_lengths[i]
+
+    # moving average over the closed spline, using prefix sums
+    prefix = [0.0] * (count + 1)
+    for i in range(0, count):
+        prefix[i + 1] = prefix[i] + raw[i]
+
+    smoothed = array('f', [0.0] * count)
+    for i in range(0, count):
+        start = i - window
+        end = i + window + 1
+        total = 0.0
+        if start < 0:
+            total += prefix[count] - prefix[count + start]
+            start = 0
+        if end > count:
+            total += prefix[end - count]
+            end = count
+        total += prefix[end] - prefix[start]
+        smoothed[i] = total / (2 * window + 1)
+    return smoothed
+
+
+def find_corners(ai_line, min_radius=250.0):
+    """Finds the corners of the track, a corner being a run of points tighter than min_radius.
+    returns (apex index, exit index, total heading change) for every corner"""
+
+    curve = curvature(ai_line)
+    threshold = 1.0 / min_radius
+    corners = []
+
+    i = 0
+    count = len(ai_line)
+    while i < count:
+        if abs(curve[i]) < threshold:
+            i += 1
+            continue
+
+        # walks the corner until the curvature drops, or the direction of the turn changes
+        direction = curve[i] > 0
+        apex = i
+        heading_change = 0.0
+        while i < count and abs(curve[i]) >= threshold and (curve[i] > 0) == direction:
+            if abs(curve[i]) > abs(curve[apex]):
+                apex = i
+            j = (i + 1) % count
+            heading_change += abs(curve[i]) * math.hypot(ai_line.x[j] - ai_line.x[i], ai_line.z[j] - ai_line.z[i])
+            i += 1
+        corners.append((apex, i % count, heading_change))
+
+    return corners
+
+
+def propose_checkpoints(ai_line, sector_count, placement="exit"):
+    """Proposes the checkpoints for sector_count sectors, the last sector ends at the finish line.
+
+    The other checkpoints are put at the exit (or apex) of the biggest corners, biggest meaning
+    the largest change in heading, keeping a minimum distance between checkpoints. If the
+    track has fewer corners than needed, the largest gaps between checkpoints are split in half.
+    returns the checkpoints as normalized spline positions, in the same format as the ones set
+    with the sector buttons"""
+
+    needed = sector_count - 1
+    min_gap = 1.0 / (4 * sector_count)
+    corners = sorted(find_corners(ai_line), key=lambda corner: corner[2], reverse=True)
+
+    checkpoints = []
+    for apex, corner_exit, heading_change in corners:
+        if len(checkpoints) == needed:
+            break
+
+        progress = ai_line.progress(apex if placement == "apex" else corner_exit)
+
+        # checkpoints right next to the start/finish line would be cleared on the wrong lap
+        if progress < 0.01 or progress > 0.99:
+            continue
+        if all(abs(progress - other) >= min_gap for other in checkpoints):
+            checkpoints.append(progress)
+
+    checkpoints.sort()
+    while len(checkpoints) < needed:
+        bounds = [0.0] + checkpoints + [1.0]
+        gaps = [bounds[i + 1] - bounds[i] for i in range(0, len(bounds) - 1)]
+        largest = gaps.index(max(gaps))
+        checkpoints.insert(largest, bounds[largest] + gaps[largest] / 2)
+
+    # same precision as get_current_spline_pos(), 2 is the value for the finish line
+    return [round(checkpoint, 9) for checkpoint in checkpoints] + [2]
@@ -0,0 +1,131 @@
+import json
+import os
+from bisect import insort
+
+from ts_core.stored_data import iter_configurations, iter_cars, checkpoints_of, sector_times_of
+from ts_core.track_map import config_file_name
+
+
+def data_source(path, date_time):
+    """Identifies the data file an index is built from: the date_time value the app writes in
+    it on every save (changed by merges and backup restores) and its modification time (changed
+    by editing it by hand)."""
+
+    return [date_time, os.path.getmtime(path)]
+
+
+class CarIndex:
+    """Per sector best times of every car, for every track/layout configuration.
+
+    For each sector the cars are kept sorted by their best time, so the K fastest cars
+    of a sector are a slice of K elements. The sum of the fastest time of every sector
+    (theoretical best over all cars) is kept up to date on every change."""
+
+    def __init__(self):
+        # configuration key -> {'checkpoints': [...], 'sectors': [[[time, car], ...], ...], 'best_sum': float}
+        self.configurations = {}
+
+    @staticmethod
+    def key(track_name, track_layout):
+        return config_file_name(track_name, track_layout, "")
+
+    def set_configuration(self, key, checkpoints):
+        """Starts an empty index for a configuration, dropping any existing one."""
+
+        self.configurations[key] = {'checkpoints': list(checkpoints),
+                                    'sectors': [[] for i in range(0, len(checkpoints))],
+                                    'best_sum': None}
+
+    def remove_configuration(self, key):
+        self.configurations.pop(key, None)
+
+    def remove_car(self, key, car):
+        configuration = self.configurations.get(key)
+        if configuration is None:
+            return
+        for sector in configuration['sectors']:
+            for i in range(0, len(sector)):
+                if sector[i][1] == car:
+                    del sector[i]
+                    break
+        self._update_best_sum(configuration)
+
+    def update_car(self, key, car, sector_times):
+        """Replaces the times of a car, None meaning the sector has no time.
+        O(cars) per sector, since the previous entry of the car has to be found."""
+
+        configuration = self.configurations.get(key)
+        if configuration is None:
+            return
+        self.remove_car(key, car)
+        for sector, sector_time in zip(configuration['sectors'], sector_times):
+            if sector_time is not None:
+                insort(sector, [round(sector_time, 3), car])
+        self._update_best_sum(configuration)
+
+    def _update_best_sum(self, configuration):
+        if all(configuration['sectors']):
+            configuration['best_sum'] = round(sum(sector[0][0] for sector in configuration['sectors']), 3)
+        else:
+            configuration['best_sum'] = None
+
+    def top_cars(self, key, sector_index, k):
+        """The k fastest [time, car] pairs of a sector, fastest first."""
+
+        configuration = self.configurations.get(key)
+        if configuration is None or sector_index >= len(configuration['sectors']):
+            return []
+        return configuration['sectors'][sector_index][:k]
+
+    def best_time(self, key, sector_index):
+        """Fastest time of any car in a sector, None if there is none."""
+
+        top = self.top_cars(key, sector_index, 1)
+        return top[0][0] if top else None
+
+    def theoretical_best(self, key):
+        """Sum of the fastest time of every sector, over all cars."""
+
+        configuration = self.configurations.get(key)
+        return configuration['best_sum'] if configuration else None
+
+    def index_entry(self, key, entry):
+        """(Re)builds the index of a configuration from its entry of the stored dictionary."""
+
+        checkpoints = checkpoints_of(entry)
+        self.set_configuration(key, checkpoints)
+        for car, car_entry in iter_cars(entry):
+            self.update_car(key, car, sector_times_of(car_entry, len(checkpoints)))
+
+    def index_dictionary(self, items):
+        """Builds the index from (track, track entry) pairs, either from the stored dictionary
+        or streamed from the data file."""
+
+        for track, track_entry in items:
+            for layout, entry in iter_configurations(track, track_entry):
+                self.index_entry(self.key(track, layout), entry)
+
+    def save(self, path, source):
+        """Writes the index with the data_source() of the data file it was built from."""
+
+        with open(path, "w") as outfile:
+            json.dump({'source': source, 'configurations': self.configurations}, outfile)
+
+    @staticmethod
+    def load(path, source):
+        """Returns the index stored at path, or None if there is no (valid) index or if it was
+        built from another version of the data file than source, so that it gets rebuilt."""
+
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as infile:
+                stored = json.load(infile)
+        except ValueError:
+            return None
+        # indexes written before the source was stored are rebuilt as well
+        if not isinstance(stored, dict) or stored.get('source') != source or 'configurations' not in stored:
+            return None
+        index = CarIndex()
+        index.configurations = stored['configurations']
+        return index
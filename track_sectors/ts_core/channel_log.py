@@ -0,0 +1,82 @@
+"""Channel based binary log, in the spirit of the MoTeC .ld logs data analysis tools read.
+
+A log holds one run (one lap) sampled at a fixed rate. Each channel is stored contiguously
+as fixed point int32 values with its own scale, followed by markers (the sector crossings,
+like the beacons of a logger):
+
+    header    magic, version, channel count, marker count, sample rate, sample count,
+              track, layout, car, date
+    channels  name, unit, scale, data offset (one descriptor per channel)
+    data      sample count int32 values per channel
+    markers   time, label
+"""
+import struct
+from array import array
+
+MAGIC = b"TSLG"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHHdI64s64s64s32s")
+CHANNEL = struct.Struct("<32s16sdQ")
+MARKER = struct.Struct("<d32s")
+
+
+def text(value, size):
+    # cut on a character boundary, half of a multi byte character would not decode
+    return value.encode("utf-8")[:size].decode("utf-8", "ignore").encode("utf-8")
+
+
+def write_channel_log(outfile, rate, channels, markers=(), track="", layout="", car="", date=""):
+    """Writes a log, channels being (name, unit, scale, values) with the same number of
+    values each, and markers (time in seconds, label) pairs."""
+
+    sample_count = len(channels[0][3]) if channels else 0
+    outfile.write(HEADER.pack(MAGIC, VERSION, len(channels), len(markers), rate, sample_count,
+                              text(track, 64), text(layout, 64), text(car, 64), text(date, 32)))
+
+    offset = HEADER.size + CHANNEL.size * len(channels)
+    for name, unit, scale, values in channels:
+        outfile.write(CHANNEL.pack(text(name, 32), text(unit, 16), scale, offset))
+        offset += sample_count * 4
+
+    for name, unit, scale, values in channels:
+        data = array('i', [int(round(value * scale)) for value in values])
+        data.tofile(outfile)
+
+    for marker_time, label in markers:
+        outfile.write(MARKER.pack(marker_time, text(label, 32)))
+
+
+def decoded(value):
+    # logs written before the cut was on a character boundary can end with half a character
+    return value.rstrip(b"\0").decode("utf-8", "ignore")
+
+
+def read_channel_log(path):
+    """Reads a log written by write_channel_log.
+    returns (metadata dict, list of (name, unit, values as array('d')), list of markers)"""
+
+    with open(path, "rb") as infile:
+        data = infile.read()
+
+    magic, version, channel_count, marker_count, rate, sample_count, track, layout, car, date = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a channel log")
+    metadata = {'rate': rate, 'samples': sample_count, 'track': decoded(track), 'layout': decoded(layout),
+                'car': decoded(car), 'date': decoded(date)}
+
+    channels = []
+    end = HEADER.size
+    for i in range(0, channel_count):
+        name, unit, scale, offset = CHANNEL.unpack_from(data, HEADER.size + i * CHANNEL.size)
+        fixed = array('i')
+        fixed.frombytes(data[offset:offset + sample_count * 4])
+        channels.append((decoded(name), decoded(unit), array('d', [value / scale for value in fixed])))
+        end = max(end, offset + sample_count * 4)
+
+    markers = []
+    for i in range(0, marker_count):
+        marker_time, label = MARKER.unpack_from(data, end + i * MARKER.size)
+        markers.append((marker_time, decoded(label)))
+    return metadata, channels, markers
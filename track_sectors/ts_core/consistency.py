@@ -0,0 +1,81 @@
+import math
+from array import array
+from collections import OrderedDict
+
+
+class SectorConsistency:
+    """Running lap count, mean and variance of the times of every sector.
+
+    Uses Welford's algorithm, so adding a time is O(1) and no past times are kept:
+    for each sector only the count, the mean and the sum of squared differences
+    from the mean (m2) are stored."""
+
+    def __init__(self, sector_count=0):
+        self.reset(sector_count)
+
+    def reset(self, sector_count):
+        self.count = array('i', [0] * sector_count)
+        self.mean = array('d', [0.0] * sector_count)
+        self.m2 = array('d', [0.0] * sector_count)
+
+    def __len__(self):
+        return len(self.count)
+
+    def add(self, index, value):
+        self.count[index] += 1
+        delta = value - self.mean[index]
+        self.mean[index] += delta / self.count[index]
+        self.m2[index] += delta * (value - self.mean[index])
+
+    def variance(self, index):
+        """Sample variance of a sector, None with less than 2 times."""
+
+        if self.count[index] < 2:
+            return None
+        return self.m2[index] / (self.count[index] - 1)
+
+    def std(self, index):
+        variance = self.variance(index)
+        return None if variance is None else math.sqrt(variance)
+
+    def merge(self, other):
+        """Adds the statistics of other, for the same sectors, as if its times had been added
+        one by one (the parallel form of Welford's algorithm)."""
+
+        for i in range(0, len(self.count)):
+            if other.count[i] == 0:
+                continue
+            count = self.count[i] + other.count[i]
+            delta = other.mean[i] - self.mean[i]
+            self.mean[i] += delta * other.count[i] / count
+            self.m2[i] += other.m2[i] + delta * delta * self.count[i] * other.count[i] / count
+            self.count[i] = count
+
+    def to_dict(self):
+        """Stored format, next to the best times of a car: sector_n -> [count, mean, m2]."""
+
+        stats = OrderedDict()
+        for i in range(0, len(self.count)):
+            stats['sector_' + str(i + 1)] = [self.count[i], round(self.mean[i], 6), round(self.m2[i], 6)]
+        return stats
+
+    def load(self, stats):
+        """Loads the stored format, sectors missing from it start from zero."""
+
+        self.reset(len(self.count))
+        if not stats:
+            return
+        for i in range(0, len(self.count)):
+            values = stats.get('sector_' + str(i + 1))
+            if values is not None:
+                self.count[i], self.mean[i], self.m2[i] = int(values[0]), values[1], values[2]
+
+    @staticmethod
+    def from_laps(laps, sector_count):
+        """Statistics of a list of laps, each lap being a list of sector times."""
+
+        consistency = SectorConsistency(sector_count)
+        for sectors in laps:
+            for i in range(0, sector_count):
+                consistency.add(i, sectors[i])
+        return consistency
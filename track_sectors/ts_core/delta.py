@@ -0,0 +1,109 @@
+import os
+from array import array
+
+
+class DeltaTable:
+    """Progress to lap time lookup table of the best lap, used for the live delta.
+
+    Both the best lap and the lap in progress are stored as the lap time at fixed
+    progress steps (bins), so the memory used does not depend on the sector count or
+    on the frame rate. Recording a tick and looking up the delta are both O(1)."""
+
+    def __init__(self, resolution=1000):
+        self.resolution = resolution
+        self.has_best = False
+        self.changed = False
+
+        # lap time at progress i / resolution, the last bin holds the lap time
+        self.best = array('f', [0.0] * (resolution + 1))
+        self.current = array('f', [0.0] * (resolution + 1))
+
+        self.recording = False
+        self.next_bin = 0
+
+        # bins of the last complete recorded lap, valid until the next lap is finished
+        self.last_lap = None
+        self.last_progress = 0.0
+        self.last_time = 0.0
+
+    def start_lap(self):
+        self.recording = True
+        self.last_lap = None
+        self.next_bin = 1
+        self.last_progress = 0.0
+        self.last_time = 0.0
+
+    def discard(self):
+        self.recording = False
+
+    def record(self, progress, lap_time):
+        """Fills every bin passed since the previous tick, interpolating between the two ticks."""
+
+        if not self.recording or progress <= self.last_progress:
+            return
+
+        resolution = self.resolution
+        while self.next_bin < resolution and self.next_bin <= progress * resolution:
+            bin_progress = self.next_bin / resolution
+            self.current[self.next_bin] = self.last_time + (lap_time - self.last_time) * (
+                    (bin_progress - self.last_progress) / (progress - self.last_progress))
+            self.next_bin += 1
+
+        self.last_progress = progress
+        self.last_time = lap_time
+
+    def finish_lap(self, lap_time, valid=True):
+        """Completes the recorded lap with its final time, and keeps it as the
+        reference if it is valid and faster than the stored best lap.
+        returns True if the lap became the new best lap"""
+
+        self.last_lap = None
+        if not self.recording:
+            return False
+
+        # the bins between the last tick and the finish line
+        self.record(1.0, lap_time)
+        self.current[self.resolution] = lap_time
+        self.recording = False
+
+        if valid and (not self.has_best or lap_time < self.best[self.resolution]):
+            self.best, self.current = self.current, self.best
+            self.has_best = True
+            self.changed = True
+            self.last_lap = self.best
+            return True
+
+        self.last_lap = self.current
+        return False
+
+    def delta(self, progress, lap_time):
+        """Difference between the current lap time and the best lap time at the same progress,
+        negative values meaning the current lap is faster. Returns None without a best lap."""
+
+        if not self.has_best or not 0 <= progress <= 1:
+            return None
+
+        position = progress * self.resolution
+        index = min(int(position), self.resolution - 1)
+        fraction = position - index
+        return lap_time - (self.best[index] * (1 - fraction) + self.best[index + 1] * fraction)
+
+    def load(self, path):
+        if os.path.exists(path) and os.path.getsize(path) == len(self.best) * self.best.itemsize:
+            with open(path, "rb") as infile:
+                stored = array('f')
+                stored.fromfile(infile, len(self.best))
+            self.best = stored
+            self.has_best = True
+
+    def save(self, path):
+        """Writes the best lap, only if it changed since it was loaded."""
+
+        if not self.changed:
+            return
+        folder = os.path.dirname(path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, "wb") as outfile:
+            self.best.tofile(outfile)
+        self.changed = False
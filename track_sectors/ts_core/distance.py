@@ -0,0 +1,121 @@
+import math
+import os
+import struct
+from array import array
+
+# resolution (int32), total length in meters (float32)
+HEADER = struct.Struct("<if")
+
+
+class DistanceTable:
+    """Lookup tables between the normalized spline position and the distance along the track.
+
+    The normalized spline position comes from the AI line's own length field, which is not
+    linear in the distance actually driven (the field ignores elevation and its points are not
+    evenly spaced), so both directions are stored as tables with evenly spaced steps, giving
+    O(1) conversions with linear interpolation."""
+
+    def __init__(self, meters, progress, total_length):
+        self.resolution = len(meters) - 1
+        self.total_length = total_length
+
+        # meters[i] is the distance at progress i / resolution
+        self.meters = meters
+        # progress[j] is the progress at distance j * total_length / resolution
+        self.progress = progress
+
+    def to_meters(self, progress):
+        position = min(max(progress, 0.0), 1.0) * self.resolution
+        index = min(int(position), self.resolution - 1)
+        fraction = position - index
+        return self.meters[index] * (1 - fraction) + self.meters[index + 1] * fraction
+
+    def to_progress(self, meters):
+        position = min(max(meters / self.total_length, 0.0), 1.0) * self.resolution
+        index = min(int(position), self.resolution - 1)
+        fraction = position - index
+        return self.progress[index] * (1 - fraction) + self.progress[index + 1] * fraction
+
+    def equal_distance_checkpoints(self, sector_count):
+        """Checkpoints that split the track into sectors of equal length, the last one
+        being the finish line."""
+
+        sector_length = self.total_length / sector_count
+        return [round(self.to_progress(sector_length * i), 9) for i in range(1, sector_count)] + [2]
+
+    def sector_lengths(self, checkpoints):
+        """Length in meters of every sector, the finish line checkpoint (2) being the end of the lap."""
+
+        lengths = []
+        previous = 0.0
+        for checkpoint in checkpoints:
+            distance = self.to_meters(min(checkpoint, 1.0))
+            lengths.append(distance - previous)
+            previous = distance
+        return lengths
+
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, "wb") as outfile:
+            outfile.write(HEADER.pack(self.resolution, self.total_length))
+            self.meters.tofile(outfile)
+            self.progress.tofile(outfile)
+
+    @staticmethod
+    def load(path):
+        """Returns the table cached at path, or None if there is no (valid) cache."""
+
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as infile:
+            data = infile.read()
+        try:
+            resolution, total_length = HEADER.unpack_from(data, 0)
+        except struct.error:
+            return None
+        if len(data) != HEADER.size + 2 * (resolution + 1) * 4:
+            return None
+
+        tables = array('f')
+        tables.frombytes(data[HEADER.size:])
+        return DistanceTable(tables[:resolution + 1], tables[resolution + 1:], total_length)
+
+
+def resample(source, target, resolution):
+    """Samples the piecewise linear function source -> target (source increasing from 0 to 1)
+    at resolution + 1 evenly spaced steps."""
+
+    table = array('f', [0.0] * (resolution + 1))
+    j = 0
+    for i in range(0, resolution + 1):
+        position = i / resolution
+        while j < len(source) - 2 and source[j + 1] < position:
+            j += 1
+        span = source[j + 1] - source[j]
+        fraction = (position - source[j]) / span if span > 0 else 0.0
+        table[i] = target[j] + (target[j + 1] - target[j]) * min(max(fraction, 0.0), 1.0)
+    return table
+
+
+def build_distance_table(ai_line, resolution=2000):
+    """Builds the tables from the points of the AI line, measuring the actual 3D
+    distance between consecutive points."""
+
+    count = len(ai_line)
+    progress = [ai_line.progress(0)] + [0.0] * count
+    meters = [0.0] * (count + 1)
+
+    # the spline is closed, the extra point is the first one again, at progress 1
+    for i in range(1, count + 1):
+        j = i % count
+        progress[i] = ai_line.progress(i) if i < count else 1.0
+        meters[i] = meters[i - 1] + math.sqrt((ai_line.x[j] - ai_line.x[i - 1]) ** 2 +
+                                              (ai_line.y[j] - ai_line.y[i - 1]) ** 2 +
+                                              (ai_line.z[j] - ai_line.z[i - 1]) ** 2)
+
+    total_length = meters[count]
+    normalized_meters = [i / total_length for i in meters]
+    return DistanceTable(resample(progress, meters, resolution),
+                         resample(normalized_meters, progress, resolution), total_length)
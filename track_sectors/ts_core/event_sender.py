@@ -0,0 +1,153 @@
+import time
+from collections import deque
+
+try:
+    import select
+    import socket
+except ImportError:
+    # the python of some game installs lacks the socket modules, events are then never sent
+    select = None
+    socket = None
+
+
+class EventSender:
+    """Sends encoded events (see events.py) to the companion daemon over a localhost TCP
+    connection, without ever blocking the game.
+
+    send() only queues the event, the oldest events are dropped past max_queue. flush(),
+    called once per tick, writes whatever the non-blocking socket accepts. While the daemon
+    is not running the connection is retried every retry_interval seconds, and hello (the
+    session event) is sent first on every new connection."""
+
+    def __init__(self, host, port, hello=b"", max_queue=1024, retry_interval=5.0):
+        self.address = (host, port)
+        self.hello = hello
+        self.queue = deque(maxlen=max_queue)
+        self.retry_interval = retry_interval
+        self.sock = None
+        self.connected = False
+        self.next_attempt = 0.0
+        self.pending = b""
+        self.dropped = 0
+
+    def send(self, data):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(data)
+
+    def flush(self):
+        if socket is None or not self._connect():
+            return
+
+        if not self.pending and self.queue:
+            self.pending = b"".join(self.queue)
+            self.queue.clear()
+        try:
+            while self.pending:
+                sent = self.sock.send(self.pending)
+                self.pending = self.pending[sent:]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except socket.error:
+            self.close()
+
+    def _connect(self):
+        """Advances the non-blocking connection, returns True once it is established."""
+
+        if self.connected:
+            return True
+
+        if self.sock is None:
+            now = time.time()
+            if now < self.next_attempt:
+                return False
+            self.next_attempt = now + self.retry_interval
+
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setblocking(False)
+            self.sock.connect_ex(self.address)
+            return False
+
+        # the connection attempt finished once the socket is writable, on Windows a refused
+        # connection only shows up in the exception set and the socket never becomes writable
+        try:
+            ready, writable, failed = select.select([], [self.sock], [self.sock], 0)
+        except (OSError, ValueError):
+            self.close()
+            return False
+        if failed:
+            self.close()
+            return False
+        if not writable:
+            # still pending after retry_interval, given up so the next flush tries again
+            if time.time() >= self.next_attempt:
+                self.close()
+            return False
+        if self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            self.close()
+            return False
+
+        self.connected = True
+        self.pending = self.hello
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.connected = False
+        self.pending = b""
+
+
+class DatagramSender:
+    """Sends every encoded event as one UDP datagram, by default broadcast to the local
+    network for dashboards. Like EventSender it never blocks: send() queues, flush() sends
+    what the non-blocking socket accepts, and events that do not fit in the queue are
+    dropped. hello (the session event) is repeated every hello_interval seconds so a
+    listener started mid session still learns the track and car."""
+
+    def __init__(self, address, port, hello=b"", max_queue=256, hello_interval=5.0):
+        self.address = (address, port)
+        self.hello = hello
+        self.queue = deque()
+        self.max_queue = max_queue
+        self.hello_interval = hello_interval
+        self.next_hello = 0.0
+        self.dropped = 0
+        self.sock = None
+
+        if socket is not None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self.sock.setblocking(False)
+
+    def send(self, data):
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self.queue.append(data)
+
+    def flush(self):
+        if self.sock is None:
+            return
+
+        now = time.time()
+        if self.hello and now >= self.next_hello:
+            self.next_hello = now + self.hello_interval
+            self.queue.appendleft(self.hello)
+
+        try:
+            while self.queue:
+                self.sock.sendto(self.queue[0], self.address)
+                self.queue.popleft()
+        except (BlockingIOError, InterruptedError):
+            pass
+        except socket.error:
+            # unreachable network and the like, the datagram is dropped
+            self.queue.popleft()
+            self.dropped += 1
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
@@ -0,0 +1,111 @@
+import struct
+
+# default port of the companion daemon (tools/companion.py)
+COMPANION_PORT = 9966
+
+# type, flags, sector, payload length, lap, time (s), timestamp (s since the epoch when created)
+EVENT_HEADER = struct.Struct("<BBHHIdd")
+
+SESSION = 1
+SECTOR = 2
+LAP = 3
+
+# flags
+VALID = 1
+NEW_BEST = 2
+
+
+class Event:
+    """A decoded event. For session events payload is the text "track\\tlayout\\tcar"."""
+
+    def __init__(self, event_type, flags, sector, lap, time, timestamp, payload=b""):
+        self.type = event_type
+        self.flags = flags
+        self.sector = sector
+        self.lap = lap
+        self.time = time
+        self.timestamp = timestamp
+        self.payload = payload
+
+    @property
+    def valid(self):
+        return bool(self.flags & VALID)
+
+    @property
+    def new_best(self):
+        return bool(self.flags & NEW_BEST)
+
+    def session_names(self):
+        """(track, layout, car) of a session event."""
+
+        return tuple(self.payload.decode("utf-8").split("\t"))
+
+    def encode(self):
+        return EVENT_HEADER.pack(self.type, self.flags, self.sector, len(self.payload), self.lap, self.time,
+                                 self.timestamp) + self.payload
+
+
+def event_flags(valid, new_best=False):
+    return (VALID if valid else 0) | (NEW_BEST if new_best else 0)
+
+
+def encode_session(track_name, track_layout, car_name, timestamp):
+    payload = "\t".join((track_name, track_layout, car_name)).encode("utf-8")
+    return EVENT_HEADER.pack(SESSION, 0, 0, len(payload), 0, 0.0, timestamp) + payload
+
+
+def encode_sector(sector, lap, sector_time, flags, timestamp):
+    return EVENT_HEADER.pack(SECTOR, flags, sector, 0, lap, sector_time, timestamp)
+
+
+def encode_lap(lap, lap_time, flags, timestamp):
+    return EVENT_HEADER.pack(LAP, flags, 0, 0, lap, lap_time, timestamp)
+
+
+def decode_event(buffer, offset=0):
+    """Decodes the event at offset, returns (event, offset after it), or (None, offset)
+    if the buffer does not hold the whole event yet."""
+
+    if len(buffer) - offset < EVENT_HEADER.size:
+        return None, offset
+    event_type, flags, sector, length, lap, time, timestamp = EVENT_HEADER.unpack_from(buffer, offset)
+    end = offset + EVENT_HEADER.size + length
+    if len(buffer) < end:
+        return None, offset
+    payload = bytes(buffer[offset + EVENT_HEADER.size:end])
+    return Event(event_type, flags, sector, lap, time, timestamp, payload), end
+
+
+class EventDecoder:
+    """Splits a byte stream (socket reads, a recorded file) back into events, keeping
+    the incomplete tail until the rest arrives."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Adds data, returns the list of events completed by it."""
+
+        self.buffer.extend(data)
+        events = []
+        offset = 0
+        while True:
+            event, offset = decode_event(self.buffer, offset)
+            if event is None:
+                break
+            events.append(event)
+        del self.buffer[:offset]
+        return events
+
+
+def iter_recorded_events(path, chunk_size=65536):
+    """Events of a file written by the companion daemon (the raw stream, as received)."""
+
+    decoder = EventDecoder()
+    with open(path, "rb") as infile:
+        while True:
+            data = infile.read(chunk_size)
+            if not data:
+                break
+            for event in decoder.feed(data):
+                yield event
@@ -0,0 +1,73 @@
+from array import array
+
+
+class HeatmapStrip:
+    """Precomputed geometry and colors for the sector overview strip.
+
+    The strip draws every sector as a bar whose width is proportional to the
+    track progress covered by that sector. The geometry is built once per
+    configuration (or window size), and the colors are only updated when a sector
+    gets cleared, so drawing a frame is one pass over two float arrays."""
+
+    neutral_color = (0.35, 0.35, 0.35)
+
+    def __init__(self, saturation=0.02):
+        # relative delta (delta / best) at which the color is fully red or green
+        self.saturation = saturation
+
+        self.sector_count = 0
+        self.y = 0
+        self.height = 0
+        self.current_sector = 0
+        self.dirty = True
+
+        # [x, width] pairs for every sector
+        self.quads = array('f')
+        # [r, g, b] triplets for every sector
+        self.colors = array('f')
+
+    def build(self, checkpoints, x, y, width, height):
+        """Computes the position and width of every sector bar, in window pixels.
+        The finish line checkpoint (stored as 2) is treated as the end of the lap."""
+
+        self.sector_count = len(checkpoints)
+        self.y = y
+        self.height = height
+        self.quads = array('f', [0.0] * (2 * self.sector_count))
+
+        previous = 0.0
+        for i in range(0, self.sector_count):
+            end = min(checkpoints[i], 1.0)
+            self.quads[2 * i] = x + previous * width
+
+            # at least one pixel wide, so very short sectors are still visible
+            self.quads[2 * i + 1] = max((end - previous) * width, 1.0)
+            previous = end
+
+        if len(self.colors) != 3 * self.sector_count:
+            self.clear_colors()
+        self.dirty = False
+
+    def clear_colors(self):
+        self.colors = array('f', self.neutral_color * self.sector_count)
+
+    def set_delta(self, index, delta, best):
+        """Colors a sector bar by its delta against the best time, green when faster,
+        red when slower, the color intensity grows with the relative delta."""
+
+        if index >= self.sector_count:
+            return
+
+        if best:
+            intensity = min(abs(delta) / (best * self.saturation), 1.0)
+        else:
+            intensity = 1.0
+
+        base = self.neutral_color[0] * (1 - intensity)
+        if delta < 0:
+            self.colors[3 * index] = base
+            self.colors[3 * index + 1] = base + intensity
+        else:
+            self.colors[3 * index] = base + intensity
+            self.colors[3 * index + 1] = base
+        self.colors[3 * index + 2] = base
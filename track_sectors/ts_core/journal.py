@@ -0,0 +1,104 @@
+"""Always on journal of the timing decisions of the app, to find out afterwards why a split
+came out wrong.
+
+Every event is a fixed size binary record written into a preallocated ring, the oldest
+records being overwritten once it is full. Nothing touches the disk while driving, the ring
+is only written to a file when the game closes or when asked to from the settings window,
+and tools/journal_decode.py prints it back as a timeline.
+
+    header    magic, version, record size, capacity, number of records, wall time and
+              clock time of the save
+    records   clock time, kind, index, lap, a, b (oldest first)
+
+Records are stamped with time.perf_counter(), time.time() is too coarse on Windows to order
+events of the same tick, the clock and wall time of the save convert them back to dates.
+The meaning of index, a and b depends on the kind of the record. The lap is the lap the
+record belongs to.
+"""
+import os
+import struct
+import time
+
+clock = time.perf_counter
+
+MAGIC = b"TSJR"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIdd")
+RECORD = struct.Struct("<dHHIdd")
+pack_record = RECORD.pack_into
+RECORD_SIZE = RECORD.size
+
+# kinds of records, with the meaning of their index, a and b fields
+STATE = 0  # new state, position, old state (session.STATE_NAMES)
+CROSSING = 1  # sector, position, lap time of the crossing
+NEW_BEST = 2  # sector, new best, old best (0 for the first time of the sector)
+RESET = 3  # 1 for a session restart and 0 for a jump to the pits, position, session time left
+BACKWARDS = 4  # -, rejected position, furthest position of the lap (first of consecutive rejections)
+LAP = 5  # -, lap time, 1 when valid
+INVALID = 6  # sector, tyres out, penalty time
+
+KIND_NAMES = ("state", "crossing", "new best", "reset", "backwards", "lap", "invalid")
+
+
+class EventJournal:
+    """Ring of binary records, written from the game thread only.
+
+    record() packs straight into the preallocated buffer, so an event allocates nothing
+    that outlives the call (tools/journal_decode.py --benchmark measures its cost)."""
+
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.buffer = bytearray(RECORD.size * capacity)
+        self.end = len(self.buffer)
+        # byte offset of the next record
+        self.offset = 0
+        self.written = 0
+
+    def record(self, kind, index=0, lap=0, a=0.0, b=0.0):
+        offset = self.offset
+        pack_record(self.buffer, offset, clock(), kind, index, lap, a, b)
+        offset += RECORD_SIZE
+        self.offset = 0 if offset == self.end else offset
+        self.written += 1
+
+    def records(self):
+        """The bytes of the records still in the ring, oldest first."""
+
+        count = min(self.written, self.capacity)
+        end = self.offset
+        if count < self.capacity:
+            return bytes(self.buffer[0:end])
+        return bytes(self.buffer[end:]) + bytes(self.buffer[0:end])
+
+    def save(self, path, keep=10):
+        """Writes the ring to path, keeping the newest keep journals of its folder."""
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        records = self.records()
+        with open(path, "wb") as outfile:
+            outfile.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity, len(records) // RECORD.size,
+                                      time.time(), clock()))
+            outfile.write(records)
+
+        if folder and keep > 0:
+            journals = sorted((name for name in os.listdir(folder) if name.endswith(".tsj")),
+                              key=lambda name: os.path.getmtime(os.path.join(folder, name)))
+            for name in journals[:-keep]:
+                os.remove(os.path.join(folder, name))
+
+
+def read_journal(path):
+    """Reads a journal written by EventJournal.save.
+    returns (wall time of the save, clock time of the save, list of (clock time, kind, index, lap, a, b)
+    records, oldest first)"""
+
+    with open(path, "rb") as infile:
+        data = infile.read()
+
+    magic, version, record_size, capacity, count, saved_at, saved_clock = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError("not an event journal")
+    return saved_at, saved_clock, [RECORD.unpack_from(data, HEADER.size + i * RECORD.size) for i in range(0, count)]
@@ -0,0 +1,93 @@
+import json
+from collections import OrderedDict
+
+
+class JsonObjectStream:
+    """Iterates over the (key, value) pairs of the top level object of a JSON file,
+    without loading the whole file. Only one value is decoded and kept in memory at
+    a time, so reading the data file track by track uses memory proportional to
+    the largest track entry, instead of the whole history."""
+
+    whitespace = " \t\n\r"
+
+    def __init__(self, infile, chunk_size=1 << 16):
+        self.infile = infile
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _read(self, size):
+        """Appends more of the file to the buffer, dropping what was already parsed.
+        returns False at the end of the file"""
+
+        chunk = self.infile.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def _next_char(self):
+        """Skips whitespace and returns the next character, or "" at the end of the file."""
+
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self.whitespace:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read(self.chunk_size):
+                return ""
+
+    def _decode(self):
+        """Decodes the JSON value at the current position, reading more of the file until
+        the value is complete. The read size doubles on every retry, so a huge value is
+        decoded a logarithmic number of times."""
+
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a number at the very end of the buffer could continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._read(size)
+            size *= 2
+
+    def _expect(self, character):
+        if self._next_char() != character:
+            raise ValueError("expected '" + character + "' at offset " + str(self.position))
+        self.position += 1
+
+    def __iter__(self):
+        self._expect("{")
+        if self._next_char() == "}":
+            return
+
+        while True:
+            self._next_char()
+            key = self._decode()
+            self._expect(":")
+            self._next_char()
+            yield key, self._decode()
+
+            separator = self._next_char()
+            self.position += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError("expected ',' or '}' at offset " + str(self.position - 1))
+
+
+def iter_object_items(path, chunk_size=1 << 16):
+    """Yields the (key, value) pairs of the top level object of the JSON file at path."""
+
+    with open(path, "r") as infile:
+        for key, value in JsonObjectStream(infile, chunk_size):
+            yield key, value
@@ -0,0 +1,137 @@
+import os
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    # the game's python does not ship numpy, the pure python path is used there
+    numpy = None
+
+# number of progress steps of a stored lap, every lap is stored as resolution + 1 floats
+LAP_TRACE_RESOLUTION = 1000
+
+
+class LapTraceStore:
+    """Progress to time traces of every complete lap of a car on a track/layout.
+
+    Each lap is the lap time at fixed progress steps, the same format as the live
+    delta table, appended to a flat float32 file. Since the traces do not depend on
+    the sector checkpoints, the sector times can be computed again for any new
+    configuration of the track."""
+
+    def __init__(self, path, resolution=LAP_TRACE_RESOLUTION):
+        self.path = path
+        self.resolution = resolution
+        self.pending = []
+        self.cleared = False
+
+    def add(self, trace):
+        # copied, the trace array gets reused by the delta table for the next lap
+        self.pending.append(array('f', trace))
+
+    def clear(self):
+        """Drops every stored lap of this car, used when resetting the times."""
+
+        self.pending = []
+        self.cleared = True
+
+    def save(self):
+        if self.cleared and os.path.exists(self.path):
+            os.remove(self.path)
+        self.cleared = False
+
+        if not self.pending:
+            return
+        folder = os.path.dirname(self.path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(self.path, "ab") as outfile:
+            for trace in self.pending:
+                trace.tofile(outfile)
+        self.pending = []
+
+
+def load_traces(path, resolution=LAP_TRACE_RESOLUTION):
+    """Reads all the laps stored at path as a flat array, lap n starts at n * (resolution + 1)."""
+
+    traces = array('f')
+    if os.path.exists(path):
+        with open(path, "rb") as infile:
+            traces.frombytes(infile.read())
+
+    # drops a partially written lap, if any
+    del traces[len(traces) - len(traces) % (resolution + 1):]
+    return traces
+
+
+def checkpoint_positions(checkpoints, resolution):
+    """Converts the checkpoints to (bin index, fraction) pairs, the finish line checkpoint
+    (stored as 2) is the last bin."""
+
+    positions = []
+    for checkpoint in checkpoints:
+        position = min(checkpoint, 1.0) * resolution
+        index = min(int(position), resolution - 1)
+        positions.append((index, position - index))
+    return positions
+
+
+def split_laps(traces, checkpoints, resolution=LAP_TRACE_RESOLUTION):
+    """Computes the sector times of every stored lap for the given checkpoints.
+    returns a list with one list of sector times per lap"""
+
+    if numpy is not None:
+        return split_laps_vectorized(traces, checkpoints, resolution).tolist()
+
+    lap_size = resolution + 1
+    lap_count = len(traces) // lap_size
+    positions = checkpoint_positions(checkpoints, resolution)
+    laps = []
+    for lap in range(0, lap_count):
+        offset = lap * lap_size
+        previous = 0.0
+        sectors = []
+        for index, fraction in positions:
+            time = traces[offset + index] * (1 - fraction) + traces[offset + index + 1] * fraction
+            sectors.append(time - previous)
+            previous = time
+        laps.append(sectors)
+    return laps
+
+
+def split_laps_vectorized(traces, checkpoints, resolution=LAP_TRACE_RESOLUTION):
+    """Same as split_laps, but interpolates all laps and checkpoints at once with numpy.
+    returns a (laps x sectors) array"""
+
+    laps = numpy.frombuffer(traces, dtype=numpy.float32).reshape(-1, resolution + 1).astype(numpy.float64)
+    position = numpy.minimum(numpy.asarray(checkpoints, dtype=numpy.float64), 1.0) * resolution
+    index = numpy.minimum(position.astype(numpy.int64), resolution - 1)
+    fraction = position - index
+
+    times = laps[:, index] * (1 - fraction) + laps[:, index + 1] * fraction
+    return numpy.diff(times, axis=1, prepend=0.0)
+
+
+def lap_times(traces, resolution=LAP_TRACE_RESOLUTION):
+    """The time of every stored lap, held by the last bin of its trace."""
+
+    lap_size = resolution + 1
+    return [traces[offset + resolution] for offset in range(0, len(traces) - resolution, lap_size)]
+
+
+def best_sector_times(traces, checkpoints, resolution=LAP_TRACE_RESOLUTION):
+    """Best time of every sector over all the stored laps, None if there are no laps."""
+
+    if len(traces) < resolution + 1:
+        return None
+
+    if numpy is not None:
+        return split_laps_vectorized(traces, checkpoints, resolution).min(axis=0).tolist()
+
+    best = None
+    for sectors in split_laps(traces, checkpoints, resolution):
+        if best is None:
+            best = sectors
+        else:
+            best = [min(a, b) for a, b in zip(best, sectors)]
+    return best
@@ -0,0 +1,41 @@
+from collections import deque
+
+
+class RecentBests:
+    """Best time of every sector over the last N laps (or over the whole session).
+
+    Each sector has a monotonic deque of (lap number, time) pairs with increasing times: a
+    new time removes every older time that is not faster, since those can never be the
+    minimum again, and times of laps older than the window are dropped from the front.
+    The window counts laps, not times, so invalid sectors (never added) leave a gap instead
+    of stretching the window back, and every sector covers the same laps. Adding a time is
+    amortized O(1), reading the minimum is O(1), and each deque holds at most window + 1
+    entries."""
+
+    def __init__(self, sector_count, window=None):
+        # None keeps every time of the session
+        self.window = window
+        self.reset(sector_count)
+
+    def reset(self, sector_count):
+        self.deques = [deque() for i in range(0, sector_count)]
+
+    def evict(self, times, lap):
+        # the window of lap n holds the laps n - window to n - 1, before n adds its own time
+        if self.window is not None:
+            while times and times[0][0] < lap - self.window:
+                times.popleft()
+
+    def add(self, index, sector_time, lap):
+        times = self.deques[index]
+        while times and times[-1][1] >= sector_time:
+            times.pop()
+        times.append((lap, sector_time))
+        self.evict(times, lap)
+
+    def minimum(self, index, lap):
+        """Best of the times of the laps before lap in the window, None if there is none."""
+
+        times = self.deques[index]
+        self.evict(times, lap)
+        return times[0][1] if times else None
@@ -0,0 +1,55 @@
+import threading
+from array import array
+
+
+class SampleRing:
+    """Fixed size ring of (spline position, lap time in ms, completed laps) samples.
+
+    Written by one thread and read by another without a lock: the writer fills a slot
+    and only then increments written, which is the only value both sides touch. The
+    reader keeps its own position (see timing.CrossingDetector), and skips ahead if it
+    falls more than capacity samples behind."""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.position = array('d', [0.0] * capacity)
+        self.time = array('i', [0] * capacity)
+        self.laps = array('i', [0] * capacity)
+        self.written = 0
+
+    def push(self, position, time, laps):
+        slot = self.written % self.capacity
+        self.position[slot] = position
+        self.time[slot] = time
+        self.laps[slot] = laps
+        self.written += 1
+
+
+class Sampler(threading.Thread):
+    """Polls the shared memory graphics page at a fixed rate and pushes the timing fields
+    into a SampleRing, so the sector times do not depend on how often the game calls the
+    app. A sample is only pushed when the lap time changed, the page is refreshed by the
+    game at its own pace."""
+
+    def __init__(self, graphics, ring, rate=500):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.graphics = graphics
+        self.ring = ring
+        self.period = 1 / rate
+        self.stop_event = threading.Event()
+
+    def run(self):
+        graphics = self.graphics
+        ring = self.ring
+        last_time = None
+        while not self.stop_event.is_set():
+            current_time = graphics.iCurrentTime
+            if current_time != last_time:
+                ring.push(graphics.normalizedCarPosition, current_time, graphics.completedLaps)
+                last_time = current_time
+            self.stop_event.wait(self.period)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(1)
@@ -0,0 +1,54 @@
+from array import array
+
+
+class SectorSpeeds:
+    """Minimum, maximum and average speed of every sector of the lap in progress.
+
+    Updated every tick, so the values are kept in preallocated arrays that are reset in
+    place: adding a sample does not allocate. The average is weighted by the tick
+    duration, so uneven frame times do not skew it."""
+
+    def __init__(self, sector_count=0):
+        self.minimum = array('d')
+        self.maximum = array('d')
+        self.distance = array('d')
+        self.time = array('d')
+        self.reset(sector_count)
+
+    def reset(self, sector_count):
+        if len(self.minimum) != sector_count:
+            self.minimum = array('d', [0.0] * sector_count)
+            self.maximum = array('d', [0.0] * sector_count)
+            self.distance = array('d', [0.0] * sector_count)
+            self.time = array('d', [0.0] * sector_count)
+
+        for i in range(0, sector_count):
+            self.minimum[i] = 0.0
+            self.maximum[i] = 0.0
+            self.distance[i] = 0.0
+            self.time[i] = 0.0
+
+    def add(self, index, speed, delta_time):
+        if self.time[index] == 0 or speed < self.minimum[index]:
+            self.minimum[index] = speed
+        if speed > self.maximum[index]:
+            self.maximum[index] = speed
+        self.distance[index] += speed * delta_time
+        self.time[index] += delta_time
+
+    def average(self, index):
+        if self.time[index] == 0:
+            return None
+        return self.distance[index] / self.time[index]
+
+    def lap_record(self):
+        """[min, max, average] of every sector, rounded, in the format stored with the laps.
+        Sectors without samples are None."""
+
+        record = []
+        for i in range(0, len(self.minimum)):
+            if self.time[i] == 0:
+                record.append(None)
+            else:
+                record.append([round(self.minimum[i], 1), round(self.maximum[i], 1), round(self.average(i), 1)])
+        return record
@@ -0,0 +1,168 @@
+from ts_core import journal as records
+from ts_core.timing import ProgressFilter
+
+# states of the player's session
+WAITING = 0  # jumped to the pits, restarted the session or changed the sectors, waiting to be placed
+IN_PITS = 1  # placed in the pits (or on the grid), the lap starts when leaving them
+ON_TRACK = 2  # driving a timed lap
+
+STATE_NAMES = ("waiting", "in pits", "on track")
+
+# what the app has to do after a tick
+IDLE = 0  # nothing, like standing still, driving backwards or waiting in the pits
+RESET = 1  # the lap in progress is abandoned
+DRIVING = 2  # moved forward on the lap, check the sectors
+LAP_FINISHED = 3  # crossed the finish line, the position has not wrapped around yet
+NEW_LAP = 4  # crossed the finish line and the new lap started
+
+ACTION_NAMES = ("idle", "reset", "driving", "lap finished", "new lap")
+
+# the car is back at the start position when within 5% of it on every axis
+START_MARGIN = 0.05
+# and its spline position within 3% of the one it had at the start
+START_PROGRESS_MARGIN = 0.03
+# the lap only starts (or restarts) below this position, for pit lanes placed before the
+# finish line and for hillclimbs, where the player goes back to the pits after a run
+LAP_START_PROGRESS = 0.3
+
+
+class SessionTracker:
+    """Follows the player's session (pit exits, laps, jumps to the pits and session restarts)
+    from the values the game gives every tick.
+
+    Each tick is a single update() call that only checks the transitions of the current state
+    and returns the action the app has to take. Nothing is read from the game here, so a
+    session can be replayed from recorded frames (tools/replay_session.py). The state changes,
+    resets and rejected positions go to the journal (journal.EventJournal) when there is one."""
+
+    def __init__(self, journal=None):
+        self.journal = journal
+        self.state = WAITING
+        # lap count when the lap being timed started
+        self.lap = 0
+        # number of the lap the sector times belong to
+        self.timed_lap = 1
+        self.started_outside_pits = False
+        # the session was restarted, waiting for the car to be back at the start position
+        self.restarting = False
+        self.session_time = -1
+        # x, y, z and spline position ranges around the start position, None until the car is loaded
+        self.start_bounds = None
+        self.progress_filter = ProgressFilter()
+        # the positions of this tick and of the previous one were rejected, journaled once per streak
+        self.rejected = False
+
+    def start_session(self, in_pit):
+        self.started_outside_pits = not in_pit
+
+    def capture_start(self, coordinates, progress):
+        """Keeps the start position, once the car is loaded into the world: coordinates are
+        (0, 0, 0) while it is still loading. The bounds checked while restarting are computed
+        here, once."""
+
+        x, y, z = coordinates[0], coordinates[1], coordinates[2]
+        if x == 0 or y == 0 or z == 0:
+            return
+        bounds = []
+        for value in (round(x, 3), round(y, 3), round(z, 3)):
+            margin = abs(value * START_MARGIN)
+            bounds.append(value - margin)
+            bounds.append(value + margin)
+        # progress * (1 - margin) <= start progress <= progress * (1 + margin)
+        bounds.append(progress / (1 + START_PROGRESS_MARGIN))
+        bounds.append(progress / (1 - START_PROGRESS_MARGIN))
+        self.start_bounds = tuple(bounds)
+
+    def at_start(self, in_pit, progress, coordinates):
+        """The car is back at the start position after a session restart. The position is
+        checked as well, since for a tick or two after a restart the game still reports the
+        position of before the restart."""
+
+        bounds = self.start_bounds
+        if bounds is not None and bounds[0] <= round(coordinates[0], 3) <= bounds[1] and \
+                bounds[2] <= round(coordinates[1], 3) <= bounds[3] and \
+                bounds[4] <= round(coordinates[2], 3) <= bounds[5] and bounds[6] <= progress <= bounds[7]:
+            return True
+
+        # some maps have faulty "new session" nodes, the car falls through the map and ends
+        # up in the pits, the times are recorded normally from there
+        return in_pit
+
+    def wait(self):
+        """Abandons the lap until the car is placed again, when the sectors or times change."""
+
+        if self.journal is not None and self.state != WAITING:
+            self.journal.record(records.STATE, WAITING, self.lap, 0.0, self.state)
+        self.state = WAITING
+
+    def session_restarted(self, session_type, session_time_left):
+        """The session time left jumped back: it increases in some session types and decreases
+        in the others."""
+
+        session_time_left = abs(session_time_left)
+        if session_type == 0 or session_type == 2:
+            return self.session_time > session_time_left
+        if session_type == 1 or 3 <= session_type <= 6:
+            return self.session_time < session_time_left
+        return False
+
+    def update(self, in_pit, progress, lap, completed_laps, session_type, session_time_left, coordinates):
+        """Takes the values of a tick, lap being the lap count of the car.
+        returns the action the app has to take, IDLE, RESET, DRIVING, LAP_FINISHED or NEW_LAP"""
+
+        previous = state = self.state
+        if state == WAITING and (in_pit or self.started_outside_pits):
+            if not self.restarting:
+                state = IN_PITS
+            elif self.at_start(in_pit, progress, coordinates):
+                state = IN_PITS
+                self.restarting = False
+                self.progress_filter.reset()
+
+        if state == IN_PITS and not in_pit and progress <= LAP_START_PROGRESS:
+            state = ON_TRACK
+            self.lap = lap
+            self.timed_lap = lap + 1
+        self.state = state
+        journal = self.journal
+        if journal is not None and state != previous:
+            journal.record(records.STATE, state, lap, progress, previous)
+
+        # jumped to the pits, or restarted a session that does not start in the pits
+        restarted = self.started_outside_pits and not self.restarting and \
+            self.session_restarted(session_type, session_time_left)
+        if (in_pit and state == ON_TRACK) or restarted:
+            if journal is not None:
+                journal.record(records.STATE, WAITING, lap, progress, state)
+                journal.record(records.RESET, restarted, lap, progress, session_time_left)
+            self.state = WAITING
+            self.lap = lap
+            self.timed_lap = lap + 1
+            self.restarting = restarted
+            self.session_time = abs(session_time_left)
+            self.progress_filter.reset(0)
+            return RESET
+
+        if state != ON_TRACK or in_pit:
+            return IDLE
+
+        if lap == self.lap:
+            if not self.progress_filter.moving_forward(progress):
+                if journal is not None and not self.rejected:
+                    journal.record(records.BACKWARDS, 0, lap, progress, self.progress_filter.last or 0.0)
+                self.rejected = True
+                return IDLE
+            self.rejected = False
+            self.timed_lap = lap + 1
+            self.session_time = abs(session_time_left)
+            return DRIVING
+
+        # when the session is reset, the game resets the lap count before moving the car to
+        # the pits, the completed laps check stops that from counting as a lap
+        if lap == completed_laps and completed_laps != 0:
+            if progress > LAP_START_PROGRESS:
+                return LAP_FINISHED
+            self.lap = lap
+            self.progress_filter.reset(0)
+            return NEW_LAP
+        return IDLE
@@ -0,0 +1,48 @@
+"""Helpers to walk the dictionary stored in data/data.json, outside of the game.
+
+The layout of the file is:
+    track -> layout -> {'sector_checkpoints', 'sector_count', car -> {'sector_1', ...}}
+and for tracks without layouts, the layout level is missing:
+    track -> {'sector_checkpoints', 'sector_count', car -> {'sector_1', ...}}
+"""
+
+# keys of a track/layout entry that are not car names
+NON_CAR_KEYS = ('sector_checkpoints', 'sector_count')
+
+
+def iter_configurations(track_name, track_entry):
+    """Yields (layout, entry) for every configuration of a track, layout being ""
+    for tracks without layouts."""
+
+    if not isinstance(track_entry, dict):
+        return
+    if 'sector_checkpoints' in track_entry:
+        yield "", track_entry
+        return
+    for layout, entry in track_entry.items():
+        if isinstance(entry, dict) and 'sector_checkpoints' in entry:
+            yield layout, entry
+
+
+def iter_cars(entry):
+    """Yields (car, car entry) for every car stored in a track/layout entry."""
+
+    for key, value in entry.items():
+        if key not in NON_CAR_KEYS and isinstance(value, dict):
+            yield key, value
+
+
+def checkpoints_of(entry):
+    """Sector checkpoints of a configuration, as a list ordered by sector number."""
+
+    return [entry['sector_checkpoints']['sector_' + str(i + 1)] for i in range(0, entry['sector_count'])]
+
+
+def sector_times_of(car_entry, sector_count):
+    """Best sector times of a car, None for the sectors without a time."""
+
+    times = []
+    for i in range(0, sector_count):
+        value = car_entry.get('sector_' + str(i + 1), "")
+        times.append(value if isinstance(value, (int, float)) else None)
+    return times
@@ -0,0 +1,76 @@
+from array import array
+
+
+class LapSnapshot:
+    """Copy of the samples of one lap, in chronological order."""
+
+    def __init__(self, progress, lap_time, speed, x, y, z, complete):
+        self.progress = progress
+        self.lap_time = lap_time
+        self.speed = speed
+        self.x = x
+        self.y = y
+        self.z = z
+
+        # the lap was recorded from the start line and no samples were overwritten
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.progress)
+
+
+class LapTelemetry:
+    """Preallocated ring buffer holding the samples of the current lap.
+
+    Every channel is an array('f') allocated once and reused for every lap, so
+    recording a tick only writes 6 floats in place. If a lap has more samples than
+    the capacity, the oldest ones get overwritten and the lap is marked as incomplete."""
+
+    def __init__(self, capacity=131072):
+        self.capacity = capacity
+        self.progress = array('f', [0.0]) * capacity
+        self.lap_time = array('f', [0.0]) * capacity
+        self.speed = array('f', [0.0]) * capacity
+        self.x = array('f', [0.0]) * capacity
+        self.y = array('f', [0.0]) * capacity
+        self.z = array('f', [0.0]) * capacity
+
+        # number of samples recorded on this lap, the write index is count % capacity
+        self.count = 0
+        self.recording = False
+
+    def start_lap(self):
+        self.count = 0
+        self.recording = True
+
+    def discard(self):
+        self.count = 0
+        self.recording = False
+
+    def record(self, progress, lap_time, speed, coordinates):
+        if not self.recording:
+            return
+
+        index = self.count % self.capacity
+        self.progress[index] = progress
+        self.lap_time[index] = lap_time
+        self.speed[index] = speed
+        self.x[index] = coordinates[0]
+        self.y[index] = coordinates[1]
+        self.z[index] = coordinates[2]
+        self.count += 1
+
+    def _channel(self, channel):
+        if self.count <= self.capacity:
+            return channel[:self.count]
+
+        # the buffer wrapped around, the oldest sample is at the write index
+        index = self.count % self.capacity
+        return channel[index:] + channel[:index]
+
+    def snapshot(self):
+        """Copies the samples of the current lap, slicing an array is a plain memory copy."""
+
+        return LapSnapshot(self._channel(self.progress), self._channel(self.lap_time),
+                           self._channel(self.speed), self._channel(self.x), self._channel(self.y),
+                           self._channel(self.z), self.recording and self.count <= self.capacity)
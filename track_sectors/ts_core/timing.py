@@ -0,0 +1,161 @@
+NO_CROSSINGS = ()
+
+
+class CrossingDetector:
+    """Finds the moments the car crossed the sector checkpoints in the samples of a
+    sampler.SampleRing, interpolating the lap time between the two samples around each
+    checkpoint. The finish line (checkpoints of 1 or more) is left to the lap count."""
+
+    def __init__(self, max_step=0.1):
+        # bigger jumps of the spline position are teleports or pit resets, not driving
+        self.max_step = max_step
+        self.read = 0
+        self.previous = None
+
+    def discard(self, ring):
+        """Skips all the samples in the ring, used when the lap in progress is abandoned."""
+
+        self.read = ring.written
+        self.previous = None
+
+    def crossings(self, ring, lap, checkpoints):
+        """Consumes the new samples of the ring, returns the (sector index, lap time in
+        seconds) for every checkpoint crossed on the given lap, in order."""
+
+        # called every tick, the list is only created when a checkpoint was crossed
+        found = NO_CROSSINGS
+        written = ring.written
+        if written - self.read > ring.capacity:
+            # the reader fell behind and the oldest samples were overwritten
+            self.read = written - ring.capacity
+            self.previous = None
+
+        while self.read < written:
+            slot = self.read % ring.capacity
+            sample = (ring.position[slot], ring.time[slot], ring.laps[slot])
+            self.read += 1
+
+            previous = self.previous
+            self.previous = sample
+            if previous is None or previous[2] != lap or sample[2] != lap:
+                continue
+
+            start, end = previous[0], sample[0]
+            if not 0 < end - start <= self.max_step:
+                continue
+            for i in range(0, len(checkpoints)):
+                checkpoint = checkpoints[i]
+                if start < checkpoint <= end and checkpoint < 1:
+                    fraction = (checkpoint - start) / (end - start)
+                    if found is NO_CROSSINGS:
+                        found = []
+                    found.append((i, (previous[1] + fraction * (sample[1] - previous[1])) / 1000))
+        return found
+
+
+class ProgressFilter:
+    """Tells forward driving apart from driving backwards, standing still and jumps of the
+    spline position, by comparing every position with the furthest one of the lap."""
+
+    def __init__(self, ratio=0.30, low_progress=0.05):
+        # a position further than ratio * the last one is a jump, unless close to the start
+        # of the lap, where a fast car can legitimately more than double its progress in a tick
+        self.ratio = ratio
+        self.low_progress = low_progress
+        self.last = None
+
+    def reset(self, progress=None):
+        """None when the car jumped to the pits or the session restarted, 0 for a new lap."""
+
+        self.last = progress
+
+    def moving_forward(self, progress):
+        last = self.last
+        if last is None:
+            # first value, after the first run or a jump to the pits
+            self.last = progress
+            return True
+        if progress <= self.low_progress or last == 0 or abs(progress - last) <= last * self.ratio:
+            if progress > last:
+                self.last = progress
+                return True
+            # going backwards, standing still, or a late position update from the engine
+            return False
+        # the difference is too big, like when crossing the finish line backwards
+        return False
+
+
+class LapTimer:
+    """The sector timing of the app without the game: feeds the (progress, lap time) ticks
+    of a lap through the same rules the app applies while driving, so recorded laps can be
+    timed again with other checkpoints or parameters."""
+
+    def __init__(self, checkpoints, ratio=0.30, low_progress=0.05, interpolate=False):
+        self.checkpoints = checkpoints
+        self.filter = ProgressFilter(ratio, low_progress)
+        # like the sampler, interpolate the crossing time between the ticks around a checkpoint
+        self.interpolate = interpolate
+        self.times = [None] * len(checkpoints)
+        self.next_sector = 0
+        self.elapsed = 0.0
+        self.previous = None
+
+    def start_lap(self):
+        self.filter.reset(0)
+        self.times = [None] * len(self.checkpoints)
+        self.next_sector = 0
+        self.elapsed = 0.0
+        self.previous = None
+
+    def clear(self, index, lap_time):
+        self.times[index] = lap_time - self.elapsed
+        self.elapsed = lap_time
+        self.next_sector = index + 1
+
+    def tick(self, progress, lap_time):
+        """lap_time in seconds. returns the index of the sector completed on this tick, or None"""
+
+        if not self.filter.moving_forward(progress):
+            return None
+        previous = self.previous
+        self.previous = (progress, lap_time)
+
+        # checkpoints are in increasing order, so the sectors are cleared in order and
+        # only the next one has to be checked, the app scans them all for the same result
+        index = self.next_sector
+        if index >= len(self.checkpoints) or progress < self.checkpoints[index]:
+            return None
+        if self.interpolate and previous is not None and previous[0] < self.checkpoints[index]:
+            fraction = (self.checkpoints[index] - previous[0]) / (progress - previous[0])
+            lap_time = previous[1] + fraction * (lap_time - previous[1])
+        self.clear(index, lap_time)
+        return index
+
+    def finish(self, lap_time):
+        """Crossing the finish line: gives the rest of the lap time to the next sector that
+        was not cleared, like a last checkpoint on (or after) the finish line.
+        returns the sector times of the lap, None for the sectors that were missed"""
+
+        if self.next_sector < len(self.checkpoints):
+            self.clear(self.next_sector, lap_time)
+        return self.times
+
+
+def finish_time(progress, lap_time):
+    """Lap time at the finish line of a recorded lap, extrapolated from its last two ticks:
+    the last recorded tick comes just before the line is crossed."""
+
+    if len(progress) < 2 or progress[-1] <= progress[-2]:
+        return lap_time[-1]
+    fraction = (1 - progress[-2]) / (progress[-1] - progress[-2])
+    return lap_time[-2] + fraction * (lap_time[-1] - lap_time[-2])
+
+
+def time_lap(timer, progress, lap_time):
+    """Times a recorded lap, progress and lap_time being the per tick samples of the lap.
+    returns the sector times, None for the sectors that were missed"""
+
+    timer.start_lap()
+    for i in range(0, len(progress)):
+        timer.tick(progress[i], lap_time[i])
+    return timer.finish(finish_time(progress, lap_time))
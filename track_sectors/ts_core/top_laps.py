@@ -0,0 +1,118 @@
+import heapq
+import json
+import os
+from collections import OrderedDict
+
+
+class TopLaps:
+    """The capacity fastest complete laps of a car on a track/layout, with their sector times.
+
+    The laps are kept in a heap ordered by negated lap time, so the slowest kept lap is at
+    the root: a new lap either fills a free slot or replaces the root if it is faster, in
+    O(log capacity), and memory and file size never go past capacity laps."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.heap = []
+        # tie breaker for laps with the same time, the lap records are never compared
+        self.sequence = 0
+        self.changed = False
+
+    def __len__(self):
+        return len(self.heap)
+
+    def clear(self):
+        self.heap = []
+        self.changed = True
+
+    def add(self, lap_time, splits, extra=None):
+        """Offers a complete lap, returns True if it is one of the fastest laps and was kept.
+        extra holds additional per lap values stored next to the splits."""
+
+        if self.capacity <= 0:
+            return False
+        if len(self.heap) == self.capacity and lap_time >= -self.heap[0][0]:
+            return False
+
+        record = OrderedDict()
+        record['lap_time'] = round(lap_time, 3)
+        record['splits'] = [round(split, 3) for split in splits]
+        if extra:
+            record.update(extra)
+
+        self.sequence += 1
+        if len(self.heap) < self.capacity:
+            heapq.heappush(self.heap, (-lap_time, self.sequence, record))
+        else:
+            heapq.heapreplace(self.heap, (-lap_time, self.sequence, record))
+        self.changed = True
+        return True
+
+    def laps(self):
+        """Kept laps, fastest first."""
+
+        return [entry[2] for entry in sorted(self.heap, key=lambda entry: (-entry[0], entry[1]))]
+
+    def load(self, path, checkpoints=None):
+        """Loads the laps stored at path, the laps are dropped if they were split with other
+        checkpoints. Laps past the capacity (if it was lowered) are evicted."""
+
+        self.heap = []
+        self.changed = False
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as infile:
+                stored = json.load(infile, object_pairs_hook=OrderedDict)
+        except ValueError:
+            return
+
+        if checkpoints is not None and stored.get('checkpoints') != list(checkpoints):
+            self.changed = True
+            return
+        for record in stored.get('laps', []):
+            self.add(record['lap_time'], record['splits'],
+                     OrderedDict((key, value) for key, value in record.items() if key not in ('lap_time', 'splits')))
+        self.changed = len(self.heap) != len(stored.get('laps', []))
+
+    def save(self, path, checkpoints):
+        """Writes the laps, only if they changed since they were loaded."""
+
+        if not self.changed:
+            return
+        if not self.heap:
+            if os.path.exists(path):
+                os.remove(path)
+            self.changed = False
+            return
+
+        folder = os.path.dirname(path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        stored = OrderedDict()
+        stored['checkpoints'] = list(checkpoints)
+        stored['laps'] = self.laps()
+        with open(path, "w") as outfile:
+            json.dump(stored, outfile, indent=4)
+        self.changed = False
+
+    def add_laps(self, laps, lap_times):
+        """Offers laps given as lists of sector times with their lap times, leaving out the
+        laps already kept with the same time (like the laps of this session, kept with their
+        speeds, that are also in the stored traces)."""
+
+        kept = set(entry[2]['lap_time'] for entry in self.heap)
+        for sectors, lap_time in zip(laps, lap_times):
+            if round(lap_time, 3) not in kept:
+                self.add(lap_time, sectors)
+
+    @staticmethod
+    def from_laps(laps, lap_times, capacity):
+        """Fastest laps of a list of laps, each lap being a list of sector times, with the
+        lap times taken separately: the sectors only add up to the lap time when the last
+        checkpoint is the finish line."""
+
+        top_laps = TopLaps(capacity)
+        top_laps.add_laps(laps, lap_times)
+        return top_laps
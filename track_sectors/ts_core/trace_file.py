@@ -0,0 +1,227 @@
+"""Compressed per tick samples of complete laps (.trc files), recorded with record_telemetry.
+
+    header    magic, version, channel count
+    channels  name, scale (one entry per channel, values are stored as round(value * scale))
+    blocks    one zlib block per lap: the channels one after another, each delta encoded
+              as fixed point int32 values and byte shuffled before compression
+    index     block offset, compressed size, sample count, lap time (one entry per lap)
+    footer    index offset, lap count, index magic
+
+A lap is read by seeking to its block through the index, without decompressing the others.
+Saves go through a copy of the file that replaces it only once complete, a game closing
+mid save never leaves a file without its footer.
+"""
+import os
+import shutil
+import struct
+import zlib
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    # the game's python does not ship numpy, the pure python path is used there
+    numpy = None
+
+MAGIC = b"TSTR"
+VERSION = 1
+
+# magic, version, channel count
+HEADER = struct.Struct("<4sHH")
+# channel name, scale: the stored value is round(value * scale)
+CHANNEL = struct.Struct("<16sd")
+# block offset, compressed size, sample count, lap time
+INDEX_ENTRY = struct.Struct("<QIId")
+# index offset, lap count, magic
+FOOTER = struct.Struct("<QI4s")
+INDEX_MAGIC = b"TSTI"
+
+# progress to 1e-6 (a few cm on the longest tracks), time to 1 ms, speed to 0.01 km/h,
+# coordinates to 1 cm
+DEFAULT_CHANNELS = (("progress", 1e6), ("lap_time", 1e3), ("speed", 1e2), ("x", 1e2), ("y", 1e2), ("z", 1e2))
+
+
+def encode_channel(values, scale):
+    """Quantizes a channel to fixed point integers and delta encodes it: the samples of a
+    lap change little from one tick to the next, so the differences are small numbers
+    that compress much better than the floats. returns array('i')"""
+
+    if numpy is not None:
+        fixed = numpy.rint(numpy.asarray(values, dtype=numpy.float64) * scale).astype(numpy.int64)
+        deltas = array('i')
+        deltas.frombytes(numpy.diff(fixed, prepend=0).astype(numpy.int32).tobytes())
+        return deltas
+
+    deltas = array('i', [0]) * len(values)
+    previous = 0
+    for i in range(0, len(values)):
+        current = int(round(values[i] * scale))
+        deltas[i] = current - previous
+        previous = current
+    return deltas
+
+
+def decode_channel(deltas, scale):
+    """Inverse of encode_channel, returns a numpy float64 array, or array('d') without numpy."""
+
+    if numpy is not None:
+        return numpy.cumsum(numpy.frombuffer(deltas, dtype=numpy.int32), dtype=numpy.int64) / scale
+
+    values = array('d', [0.0]) * len(deltas)
+    current = 0
+    for i in range(0, len(deltas)):
+        current += deltas[i]
+        values[i] = current / scale
+    return values
+
+
+def shuffle(data, width=4):
+    """Groups the n-th bytes of every value together. Most deltas are small, so their high
+    bytes are mostly 0 or 0xff and compress to almost nothing once grouped."""
+
+    return b"".join(data[i::width] for i in range(0, width))
+
+
+def unshuffle(data, width=4):
+    result = bytearray(len(data))
+    plane = len(data) // width
+    for i in range(0, width):
+        result[i::width] = data[i * plane:(i + 1) * plane]
+    return bytes(result)
+
+
+def encode_block(channels, lap, level=6):
+    """Compressed block of one lap, lap being the list of the channel values in the order of channels."""
+
+    data = b"".join(shuffle(encode_channel(values, scale).tobytes()) for (name, scale), values in zip(channels, lap))
+    return zlib.compress(data, level)
+
+
+def read_layout(infile):
+    """Reads the channels and the index of an open trace file.
+    returns (channels, index entries, index offset)"""
+
+    magic, version, channel_count = HEADER.unpack(infile.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a lap trace file")
+    channels = []
+    for i in range(0, channel_count):
+        name, scale = CHANNEL.unpack(infile.read(CHANNEL.size))
+        channels.append((name.rstrip(b"\0").decode("ascii"), scale))
+
+    infile.seek(-FOOTER.size, os.SEEK_END)
+    index_offset, lap_count, index_magic = FOOTER.unpack(infile.read(FOOTER.size))
+    if index_magic != INDEX_MAGIC:
+        raise ValueError("the index of the lap trace file is missing")
+    infile.seek(index_offset)
+    index = [INDEX_ENTRY.unpack(infile.read(INDEX_ENTRY.size)) for i in range(0, lap_count)]
+    return channels, index, index_offset
+
+
+class TraceWriter:
+    """Per tick samples of the complete laps of a car, in the compressed trace format.
+
+    A file is a header listing the channels, one zlib block per lap holding the delta
+    encoded fixed point channels, then an index of the blocks and a footer pointing to it.
+    Laps are appended by writing the new blocks over the old index and writing the index
+    again, on a copy of the file that then replaces it, so a lap can be read without
+    decompressing the others. Laps are only encoded on save(), not while driving."""
+
+    def __init__(self, path, channels=DEFAULT_CHANNELS):
+        self.path = path
+        self.channels = channels
+        self.pending = []
+
+    def add(self, lap):
+        """Queues a lap, a list of the channel values in the order of the channels."""
+
+        self.pending.append(lap)
+
+    def save(self):
+        if not self.pending:
+            return
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        exists = os.path.exists(self.path)
+        temporary = self.path + ".tmp"
+        if exists:
+            shutil.copyfile(self.path, temporary)
+        try:
+            self.write_laps(temporary, exists)
+        except:
+            os.remove(temporary)
+            raise
+        os.replace(temporary, self.path)
+        self.pending = []
+
+    def write_laps(self, path, exists):
+        """Appends the pending laps to the file at path, created if it does not exist."""
+
+        with open(path, "r+b" if exists else "w+b") as outfile:
+            if exists:
+                self.channels, index, position = read_layout(outfile)
+            else:
+                outfile.write(HEADER.pack(MAGIC, VERSION, len(self.channels)))
+                for name, scale in self.channels:
+                    outfile.write(CHANNEL.pack(name.encode("ascii"), scale))
+                index = []
+                position = outfile.tell()
+
+            names = [name for name, scale in self.channels]
+            time_channel = names.index("lap_time") if "lap_time" in names else None
+            outfile.seek(position)
+            for lap in self.pending:
+                block = encode_block(self.channels, lap)
+                outfile.write(block)
+                lap_time = lap[time_channel][-1] if time_channel is not None and len(lap[0]) else 0.0
+                index.append((position, len(block), len(lap[0]), lap_time))
+                position += len(block)
+
+            for entry in index:
+                outfile.write(INDEX_ENTRY.pack(*entry))
+            outfile.write(FOOTER.pack(position, len(index), INDEX_MAGIC))
+            outfile.truncate()
+
+
+class TraceReader:
+    """Reads the laps of a trace file, each lap is a dict of channel name -> numpy array."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.channels, self.index, index_offset = read_layout(self.file)
+
+    def __len__(self):
+        return len(self.index)
+
+    def lap_time(self, lap):
+        """Lap time stored in the index, without reading the lap."""
+
+        return self.index[lap][3]
+
+    def lap(self, lap):
+        offset, size, samples, lap_time = self.index[lap]
+        self.file.seek(offset)
+        data = zlib.decompress(self.file.read(size))
+
+        channel_size = samples * 4
+        values = {}
+        for i, (name, scale) in enumerate(self.channels):
+            deltas = array('i')
+            deltas.frombytes(unshuffle(data[i * channel_size:(i + 1) * channel_size]))
+            values[name] = decode_channel(deltas, scale)
+        return values
+
+    def __iter__(self):
+        for lap in range(0, len(self.index)):
+            yield self.lap(lap)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
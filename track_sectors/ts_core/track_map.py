@@ -0,0 +1,109 @@
+import json
+import os
+from array import array
+from bisect import bisect_left
+
+
+def config_file_name(track_name, track_layout, extension):
+    """File name used to store per track/layout data, tracks without layouts
+    only use the track name."""
+
+    if track_layout == "":
+        return track_name + extension
+    return track_name + "@" + track_layout + extension
+
+
+def build_track_map(snapshot, min_spacing=4.0):
+    """Builds a decimated polyline of the track from the samples of a lap.
+
+    A point is only kept once the car moved at least min_spacing meters from the
+    previously kept point, so the polyline size depends on the track length and not on
+    the frame rate. Returns None if the lap did not cover the whole track."""
+
+    if not snapshot.complete or len(snapshot) == 0:
+        return None
+
+    min_spacing_sq = min_spacing * min_spacing
+    progress = array('f', [snapshot.progress[0]])
+    x = array('f', [snapshot.x[0]])
+    z = array('f', [snapshot.z[0]])
+
+    for i in range(1, len(snapshot)):
+        dx = snapshot.x[i] - x[-1]
+        dz = snapshot.z[i] - z[-1]
+        if dx * dx + dz * dz >= min_spacing_sq and snapshot.progress[i] > progress[-1]:
+            progress.append(snapshot.progress[i])
+            x.append(snapshot.x[i])
+            z.append(snapshot.z[i])
+
+    if len(progress) < 20 or progress[0] > 0.05 or progress[-1] < 0.95:
+        return None
+    return TrackMap(progress, x, z)
+
+
+class TrackMap:
+    """Polyline of the track, with the normalized spline position of every point."""
+
+    def __init__(self, progress, x, z):
+        self.progress = array('f', progress)
+        self.x = array('f', x)
+        self.z = array('f', z)
+
+        # screen space [x, y] pairs, computed by project()
+        self.vertices = array('f')
+
+    def __len__(self):
+        return len(self.progress)
+
+    def save(self, path):
+        with open(path, "w") as outfile:
+            json.dump({'progress': [round(i, 6) for i in self.progress],
+                       'x': [round(i, 2) for i in self.x],
+                       'z': [round(i, 2) for i in self.z]}, outfile)
+
+    @staticmethod
+    def load(path):
+        """Returns the map stored at path, or None if there is no (valid) map stored."""
+
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as infile:
+                data = json.load(infile)
+            return TrackMap(data['progress'], data['x'], data['z'])
+        except (ValueError, KeyError):
+            return None
+
+    def project(self, x, y, width, height, margin=10):
+        """Fits the track into the given rectangle, keeping the aspect ratio, and
+        stores the resulting screen coordinates in self.vertices."""
+
+        min_x, max_x = min(self.x), max(self.x)
+        min_z, max_z = min(self.z), max(self.z)
+        scale = min((width - 2 * margin) / max(max_x - min_x, 1.0),
+                    (height - 2 * margin) / max(max_z - min_z, 1.0))
+
+        # centers the track inside the rectangle
+        offset_x = x + (width - (max_x - min_x) * scale) / 2
+        offset_y = y + (height - (max_z - min_z) * scale) / 2
+
+        self.vertices = array('f', [0.0] * (2 * len(self.x)))
+        for i in range(0, len(self.x)):
+            self.vertices[2 * i] = offset_x + (self.x[i] - min_x) * scale
+            self.vertices[2 * i + 1] = offset_y + (self.z[i] - min_z) * scale
+
+    def sector_ranges(self, checkpoints):
+        """Returns [first, last] vertex index pairs for every sector, consecutive sectors
+        share their boundary vertex so the drawn polyline has no gaps."""
+
+        ranges = array('i', [0] * (2 * len(checkpoints)))
+        start = 0
+        for i in range(0, len(checkpoints)):
+            if checkpoints[i] > 1:
+                end = len(self.progress) - 1
+            else:
+                end = min(bisect_left(self.progress, checkpoints[i]), len(self.progress) - 1)
+            ranges[2 * i] = start
+            ranges[2 * i + 1] = end
+            start = end
+        return ranges